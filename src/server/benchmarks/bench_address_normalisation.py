@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import argparse
+import random
+
+from cape_of_good_place_names.geocoder_cache import normalise_address
+
+STREETS = ["Long", "Bree", "Loop", "Strand", "Kloof", "Main", "Voortrekker", "Buitengracht", "Church", "Adderley"]
+STREET_TYPES = [("Street", "St"), ("Road", "Rd"), ("Avenue", "Ave"), ("Drive", "Dr")]
+SUBURBS = ["Cape Town", "Sea Point", "Observatory", "Bellville", "Khayelitsha", "Mitchells Plain", "Wynberg"]
+
+
+def _synthetic_corpus(count, unique_addresses):
+    """Generates a replay corpus, with a skewed popularity of addresses, each written in a variety of ways"""
+    random.seed(1234)
+    base_addresses = [
+        (random.randint(1, 300), random.choice(STREETS), random.choice(STREET_TYPES), random.choice(SUBURBS))
+        for _ in range(unique_addresses)
+    ]
+    weights = [1 / (rank + 1) for rank in range(unique_addresses)]
+
+    def _written(number, street, street_type, suburb):
+        street_type = random.choice(street_type)
+        street_type += random.choice(["", "", "."])
+        address = f"{number} {street} {street_type}{random.choice([',', ',', ''])} {suburb}"
+        address = random.choice([str, str, str.upper, str.lower])(address)
+        return address.replace(" ", random.choice([" ", " ", "  "]), 1)
+
+    return [
+        _written(*random.choices(base_addresses, weights)[0])
+        for _ in range(count)
+    ]
+
+
+def _hit_rate(keys):
+    seen = set()
+    hits = 0
+    for key in keys:
+        hits += key in seen
+        seen.add(key)
+
+    return hits / len(keys), len(seen)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replays an address corpus through an unbounded cache, comparing raw and normalised cache keys",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("-f", "--corpus-file", required=False,
+                        help="File with one address per line. If not given, a synthetic corpus is generated")
+    parser.add_argument("-n", "--count", type=int, default=100000,
+                        help="Number of addresses in the synthetic corpus")
+    parser.add_argument("-u", "--unique-addresses", type=int, default=5000,
+                        help="Number of distinct places in the synthetic corpus")
+    args = parser.parse_args()
+
+    if args.corpus_file:
+        with open(args.corpus_file) as corpus_file:
+            corpus = [line.strip() for line in corpus_file if line.strip()]
+    else:
+        corpus = _synthetic_corpus(args.count, args.unique_addresses)
+
+    raw_hit_rate, raw_keys = _hit_rate(corpus)
+    normalised_hit_rate, normalised_keys = _hit_rate([normalise_address(address) for address in corpus])
+
+    print(f"{'keys':<12} {'hit rate':>10} {'distinct keys':>14}")
+    print(f"{'raw':<12} {raw_hit_rate:>10.1%} {raw_keys:>14,}")
+    print(f"{'normalised':<12} {normalised_hit_rate:>10.1%} {normalised_keys:>14,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import argparse
+import pickle
+import random
+import tempfile
+import timeit
+
+from cape_of_good_place_names.geocoder_cache import backends, records
+
+
+def _generate_results(count, metadata):
+    random.seed(1234)
+    return [
+        (
+            f"{i} {random.choice(['Long', 'Loop', 'Bree', 'Strand'])} Street, Cape Town",
+            (f"{i} Long Street, Cape Town City Centre, Cape Town, 8001, South Africa",
+             -33.9 - random.random() / 10, 18.4 + random.random() / 10,
+             {"place_id": i, "type": "house", "importance": random.random()} if metadata else None)
+        )
+        for i in range(count)
+    ]
+
+
+def _bench_codec(name, dump, load, results, repeat):
+    encoded = [dump(address, result) for address, result in results]
+    write_time = min(timeit.repeat(lambda: [dump(address, result) for address, result in results],
+                                   number=1, repeat=repeat))
+    read_time = min(timeit.repeat(lambda: [load(data) for data in encoded],
+                                  number=1, repeat=repeat))
+    size = sum(map(len, encoded))
+
+    print(f"{name:<24} "
+          f"{len(results) / write_time:>14,.0f} "
+          f"{len(results) / read_time:>14,.0f} "
+          f"{size / len(results):>12,.1f}")
+
+
+def _bench_backend(name, backend, results):
+    write_time = timeit.timeit(lambda: [backend.put("Benchmark", address, result) for address, result in results],
+                               number=1)
+    read_time = timeit.timeit(lambda: [backend.get("Benchmark", address) for address, _ in results],
+                              number=1)
+    size = sum(entry_size for *_, entry_size in backend.entries())
+
+    print(f"{name:<24} "
+          f"{len(results) / write_time:>14,.0f} "
+          f"{len(results) / read_time:>14,.0f} "
+          f"{size / len(results):>12,.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compares the geocoder cache record format with the legacy pickles",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("-n", "--count", type=int, default=10000,
+                        help="Number of geocoder results to encode")
+    parser.add_argument("-m", "--metadata", action="store_true",
+                        help="Include provider metadata in the geocoder results")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="Number of repeats of the in-memory timings, the best is reported")
+    args = parser.parse_args()
+
+    results = _generate_results(args.count, args.metadata)
+
+    print(f"{'codec':<24} {'writes/s':>14} {'reads/s':>14} {'bytes/entry':>12}")
+    _bench_codec("pickle (legacy)", lambda address, result: pickle.dumps(result), pickle.loads,
+                 results, args.repeat)
+    for compression in (None, "zlib", "zstd"):
+        if compression == "zstd" and records.zstandard is None:
+            continue
+        _bench_codec(f"record ({compression or 'uncompressed'})",
+                     lambda address, result: records.encode(address, result, compression), records.decode,
+                     results, args.repeat)
+
+    print()
+    print(f"{'backend':<24} {'writes/s':>14} {'reads/s':>14} {'bytes/entry':>12}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        legacy_backend = backends.FileCacheBackend(temp_dir + "/legacy")
+        legacy_backend._dump = lambda address, result: pickle.dumps(result)
+        _bench_backend("file (legacy pickles)", legacy_backend, results)
+
+        _bench_backend("file (records)", backends.FileCacheBackend(temp_dir + "/records"), results)
+        _bench_backend("sharded (records)", backends.ShardedFileCacheBackend(temp_dir + "/sharded"), results)
+        _bench_backend("sqlite (records)", backends.SqliteCacheBackend(temp_dir + "/sqlite"), results)
+
+
+if __name__ == "__main__":
+    main()
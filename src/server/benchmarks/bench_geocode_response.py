@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import random
+import timeit
+
+import flask
+
+from cape_of_good_place_names import encoder, geocoding, util
+from cape_of_good_place_names.config import config
+from cape_of_good_place_names.models.geocode_results import GeocodeResults
+
+
+def _generate_combined_results(count, geocoder_count):
+    random.seed(1234)
+    geocoders = [type(f"Geocoder{i}", (object,), {})() for i in range(geocoder_count)]
+    return [
+        {
+            geocoder: (f"{i} Long Street, Cape Town City Centre, Cape Town, 8001, South Africa",
+                       -33.92 + random.random() / 1000, 18.42 + random.random() / 1000, None)
+            for geocoder in geocoders
+        }
+        for i in range(count)
+    ]
+
+
+def _build_response(combined_results, encode_values):
+    # As the geocode controller does, up to and including Flask encoding the response body
+    response = GeocodeResults(
+        id=util.get_request_uuid(),
+        timestamp=util.get_timestamp(),
+        results=geocoding.format_results(combined_results, encode_values)
+    )
+    return flask.json.dumps(response)
+
+
+def _parse_response(body, encode_values):
+    # As a client would, to get at the coordinates
+    response = json.loads(body)
+    return [
+        json.loads(result["geocoded_value"]) if encode_values else result["geocoded_value"]
+        for result in response["results"]
+    ]
+
+
+def _bench_version(name, combined_results, encode_values, repeat):
+    bodies = [_build_response(results, encode_values) for results in combined_results]
+    build_time = min(timeit.repeat(
+        lambda: [_build_response(results, encode_values) for results in combined_results], number=1, repeat=repeat
+    ))
+    parse_time = min(timeit.repeat(
+        lambda: [_parse_response(body, encode_values) for body in bodies], number=1, repeat=repeat
+    ))
+    size = sum(map(len, bodies))
+
+    print(f"{name:<24} "
+          f"{build_time / len(bodies) * 1e6:>12,.1f} "
+          f"{parse_time / len(bodies) * 1e6:>12,.1f} "
+          f"{size / len(bodies):>14,.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compares building and parsing the v1.1 geocode responses, with JSON encoded geocoded values, and "
+                    "the v1.2 ones, with GeoJSON objects",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("-n", "--count", type=int, default=2000,
+                        help="Number of responses to build")
+    parser.add_argument("-g", "--geocoders", type=int, default=5,
+                        help="Number of geocoder results in each response")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="Number of repeats of the timings, the best is reported")
+    args = parser.parse_args()
+
+    app = flask.Flask(__name__)
+    app.json_encoder = encoder.JSONEncoder
+    app.config["TIMEZONE"] = config.Config.TIMEZONE
+    combined_results = _generate_combined_results(args.count, args.geocoders)
+
+    print(f"{'version':<24} {'build (us)':>12} {'parse (us)':>12} {'bytes/response':>14}")
+    with app.app_context():
+        _bench_version("v1.1 (encoded values)", combined_results, True, args.repeat)
+        _bench_version("v1.2 (object values)", combined_results, False, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+import urllib.parse
+
+from cape_of_good_place_names.geocoder_upstream import AsyncGeocoderAdapter, EventLoopThread, GeocoderExecutor, \
+    HttpSessionPool
+
+
+async def _handle_stub_request(reader, writer, delay):
+    # Keep-alive HTTP/1.1 server, that answers every request after a delay, like a remote geocoder would
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            headers = []
+            while (header_line := await reader.readline()) not in (b"\r\n", b""):
+                headers.append(header_line.lower())
+            keep_alive = b"connection: close\r\n" not in headers
+
+            _, path, _ = request_line.decode().split(" ", 2)
+            address, *_ = urllib.parse.parse_qs(urllib.parse.urlsplit(path).query)["q"]
+            await asyncio.sleep(delay)
+
+            body = json.dumps({"address": address, "lat": -33.9, "lon": 18.4}).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+def _start_stub_server(event_loop, delay):
+    async def _start():
+        server = await asyncio.start_server(lambda reader, writer: _handle_stub_request(reader, writer, delay),
+                                            "127.0.0.1", 0, backlog=4096)
+        return server.sockets[0].getsockname()[1]
+
+    return event_loop.submit(_start()).result()
+
+
+class StubGeocoder(object):
+    """Blocking geocoder, in the style of the geocode_array ones, making its requests with a requests session"""
+
+    def __init__(self, url, session):
+        self.url = url
+        self.session = session
+
+    def geocode(self, address):
+        data = self.session.get(self.url, params={"q": address}, timeout=30).json()
+        return data["address"], data["lat"], data["lon"], None
+
+
+class AsyncStubGeocoder(StubGeocoder):
+    """Natively async geocoder, with a minimal asyncio HTTP client"""
+
+    async def geocode_async(self, address):
+        url = urllib.parse.urlsplit(self.url)
+        reader, writer = await asyncio.open_connection(url.hostname, url.port)
+        try:
+            writer.write(f"GET {url.path}?{urllib.parse.urlencode({'q': address})} HTTP/1.1\r\n"
+                         f"Host: {url.netloc}\r\nConnection: close\r\n\r\n".encode())
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+
+        _, body = response.split(b"\r\n\r\n", 1)
+        data = json.loads(body)
+        return data["address"], data["lat"], data["lon"], None
+
+
+def _bench_threaded(geocoders, addresses, workers):
+    geocoder_executor = GeocoderExecutor(max_workers=workers, max_queued=None)
+    start = time.monotonic()
+    futures = [
+        geocoder_executor.submit(geocoder.geocode, address)
+        for address in addresses
+        for geocoder in geocoders
+    ]
+    results = [future.result() for future in concurrent.futures.as_completed(futures)]
+    duration = time.monotonic() - start
+    geocoder_executor.shutdown()
+
+    return len(results), duration, workers
+
+
+def _bench_asyncio(geocoders, addresses, workers, concurrency):
+    geocoder_executor = GeocoderExecutor(max_workers=workers, max_queued=None)
+    event_loop = EventLoopThread()
+    adapters = [AsyncGeocoderAdapter(geocoder, geocoder_executor) for geocoder in geocoders]
+
+    async def _fan_out():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _geocode(adapter, address):
+            async with semaphore:
+                return await adapter.geocode(address)
+
+        return await asyncio.gather(*(
+            _geocode(adapter, address)
+            for address in addresses
+            for adapter in adapters
+        ))
+
+    start = time.monotonic()
+    results = event_loop.submit(_fan_out()).result()
+    duration = time.monotonic() - start
+    event_loop.close()
+    geocoder_executor.shutdown()
+
+    threads = 1 + (0 if all(adapter.native for adapter in adapters) else workers)
+    return len(results), duration, threads
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compares the threaded and asyncio geocoder fan-out engines, against local stub geocoder servers",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("-n", "--count", type=int, default=1000,
+                        help="Number of addresses to geocode")
+    parser.add_argument("-g", "--geocoders", type=int, default=3,
+                        help="Number of stub geocoders, each with its own server")
+    parser.add_argument("-d", "--delay", type=float, default=0.1,
+                        help="Seconds each stub geocoder takes to answer")
+    parser.add_argument("-w", "--workers", type=int, default=32,
+                        help="Geocoder executor worker threads")
+    parser.add_argument("-c", "--concurrency", type=int, default=1000,
+                        help="Requests in flight at once on the event loop (mind the open file limit)")
+    args = parser.parse_args()
+
+    server_loop = EventLoopThread(thread_name="stub-servers")
+    urls = [f"http://127.0.0.1:{_start_stub_server(server_loop, args.delay)}/search" for _ in range(args.geocoders)]
+    addresses = [f"{i} Long Street, Cape Town" for i in range(args.count)]
+
+    session_pool = HttpSessionPool(pool_connections=args.geocoders, pool_size=args.workers)
+    blocking_geocoders = [StubGeocoder(url, session_pool) for url in urls]
+    async_geocoders = [AsyncStubGeocoder(url, session_pool) for url in urls]
+
+    print(f"{'engine':<32} {'requests':>10} {'seconds':>10} {'requests/s':>12} {'threads':>8}")
+    for name, bench in (
+            ("threaded", lambda: _bench_threaded(blocking_geocoders, addresses, args.workers)),
+            ("asyncio (blocking geocoders)",
+             lambda: _bench_asyncio(blocking_geocoders, addresses, args.workers, args.concurrency)),
+            ("asyncio (native geocoders)",
+             lambda: _bench_asyncio(async_geocoders, addresses, args.workers, args.concurrency)),
+    ):
+        request_count, duration, threads = bench()
+        print(f"{name:<32} {request_count:>10,} {duration:>10.2f} {request_count / duration:>12,.0f} {threads:>8}")
+
+    print()
+    print(f"Connection reuse (threaded): {session_pool.stats()['reuse_rate']:.1%}, "
+          f"{threading.active_count()} threads still running")
+    session_pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,14 @@
 #!/usr/bin/env python3
 
-import os
 import logging
 from logging.config import dictConfig
-import pathlib
 
 import connexion
 from flask import request, has_request_context
 from flask_request_id_header.middleware import RequestID
 
 from cape_of_good_place_names import encoder, util
+from cape_of_good_place_names.geocode_jobs import runner
 
 
 class RequestFormatter(logging.Formatter):
@@ -77,10 +76,8 @@ def main():
         app.app.logger.info(f"Geocoders: {', '.join(geocoder_names)}")
 
         # Setting up GC cache
-        for geocoder in geocoder_names:
-            cache_path = pathlib.Path(app.app.config["GEOCODER_CACHE_DIR"]) / geocoder
-            app.app.logger.info(f"Creating '{cache_path}'")
-            os.makedirs(cache_path, exist_ok=True)
+        geocoder_cache = util.get_geocoder_cache()
+        app.app.logger.info(f"Geocoder cache: {geocoder_cache.__class__.__name__}")
 
         # Scrubbers
         scrubbers = util.get_scrubbers()
@@ -90,6 +87,12 @@ def main():
         )
         app.app.logger.info(f"Scrubbers: {', '.join(scrubber_names)}")
 
+    # Geocoding job workers
+    if app.app.config["GEOCODE_JOBS_WORKERS"] > 0:
+        job_runner = runner.create_job_runner(app.app)
+        job_runner.start()
+        app.app.logger.info(f"Geocoding job workers: {job_runner.workers}")
+
     # Running!
     app.run(port=8000, debug=False)
 
@@ -4,10 +4,30 @@ from geocode_array import Nominatim, CCT, ArcGIS, Google, Bing
 from basic_scrubber import BasicScrubber
 from phdc_scrubber import PhdcScrubber
 
+from cape_of_good_place_names.geocode_jobs import JobStore
+from cape_of_good_place_names.geocoder_cache import CacheRefresher, MemoryCache, SqliteCacheBackend
+from cape_of_good_place_names.geocoder_upstream import GeocoderCircuitBreaker, GeocoderExecutor, GeocoderHedger, \
+    GeocoderLimiter, GeocoderSelector, HttpSessionPool
+
 
 class ConfigNamespace(enum.Enum):
     CONFIG = "config"
     SECRETS = "secrets"
+    SHARED = "shared"  # Objects shared across the app, e.g. GEOCODER_HTTP_SESSIONS
+
+
+# Components that are set up with their class' defaults when they are left out of the config
+DEFAULT_COMPONENTS = {
+    "GEOCODER_HTTP_SESSIONS": (HttpSessionPool, {}),
+    "GEOCODER_MEMORY_CACHE": (MemoryCache, {}),
+    "GEOCODER_CACHE_REFRESHER": (CacheRefresher, {}),
+    "GEOCODER_CIRCUIT_BREAKER": (GeocoderCircuitBreaker, {}),
+    "GEOCODER_EXECUTOR": (GeocoderExecutor, {}),
+    "GEOCODER_LIMITER": (GeocoderLimiter, {}),
+    "GEOCODER_SELECTOR": (GeocoderSelector, {}),
+    "GEOCODER_HEDGER": (GeocoderHedger, {}),
+    "GEOCODE_JOB_STORE": (JobStore, {"jobs_dir": [ConfigNamespace.CONFIG, "GEOCODE_JOBS_DIR"]}),
+}
 
 
 class Config(object):
@@ -20,6 +40,9 @@ class Config(object):
 
     USER_SECRETS_SALT_KEY = "cogpn-user-salt"
     USER_SECRETS_FILE = "/data/secrets/user-secrets.json"
+    ADMIN_USERS = [
+        # Usernames allowed to access the admin endpoints, when in secure mode
+    ]
 
     # GeoLookup config
     GEOLOOKUP_DATASET_DIR = "/data/lookup_layers"
@@ -28,9 +51,20 @@ class Config(object):
     }
 
     # Geocoder config
+    GEOCODER_HTTP_POOL_CONNECTIONS = 10  # Number of hosts to keep connections open to
+    GEOCODER_HTTP_POOL_SIZE = 32  # Connections kept open per host, at least GEOCODER_EXECUTOR_WORKERS for full reuse
+    GEOCODER_HTTP_IDLE_TIMEOUT = 60  # Seconds unused after which the open connections are dropped
+    GEOCODER_HTTP_SESSIONS = (
+        HttpSessionPool, {
+            "pool_connections": [ConfigNamespace.CONFIG, "GEOCODER_HTTP_POOL_CONNECTIONS"],
+            "pool_size": [ConfigNamespace.CONFIG, "GEOCODER_HTTP_POOL_SIZE"],
+            "idle_timeout": [ConfigNamespace.CONFIG, "GEOCODER_HTTP_IDLE_TIMEOUT"],
+        }
+    )
     GEOCODERS = (
         # ( Geocoder Class: { keyword arg name: [<namespace>, key1, key2, key3] )
-        # namespaces currently supported: secrets, config
+        # namespaces currently supported: secrets, config, shared
+        # e.g. "session": [ConfigNamespace.SHARED, "GEOCODER_HTTP_SESSIONS"], for geocoders that take an HTTP session
         (
             Nominatim.Nominatim, {}
         ),
@@ -48,8 +82,144 @@ class Config(object):
         )
     )
     GEOCODERS_MIN = 3
+    # Worker threads shared by all of the upstream geocoder requests, and the number of requests that may wait for one
+    GEOCODER_EXECUTOR_WORKERS = 32
+    GEOCODER_EXECUTOR_MAX_QUEUED = 256
+    GEOCODER_EXECUTOR = (
+        GeocoderExecutor, {
+            "max_workers": [ConfigNamespace.CONFIG, "GEOCODER_EXECUTOR_WORKERS"],
+            "max_queued": [ConfigNamespace.CONFIG, "GEOCODER_EXECUTOR_MAX_QUEUED"],
+        }
+    )
+    # How a geocode request fans out to the geocoders - "threaded", from the geocoder executor, or "asyncio", from an
+    # event loop per worker, which awaits geocoders with a geocode_async coroutine without holding a thread for them
+    GEOCODE_ENGINE = "threaded"
+    GEOCODER_TIMEOUT = 10  # Seconds a geocoder is given to answer, before it is left out of the results
+    GEOCODER_TIMEOUTS = {
+        # Geocoder ID: timeout in seconds, overriding GEOCODER_TIMEOUT
+    }
+    # Return as soon as this many geocoders agree (within DISPERSION_THRESHOLD of each other), rather than waiting for
+    # all of them. None to always wait
+    GEOCODE_QUORUM = None
+    # Geocoders are queried a tier at a time, only moving on to the next tier if fewer than
+    # GEOCODER_CASCADE_MIN_AGREEING of the results so far are within GEOCODER_CASCADE_DISPERSION_THRESHOLD metres of each
+    # other. Geocoders that aren't in a tier make up a final tier of their own. None to query all of them at once, e.g.
+    # [["Nominatim", "CCT", "ArcGIS"], ["Google", "Bing"]] to only pay for the Google and Bing requests when the free
+    # geocoders disagree
+    GEOCODER_TIERS = None
+    GEOCODER_CASCADE_MIN_AGREEING = 2
+    GEOCODER_CASCADE_DISPERSION_THRESHOLD = None  # None to use geocode_array's DISPERSION_THRESHOLD
+    # Rolling statistics of each geocoder's latency, null rate and agreement, per kind of address, persisted across
+    # restarts. Geocoders are skipped once the fraction of their last GEOCODER_STATS_WINDOW answers that were on time,
+    # located and in agreement is below GEOCODER_SELECTION_MIN_CONTRIBUTION (0 to never skip), except for
+    # GEOCODER_SELECTION_EXPLORATION of requests, which keep their statistics up to date. Skipped geocoders come back
+    # as empty results, so skipping is off by default. GEOCODER_STATS_FILE is None to only keep them in memory, e.g.
+    # "/data/geocoders/stats.json" to persist them
+    GEOCODER_STATS_FILE = None
+    GEOCODER_STATS_WINDOW = 1000
+    GEOCODER_SELECTION_MIN_SAMPLES = 100
+    GEOCODER_SELECTION_MIN_CONTRIBUTION = 0
+    GEOCODER_SELECTION_EXPLORATION = 0.05
+    GEOCODER_SELECTOR = (
+        GeocoderSelector, {
+            "stats_file": [ConfigNamespace.CONFIG, "GEOCODER_STATS_FILE"],
+            "window": [ConfigNamespace.CONFIG, "GEOCODER_STATS_WINDOW"],
+            "min_samples": [ConfigNamespace.CONFIG, "GEOCODER_SELECTION_MIN_SAMPLES"],
+            "min_contribution": [ConfigNamespace.CONFIG, "GEOCODER_SELECTION_MIN_CONTRIBUTION"],
+            "exploration": [ConfigNamespace.CONFIG, "GEOCODER_SELECTION_EXPLORATION"],
+        }
+    )
+    # Requests to these geocoders are hedged - if one hasn't been answered by the GEOCODER_HEDGE_QUANTILE of the
+    # geocoder's recent latencies (once there are GEOCODER_HEDGE_MIN_SAMPLES of them), an identical request is made, and
+    # whichever answers first is used. At most GEOCODER_HEDGE_BUDGET of a geocoder's requests are hedged.
+    GEOCODER_HEDGED = []
+    GEOCODER_HEDGE_QUANTILE = 0.95
+    GEOCODER_HEDGE_MIN_SAMPLES = 20
+    GEOCODER_HEDGE_BUDGET = 0.05
+    GEOCODER_HEDGE_MAX_BURST = 10  # Unused hedges that may be saved up
+    GEOCODER_HEDGE_WORKERS = 16  # Threads that the threaded engine's hedged requests are made on
+    GEOCODER_HEDGER = (
+        GeocoderHedger, {
+            "geocoders": [ConfigNamespace.CONFIG, "GEOCODER_HEDGED"],
+            "budget": [ConfigNamespace.CONFIG, "GEOCODER_HEDGE_BUDGET"],
+            "max_burst": [ConfigNamespace.CONFIG, "GEOCODER_HEDGE_MAX_BURST"],
+            "workers": [ConfigNamespace.CONFIG, "GEOCODER_HEDGE_WORKERS"],
+        }
+    )
+    # Geocoders are skipped for GEOCODER_CIRCUIT_BREAKER_OPEN_DURATION seconds once at least this fraction of their
+    # requests over the last GEOCODER_CIRCUIT_BREAKER_WINDOW seconds have failed
+    GEOCODER_CIRCUIT_BREAKER_FAILURE_RATE = 0.5
+    GEOCODER_CIRCUIT_BREAKER_WINDOW = 60
+    GEOCODER_CIRCUIT_BREAKER_MIN_REQUESTS = 10  # Requests in the window needed before a geocoder is skipped
+    GEOCODER_CIRCUIT_BREAKER_OPEN_DURATION = 30
+    GEOCODER_CIRCUIT_BREAKER = (
+        GeocoderCircuitBreaker, {
+            "window": [ConfigNamespace.CONFIG, "GEOCODER_CIRCUIT_BREAKER_WINDOW"],
+            "failure_rate": [ConfigNamespace.CONFIG, "GEOCODER_CIRCUIT_BREAKER_FAILURE_RATE"],
+            "min_requests": [ConfigNamespace.CONFIG, "GEOCODER_CIRCUIT_BREAKER_MIN_REQUESTS"],
+            "open_duration": [ConfigNamespace.CONFIG, "GEOCODER_CIRCUIT_BREAKER_OPEN_DURATION"],
+        }
+    )
+    GEOCODER_LIMITS = {
+        # Geocoder ID: {"max_in_flight": requests, "requests_per_second": rate, "burst": requests}, any may be left out
+        # Nominatim's usage policy allows an absolute maximum of 1 request per second
+        "Nominatim": {"max_in_flight": 1, "requests_per_second": 1},
+    }
+    GEOCODER_LIMIT_MAX_WAIT = 30  # Seconds a request waits for its geocoder's limits, or until its timeout if sooner
+    GEOCODER_LIMITER = (
+        GeocoderLimiter, {
+            "limits": [ConfigNamespace.CONFIG, "GEOCODER_LIMITS"],
+            "max_wait": [ConfigNamespace.CONFIG, "GEOCODER_LIMIT_MAX_WAIT"],
+        }
+    )
+    GEOCODE_BATCH_MAX_ADDRESSES = 1000
+    GEOCODE_BATCH_STREAM_MAX_ADDRESSES = 100000  # Limit for batches streamed back as newline delimited JSON
+    GEOCODE_JOBS_DIR = "/data/geocoders/jobs"
+    GEOCODE_JOBS_MAX_ADDRESSES = 2000000
+    GEOCODE_JOBS_WORKERS = 1  # Job worker threads in the server, 0 if jobs are only run by cogpn-geocode-worker
+    GEOCODE_JOBS_CHUNK_SIZE = 100  # Addresses geocoded between saving a job's progress
+    GEOCODE_JOBS_LEASE = 600  # Seconds without progress after which a running job is assumed dead, and restarted
+    GEOCODE_JOBS_MAX_ATTEMPTS = 3  # Times a job is tried (one per lease) before it is failed
+    GEOCODE_JOB_STORE = (
+        JobStore, {"jobs_dir": [ConfigNamespace.CONFIG, "GEOCODE_JOBS_DIR"]}
+    )
+    GEOCODE_BATCH_CONCURRENCY = 8  # Geocoder requests in flight at once, per batch
     GEOCODER_CACHE_DIR = "/data/geocoders/cache"
     GEOCODER_CACHE_AGE_THRESHOLD = 90 * 86400  # 90 days, in seconds
+    # Results where the geocoder found no match. Transient failures are never cached.
+    GEOCODER_NEGATIVE_CACHE_AGE_THRESHOLD = 7 * 86400  # 7 days, in seconds
+    GEOCODER_NEGATIVE_CACHE_AGE_THRESHOLDS = {
+        # Geocoder ID: threshold in seconds, overriding GEOCODER_NEGATIVE_CACHE_AGE_THRESHOLD
+    }
+    # Expired entries younger than the age threshold plus this grace period are still returned, while being refreshed
+    # in the background
+    GEOCODER_CACHE_STALE_GRACE_PERIOD = 14 * 86400  # 14 days, in seconds
+    GEOCODER_CACHE_REFRESH_WORKERS = 2
+    GEOCODER_CACHE_REFRESHER = (
+        CacheRefresher, {"max_workers": [ConfigNamespace.CONFIG, "GEOCODER_CACHE_REFRESH_WORKERS"]}
+    )
+    GEOCODER_CACHE_NORMALISE_KEYS = True  # Case fold, collapse punctuation and expand abbreviations in cache keys
+    GEOCODER_CACHE_COMPRESSION = None  # None, "zlib" or "zstd" (requires the zstandard package)
+    GEOCODER_CACHE_BACKEND = (
+        # ( Cache Backend Class: { keyword arg name: [<namespace>, key1, key2, key3] )
+        SqliteCacheBackend, {
+            "cache_dir": [ConfigNamespace.CONFIG, "GEOCODER_CACHE_DIR"],
+            "compression": [ConfigNamespace.CONFIG, "GEOCODER_CACHE_COMPRESSION"],
+        }
+    )
+    GEOCODER_CACHE_MAX_BYTES = None  # Size budget enforced by cogpn-evict-cache, None for no limit
+    GEOCODER_CACHE_MAX_ENTRIES = None  # Entry budget enforced by cogpn-evict-cache, None for no limit
+    # Minimum seconds between working out the cache's size for the metrics, which means scanning the whole cache
+    GEOCODER_CACHE_USAGE_INTERVAL = 300
+    GEOCODER_MEMORY_CACHE_MAX_ENTRIES = 100000
+    GEOCODER_MEMORY_CACHE_MAX_BYTES = 128 * 2 ** 20  # 128 MiB
+    GEOCODER_MEMORY_CACHE = (
+        MemoryCache, {
+            "max_entries": [ConfigNamespace.CONFIG, "GEOCODER_MEMORY_CACHE_MAX_ENTRIES"],
+            "max_bytes": [ConfigNamespace.CONFIG, "GEOCODER_MEMORY_CACHE_MAX_BYTES"],
+            "ttl": [ConfigNamespace.CONFIG, "GEOCODER_CACHE_AGE_THRESHOLD"],
+        }
+    )
 
     # Scrub config
     SCRUBBER_DATASET_DIR = "/data/scrubber_data"
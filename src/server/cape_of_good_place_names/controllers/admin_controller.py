@@ -0,0 +1,186 @@
+import threading
+import time
+
+from flask import current_app, request, Response
+
+from cape_of_good_place_names.models.error import Error  # noqa: E501
+from cape_of_good_place_names import util
+from cape_of_good_place_names.geocoder_upstream import breaker
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_cache_usage = {"backend": None, "usage": None, "timestamp": None}
+_cache_usage_lock = threading.Lock()
+
+
+def _is_admin():
+    if not util.secure_mode():
+        current_app.logger.warning("Allowing admin access because I'm not in secure mode!")
+        return True
+
+    username = request.authorization.username if request.authorization else None
+    return username in current_app.config["ADMIN_USERS"]
+
+
+def _get_cache_usage():
+    """The cache backend's usage, worked out at most every GEOCODER_CACHE_USAGE_INTERVAL seconds, as it means scanning
+    the whole cache
+
+    :return: {geocoder ID: (number of entries, size in bytes)}
+    """
+    cache_backend = util.get_geocoder_cache()
+    with _cache_usage_lock:
+        if (
+                _cache_usage["backend"] is not cache_backend or
+                time.monotonic() - _cache_usage["timestamp"] >= current_app.config["GEOCODER_CACHE_USAGE_INTERVAL"]
+        ):
+            current_app.logger.debug("Working out the cache usage...")
+            _cache_usage.update(backend=cache_backend, usage=cache_backend.usage(), timestamp=time.monotonic())
+
+        return _cache_usage["usage"]
+
+
+def _update_cache_gauges(metrics, cache_usage):
+    for geocoder_id, (entry_count, total_size) in cache_usage.items():
+        metrics.set_gauge("geocoder_cache_entries", entry_count, geocoder=geocoder_id)
+        metrics.set_gauge("geocoder_cache_bytes", total_size, geocoder=geocoder_id)
+
+    for stat, value in util.get_geocoder_memory_cache().stats().items():
+        metrics.set_gauge(f"geocoder_memory_cache_{stat}", value)
+
+    for stat, value in util.get_geocoder_cache_refresher().stats().items():
+        metrics.set_gauge(f"geocoder_cache_refresher_{stat}", value)
+
+
+def _update_limit_gauges(metrics):
+    for geocoder_id, limit_stats in util.get_geocoder_limiter().stats().items():
+        metrics.set_gauge("geocoder_limit_in_flight", limit_stats["in_flight"], geocoder=geocoder_id)
+        metrics.set_gauge("geocoder_limit_waiting", limit_stats["waiting"], geocoder=geocoder_id)
+
+
+def _update_executor_gauges(metrics):
+    executor_stats = util.get_geocoder_executor().stats()
+    for stat in ("active", "queued", "utilisation", "submitted", "completed", "rejected"):
+        metrics.set_gauge(f"geocoder_executor_{stat}", executor_stats[stat])
+    for quantile in ("p50", "p95", "p99"):
+        metrics.set_gauge("geocoder_executor_queue_wait_seconds", executor_stats["queue_wait"][quantile] or 0,
+                          quantile=quantile)
+
+
+def _update_http_session_gauges(metrics):
+    for stat, value in util.get_geocoder_http_sessions().stats().items():
+        metrics.set_gauge(f"geocoder_http_{stat}", value or 0)
+
+
+def _update_event_loop_gauges(metrics):
+    for stat, value in util.get_geocode_event_loop().stats().items():
+        metrics.set_gauge(f"geocode_event_loop_{stat}", value)
+
+
+def _update_selection_gauges(metrics):
+    for geocoder_id, kind_stats in util.get_geocoder_selector().stats().items():
+        for kind, geocoder_stats in kind_stats.items():
+            for stat in ("null_rate", "agreement_rate", "latency_p95"):
+                if geocoder_stats[stat] is not None:
+                    metrics.set_gauge(f"geocoder_{stat}", geocoder_stats[stat], geocoder=geocoder_id, kind=kind)
+
+
+def _update_hedge_gauges(metrics):
+    for geocoder_id, hedge_stats in util.get_geocoder_hedger().stats().items():
+        for stat, value in hedge_stats.items():
+            metrics.set_gauge(f"geocoder_hedge_{stat}", value, geocoder=geocoder_id)
+
+
+def _update_circuit_gauges(metrics):
+    for geocoder_id, circuit_stats in util.get_geocoder_circuit_breaker().stats().items():
+        for state in (breaker.STATE_CLOSED, breaker.STATE_OPEN, breaker.STATE_HALF_OPEN):
+            metrics.set_gauge("geocoder_circuit_state", int(circuit_stats["state"] == state),
+                              geocoder=geocoder_id, state=state)
+
+
+def _geocoder_cache_summary(metrics, cache_usage):
+    geocoder_ids = set(cache_usage.keys()) | {
+        geocoder.__class__.__name__ for geocoder in util.get_geocoders()
+    }
+
+    def _lookups(geocoder_id, outcome, tiers):
+        return sum(
+            metrics.get_counter("geocoder_cache_lookups_total", geocoder=geocoder_id, outcome=outcome, tier=tier)
+            for tier in tiers
+        )
+
+    return {
+        geocoder_id: {
+            "hits": _lookups(geocoder_id, "hit", ("memory", "backend")),
+            "memory_hits": _lookups(geocoder_id, "hit", ("memory",)),
+            "stale_hits": _lookups(geocoder_id, "stale_hit", ("memory", "backend")),
+            "misses": _lookups(geocoder_id, "miss", ("none",)),
+            "memory_read_latency": metrics.get_histogram("geocoder_cache_read_seconds",
+                                                         geocoder=geocoder_id, tier="memory"),
+            "backend_read_latency": metrics.get_histogram("geocoder_cache_read_seconds",
+                                                          geocoder=geocoder_id, tier="backend"),
+            "write_latency": metrics.get_histogram("geocoder_cache_write_seconds", geocoder=geocoder_id),
+            "entries": metrics.get_gauge("geocoder_cache_entries", geocoder=geocoder_id) or 0,
+            "bytes": metrics.get_gauge("geocoder_cache_bytes", geocoder=geocoder_id) or 0,
+        }
+        for geocoder_id in sorted(geocoder_ids)
+    }
+
+
+def metrics(output=None):  # noqa: E501
+    """Return the service's operational metrics, including per geocoder cache statistics
+
+     # noqa: E501
+
+    :param output: Output format - json (default) or prometheus
+    :type output: str
+
+    :rtype: object
+    """
+    current_app.logger.info("Fetch[ing] metrics...")
+    if not _is_admin():
+        current_app.logger.warning("Refusing metrics to a non-admin user")
+        return Error(code=403, message="Sorry - only admin users may access metrics!"), 403
+
+    metrics_registry = util.get_metrics()
+    cache_usage = _get_cache_usage()
+    _update_cache_gauges(metrics_registry, cache_usage)
+    _update_limit_gauges(metrics_registry)
+    _update_circuit_gauges(metrics_registry)
+    _update_executor_gauges(metrics_registry)
+    _update_http_session_gauges(metrics_registry)
+    _update_event_loop_gauges(metrics_registry)
+    _update_selection_gauges(metrics_registry)
+    _update_hedge_gauges(metrics_registry)
+
+    if output == "prometheus":
+        response = Response(metrics_registry.to_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+    else:
+        response = {
+            "id": util.get_request_uuid(),
+            "timestamp": util.get_timestamp().isoformat(),
+            "geocoder_cache": {
+                "backend": util.get_geocoder_cache().__class__.__name__,
+                "geocoders": _geocoder_cache_summary(metrics_registry, cache_usage),
+                "memory_cache": util.get_geocoder_memory_cache().stats(),
+                "refresher": util.get_geocoder_cache_refresher().stats(),
+            },
+            "geocoder_circuits": util.get_geocoder_circuit_breaker().stats(),
+            "geocoder_executor": util.get_geocoder_executor().stats(),
+            "geocode_event_loop": util.get_geocode_event_loop().stats(),
+            "geocoder_hedging": util.get_geocoder_hedger().stats(),
+            "geocoder_http_sessions": util.get_geocoder_http_sessions().stats(),
+            "geocoder_selection": util.get_geocoder_selector().stats(),
+            "geocoder_single_flight": util.get_geocoder_single_flight().stats(),
+            "geocoder_limits": {
+                geocoder_id: {
+                    **limit_stats,
+                    "wait": metrics_registry.get_histogram("geocoder_limit_wait_seconds", geocoder=geocoder_id),
+                }
+                for geocoder_id, limit_stats in util.get_geocoder_limiter().stats().items()
+            },
+            "metrics": metrics_registry.to_dict(),
+        }
+    current_app.logger.info("...Fetch[ed] metrics")
+
+    return response
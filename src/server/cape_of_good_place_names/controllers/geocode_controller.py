@@ -1,27 +1,41 @@
-import base64
 import datetime
-import pathlib
-import pickle
-import pprint
 
-from flask import current_app, json
-from geocode_array import geocode_array
+import pytz
+from flask import current_app, json, request, Response, stream_with_context
 
-from cape_of_good_place_names.models.geocode_result import GeocodeResult
+from cape_of_good_place_names import geocoding
+from cape_of_good_place_names.geocoder_cache import lookup
+from cape_of_good_place_names.models.error import Error  # noqa: E501
+from cape_of_good_place_names.models.geocode_batch_result import GeocodeBatchResult  # noqa: E501
+from cape_of_good_place_names.models.geocode_batch_results import GeocodeBatchResults  # noqa: E501
+from cape_of_good_place_names.models.geocode_job import GeocodeJob  # noqa: E501
 from cape_of_good_place_names.models.geocode_results import GeocodeResults  # noqa: E501
+from cape_of_good_place_names.models.geocoder_status import GeocoderStatus  # noqa: E501
 from cape_of_good_place_names import util
 
+JSON_MIMETYPE = "application/json"
+NDJSON_MIMETYPE = "application/x-ndjson"
 
-def geocoders():  # noqa: E501
+
+def geocoders(include_status=None):  # noqa: E501
     """Return list of supported geocoder IDs
 
      # noqa: E501
 
+    :param include_status: Return each geocoder's status, rather than just its ID
+    :type include_status: bool
 
     :rtype: List[str]
     """
     geocoder_names = [geocoder.__class__.__name__ for geocoder in util.get_geocoders()]
-    return geocoder_names
+    if not include_status:
+        return geocoder_names
+
+    circuit_breaker = util.get_geocoder_circuit_breaker()
+    return [
+        GeocoderStatus(geocoder_id=geocoder_name, circuit_state=circuit_breaker.state(geocoder_name))
+        for geocoder_name in geocoder_names
+    ]
 
 
 def geocode_v1(address):  # noqa: E501
@@ -39,135 +53,46 @@ def geocode_v1(address):  # noqa: E501
     return geocode(address)
 
 
-def _get_cache_path(geocoder, address):
-    address_filename = base64.b64encode(address.encode()).decode() + ".pickle.gz"
-    cache_path = pathlib.Path(current_app.config["GEOCODER_CACHE_DIR"]) / geocoder.__class__.__name__ / address_filename
-
-    return cache_path
-
-
-def _get_cached_result(geocoder, address):
-    cache_path = _get_cache_path(geocoder, address)
-    current_app.logger.debug(f"{geocoder.__class__.__name__} + '{address}' -> '{cache_path}'")
-
-    creation_threshold = current_app.config["GEOCODER_CACHE_AGE_THRESHOLD"]
-    now = datetime.datetime.now()
-    if cache_path.exists() and (now.timestamp() - cache_path.stat().st_ctime) < creation_threshold:
-        current_app.logger.debug(f"Found '{cache_path}' for '{address}', newer than {creation_threshold} seconds, using it")
-        with open(cache_path, 'rb') as cache_file:
-            return pickle.load(cache_file)
-    elif cache_path.exists():
-        current_app.logger.debug(f"Found '{cache_path}', but it is too old")
-    else:
-        current_app.logger.debug(f"Didn't find '{cache_path}'")
-
-    return None
-
+def geocode(address, geocoders=None):  # noqa: E501
+    """Translate a free form address into a spatial coordinate
 
-def _update_cache(geocoder, address, result):
-    cache_path = _get_cache_path(geocoder, address)
-    current_app.logger.debug(f"Writing '{cache_path}'")
+     # noqa: E501
 
-    with open(cache_path, "wb") as cache_file:
-        pickle.dump(result, cache_file)
-        cache_file.flush()
+    :param address: Free form address string to geocode
+    :type address: str
 
-    return result
+    :rtype: GeocodeResults
+    """
+    return _geocode(address, geocoders, encode_values=True)
 
 
-def geocode(address, geocoders=None):  # noqa: E501
-    """Translate a free form address into a spatial coordinate
+def geocode_v1_2(address, geocoders=None):  # noqa: E501
+    """Translate a free form address into a spatial coordinate, with each geocoded value as a GeoJSON object
 
      # noqa: E501
 
     :param address: Free form address string to geocode
     :type address: str
+    :param geocoders: ID of Geocoders that should be used
+    :type geocoders: List[str]
 
     :rtype: GeocodeResults
     """
+    return _geocode(address, geocoders, encode_values=False)
+
+
+def _geocode(address, geocoders, encode_values):
     request_timestamp = util.get_timestamp()
     current_app.logger.info("Geocod[ing]...")
     current_app.logger.debug("address='{}'".format(address))
 
-    # Actually doing the geocoding
-    geocoder_classes = [
-        geocoder for geocoder in util.get_geocoders()
-        if (geocoders is None) or
-           (geocoders and geocoder.__class__.__name__ in geocoders)
-    ]
-    cached_results = dict(filter(lambda tup: tup[1], (
-        (geocoder, _get_cached_result(geocoder, address))
-        for geocoder in geocoder_classes
-    )))
-    fresh_results = {
-        geocoder: _update_cache(geocoder, address, result)
-        for geocoder, result in
-        zip(geocoder_classes, geocode_array.threaded_geocode(geocoder_classes, address))
-        if geocoder not in cached_results
-    }
-    combined_results = {**cached_results, **fresh_results}
-    geocoder_results = {
-        geocoder: (
-            {
-                "type": "FeatureCollection",
-                "features": [{
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "Point",
-                        "coordinates": [result[2], result[1]]  # converting Geocoder (lat, long) -> GeoJSON Point (x, y)
-                    },
-                    "properties": {
-                        "address": result[0]
-                    }
-                }]
-            } if result[1] is not None
-            else None
-        )
-        for geocoder, result in combined_results.items()
-    }
-    current_app.logger.debug("geocoder_results=\n'{pprint.pformat(geocoder_results)}'")
-
-    response_results = [
-        GeocodeResult(geocoder.__class__.__name__, json.dumps(geocoder_result), 1 if geocoder_result else 0)
-        for geocoder, geocoder_result in geocoder_results.items()
-    ]
+    cache_key = lookup.get_cache_key(address)
+    current_app.logger.debug(f"cache_key='{cache_key}'")
 
-    # Merging in a combined result
-    combined_result = geocode_array.combine_geocode_results(
-        [
-            (gc.__class__.__name__, *result_tuple)
-            for gc, result_tuple in combined_results.items()
-            if None not in result_tuple[:3]
-        ]
-    )
-    current_app.logger.debug("combined_result=\n'{}'".format(pprint.pformat(combined_result)))
-
-    if combined_result and None not in combined_result[:2]:
-        current_app.logger.debug("Adding in combined_result")
-        combined_confidence = 1
-        combined_confidence -= (
-                (geocode_array.DISPERSION_THRESHOLD - combined_result[2]) /
-                geocode_array.DISPERSION_THRESHOLD
-        )
-
-        response_results += [
-            GeocodeResult("CombinedGeocoders",
-                          json.dumps({
-                              "type": "FeatureCollection",
-                              "features": [{
-                                  "type": "Feature",
-                                  "geometry": {
-                                      "type": "Point",
-                                      "coordinates": [combined_result[1], combined_result[0]]
-                                  },
-                                  "properties": {
-                                      "geocoders": combined_result[-1]
-                                  }
-                              }]
-                          }), combined_confidence)
-        ]
-    else:
-        current_app.logger.warning("Combined result not merged in")
+    # Actually doing the geocoding
+    geocoder_classes = geocoding.get_geocoders(geocoders)
+    combined_results = geocoding.geocode_address(address, cache_key, geocoder_classes)
+    response_results = geocoding.format_results(combined_results, encode_values)
 
     response = GeocodeResults(
         id=util.get_request_uuid(),
@@ -177,3 +102,163 @@ def geocode(address, geocoders=None):  # noqa: E501
     current_app.logger.info("...Geocod[ed]".format(address))
 
     return response
+
+
+def _stream_batch_results(addresses, cache_keys, unique_addresses, geocoder_classes):
+    """Streams the results as newline delimited JSON, a GeocodeBatchResult per line, written as soon as each address
+    has been geocoded.
+    """
+    # Only holding onto the input positions of each address, the results are written out as they arrive
+    indices = {}
+    for index, cache_key in enumerate(cache_keys):
+        indices.setdefault(cache_key, []).append(index)
+
+    def _result_lines():
+        for cache_key, combined_results in geocoding.iter_geocoded_addresses(unique_addresses, geocoder_classes):
+            response_results = geocoding.format_results(combined_results)
+            for index in indices.pop(cache_key):
+                batch_result = GeocodeBatchResult(index=index, address=addresses[index], results=response_results)
+                yield json.dumps(batch_result.to_dict()) + "\n"
+
+        current_app.logger.info("...Batch geocod[ed]")
+
+    return Response(stream_with_context(_result_lines()), mimetype=NDJSON_MIMETYPE)
+
+
+def geocode_batch(body):  # noqa: E501
+    """Translate many free form addresses into spatial coordinates
+
+     # noqa: E501
+
+    :param body: Addresses to geocode, and optionally the IDs of the geocoders that should be used
+    :type body: dict
+
+    :rtype: GeocodeBatchResults
+    """
+    request_timestamp = util.get_timestamp()
+    addresses = body["addresses"]
+    geocoders = body.get("geocoders", None)
+    stream = request.accept_mimetypes.best_match([JSON_MIMETYPE, NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+    current_app.logger.info(f"Batch geocod[ing] {len(addresses)} addresses{' (streaming)' if stream else ''}...")
+
+    max_addresses = current_app.config[
+        "GEOCODE_BATCH_STREAM_MAX_ADDRESSES" if stream else "GEOCODE_BATCH_MAX_ADDRESSES"
+    ]
+    if len(addresses) > max_addresses:
+        return Error(code=400, message=f"Sorry - batches are limited to {max_addresses} addresses!"), 400
+
+    unknown_geocoders = geocoding.get_unknown_geocoders(geocoders)
+    if unknown_geocoders:
+        return Error(code=400, message=f"Sorry - there are no geocoders {', '.join(unknown_geocoders)}!"), 400
+
+    # Deduplicating the addresses, so that each is only geocoded once
+    cache_keys = [lookup.get_cache_key(address) for address in addresses]
+    unique_addresses = {}
+    for address, cache_key in zip(addresses, cache_keys):
+        unique_addresses.setdefault(cache_key, address)
+    current_app.logger.debug(f"{len(unique_addresses)} unique addresses")
+
+    geocoder_classes = geocoding.get_geocoders(geocoders)
+    if stream:
+        return _stream_batch_results(addresses, cache_keys, unique_addresses, geocoder_classes)
+
+    address_results = dict(geocoding.iter_geocoded_addresses(unique_addresses, geocoder_classes))
+    response_results = {
+        cache_key: geocoding.format_results(combined_results)
+        for cache_key, combined_results in address_results.items()
+    }
+
+    response = GeocodeBatchResults(
+        id=util.get_request_uuid(),
+        timestamp=request_timestamp,
+        results=[
+            GeocodeBatchResult(index=index, address=address, results=response_results[cache_key])
+            for index, (address, cache_key) in enumerate(zip(addresses, cache_keys))
+        ]
+    )
+    current_app.logger.info("...Batch geocod[ed]")
+
+    return response
+
+
+def _job_response(job):
+    tz = pytz.timezone(current_app.config["TIMEZONE"])
+
+    return GeocodeJob(
+        job_id=job["job_id"],
+        status=job["status"],
+        total=job["total"],
+        completed=job["completed"],
+        created=datetime.datetime.fromtimestamp(job["created"], tz=tz),
+        updated=datetime.datetime.fromtimestamp(job["updated"], tz=tz),
+        error=job["error"],
+    )
+
+
+def geocode_job_submit(body):  # noqa: E501
+    """Queue many free form addresses to be geocoded in the background
+
+     # noqa: E501
+
+    :param body: Addresses to geocode, and optionally the IDs of the geocoders that should be used
+    :type body: dict
+
+    :rtype: GeocodeJob
+    """
+    addresses = body["addresses"]
+    geocoders = body.get("geocoders", None)
+    current_app.logger.info(f"Queu[ing] geocoding job of {len(addresses)} addresses...")
+
+    max_addresses = current_app.config["GEOCODE_JOBS_MAX_ADDRESSES"]
+    if len(addresses) > max_addresses:
+        return Error(code=400, message=f"Sorry - jobs are limited to {max_addresses} addresses!"), 400
+
+    # Checking the geocoders up front, rather than failing once the job is running
+    unknown_geocoders = geocoding.get_unknown_geocoders(geocoders)
+    if unknown_geocoders:
+        return Error(code=400, message=f"Sorry - there are no geocoders {', '.join(unknown_geocoders)}!"), 400
+
+    job_store = util.get_geocode_job_store()
+    job_id = job_store.create_job(addresses, geocoders)
+    current_app.logger.info(f"...Queu[ed] geocoding job '{job_id}'")
+
+    return _job_response(job_store.get_job(job_id)), 202
+
+
+def geocode_job_status(job_id):  # noqa: E501
+    """Return the progress of a geocoding job
+
+     # noqa: E501
+
+    :param job_id: ID of the job
+    :type job_id: str
+
+    :rtype: GeocodeJob
+    """
+    job = util.get_geocode_job_store().get_job(job_id)
+    if job is None:
+        return Error(code=404, message=f"Sorry - there is no job '{job_id}'!"), 404
+
+    return _job_response(job)
+
+
+def geocode_job_results(job_id):  # noqa: E501
+    """Return the results of a geocoding job, so far
+
+     # noqa: E501
+
+    :param job_id: ID of the job
+    :type job_id: str
+
+    :rtype: GeocodeBatchResult
+    """
+    job_store = util.get_geocode_job_store()
+    if job_store.get_job(job_id) is None:
+        return Error(code=404, message=f"Sorry - there is no job '{job_id}'!"), 404
+
+    # The results are already serialised, so they're passed straight through
+    def _result_lines():
+        for _, result in job_store.iter_results(job_id):
+            yield result + "\n"
+
+    return Response(stream_with_context(_result_lines()), mimetype=NDJSON_MIMETYPE)
@@ -0,0 +1,6 @@
+# coding: utf-8
+
+# flake8: noqa
+from __future__ import absolute_import
+# import job store into geocode jobs package
+from cape_of_good_place_names.geocode_jobs.store import JobStore
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+import argparse
+import logging
+import threading
+
+import flask
+from flask import current_app
+
+from cape_of_good_place_names import geocoding, util
+from cape_of_good_place_names.geocoder_cache import lookup
+from cape_of_good_place_names.models.geocode_batch_result import GeocodeBatchResult
+
+
+class JobRunner(object):
+    """Pool of worker threads that work through the queued geocoding jobs, a chunk of addresses at a time.
+
+    Results are saved after every chunk, so a job that is interrupted only loses the chunk that was in progress. A job
+    that hits an error is left for its lease to expire, and is then tried again, up to max_attempts times.
+    """
+
+    def __init__(self, app, job_store, workers=1, chunk_size=100, lease=300, poll_interval=5, max_attempts=3):
+        """
+        :param app: Flask app, configured with the geocoders and cache to use
+        :param job_store: Store to take jobs from, and save results to
+        :type job_store: store.JobStore
+        :param workers: Number of jobs to work on at once
+        :type workers: int
+        :param chunk_size: Number of addresses to geocode between saving results
+        :type chunk_size: int
+        :param lease: Number of seconds a worker's claim on a job lasts without progress
+        :type lease: float
+        :param poll_interval: Number of seconds between checks for new jobs, when idle
+        :type poll_interval: float
+        :param max_attempts: Number of times a job is tried before it is failed
+        :type max_attempts: int
+        """
+        self.app = app
+        self.job_store = job_store
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def _geocode_chunk(self, job, pending):
+        addresses = [address for _, address in pending]
+        cache_keys = [lookup.get_cache_key(address) for address in addresses]
+        unique_addresses = {}
+        for address, cache_key in zip(addresses, cache_keys):
+            unique_addresses.setdefault(cache_key, address)
+
+        geocoder_classes = geocoding.get_geocoders(job["geocoders"])
+        address_results = dict(geocoding.iter_geocoded_addresses(unique_addresses, geocoder_classes))
+        response_results = {
+            cache_key: geocoding.format_results(combined_results)
+            for cache_key, combined_results in address_results.items()
+        }
+
+        return [
+            (address_index, flask.json.dumps(
+                GeocodeBatchResult(index=address_index, address=address, results=response_results[cache_key]).to_dict()
+            ))
+            for (address_index, address), cache_key in zip(pending, cache_keys)
+        ]
+
+    def process_job(self, job_id, lease_token):
+        """Geocodes the job's outstanding addresses, saving the results as it goes, for as long as it holds the lease"""
+        with self.app.app_context():
+            job = self.job_store.get_job(job_id)
+            current_app.logger.info(f"Process[ing] job '{job_id}' ({job['completed']}/{job['total']} done)...")
+
+            # The geocoders going missing isn't going to be fixed by trying again
+            unknown_geocoders = geocoding.get_unknown_geocoders(job["geocoders"])
+            if unknown_geocoders:
+                current_app.logger.error(f"Job '{job_id}' failed because of unknown geocoders {unknown_geocoders}")
+                self.job_store.finish_job(job_id, lease_token,
+                                          error=f"Unknown geocoders: {', '.join(unknown_geocoders)}")
+                return
+
+            try:
+                while not self._stop_event.is_set():
+                    pending = self.job_store.pending_addresses(job_id, self.chunk_size)
+                    if not pending:
+                        if self.job_store.finish_job(job_id, lease_token):
+                            current_app.logger.info(f"...Process[ed] job '{job_id}'")
+                        break
+
+                    if not (self.job_store.renew_lease(job_id, lease_token, self.lease) and
+                            self.job_store.save_results(job_id, lease_token, self._geocode_chunk(job, pending))):
+                        current_app.logger.warning(f"Lost the lease on job '{job_id}', leaving it to its new worker")
+                        break
+            except Exception as e:
+                current_app.logger.error(
+                    f"Job '{job_id}' stopped because '{e.__class__.__name__}: {e}', "
+                    f"it will be tried again once its lease expires"
+                )
+                self.job_store.record_error(job_id, lease_token, f"{e.__class__.__name__}: {e}")
+
+    def run_once(self):
+        """Claims and processes a single job
+
+        :return: ID of the job that was processed, or None if there weren't any
+        """
+        claim = self.job_store.claim_job(self.lease, self.max_attempts)
+        if claim is None:
+            return None
+
+        job_id, lease_token = claim
+        self.process_job(job_id, lease_token)
+
+        return job_id
+
+    def _work(self):
+        while not self._stop_event.is_set():
+            try:
+                job_id = self.run_once()
+            except Exception as e:
+                logging.error(f"Job worker error '{e.__class__.__name__}: {e}'")
+                job_id = None
+
+            if job_id is None:
+                self._stop_event.wait(self.poll_interval)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"cogpn-geocode-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def stop(self, timeout=None):
+        """Stops the workers, after the chunks in progress. Unfinished jobs are picked up again once their lease
+        expires.
+        """
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+
+def create_job_runner(app):
+    """Sets up a job runner from the app's config"""
+    with app.app_context():
+        job_store = util.get_geocode_job_store()
+
+    return JobRunner(app, job_store,
+                     workers=app.config["GEOCODE_JOBS_WORKERS"],
+                     chunk_size=app.config["GEOCODE_JOBS_CHUNK_SIZE"],
+                     lease=app.config["GEOCODE_JOBS_LEASE"],
+                     max_attempts=app.config["GEOCODE_JOBS_MAX_ATTEMPTS"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Worker process for geocoding jobs, alongside (or instead of) the server's own job workers",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("-w", "--workers", type=int, required=False,
+                        help="Number of jobs to work on at once. Defaults to GEOCODE_JOBS_WORKERS")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Verbosity flag")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s-cogpn-geocode-worker [%(levelname)s]: %(message)s')
+
+    app = flask.Flask("cogpn-geocode-worker")
+    app.config.from_object("cape_of_good_place_names.config.config.Config")
+
+    job_runner = create_job_runner(app)
+    job_runner.workers = args.workers or job_runner.workers
+
+    logging.info(f"Work[ing] on geocoding jobs with {job_runner.workers} worker(s)...")
+    job_runner.start()
+    try:
+        job_runner.join()
+    except KeyboardInterrupt:
+        logging.info("...Stopp[ing]")
+        job_runner.stop()
+
+
+if __name__ == "__main__":
+    main()
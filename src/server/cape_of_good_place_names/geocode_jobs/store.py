@@ -0,0 +1,269 @@
+import datetime
+import json
+import logging
+import pathlib
+import sqlite3
+import threading
+import uuid
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class JobStore(object):
+    """Persistent queue of geocoding jobs, and their results, in a single SQLite database file.
+
+    Jobs are claimed by workers with a lease, which the worker renews as it makes progress. A job whose lease has run
+    out (e.g. because the server was restarted part way through) is picked up again by the next worker, which carries on
+    from the addresses that don't have results yet. Each claim has its own lease token, and updates made with a token
+    that has since been superseded are ignored, so a worker that has lost its lease can't overwrite its successor's work.
+    """
+    DB_FILENAME = "geocode_jobs.sqlite3"
+    BUSY_TIMEOUT = 30  # seconds
+
+    def __init__(self, jobs_dir, db_filename=DB_FILENAME):
+        self.db_path = pathlib.Path(jobs_dir) / db_filename
+        self._local = threading.local()
+
+    def _get_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            logging.debug(f"Connecting to '{self.db_path}'")
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+            connection = sqlite3.connect(str(self.db_path), timeout=self.BUSY_TIMEOUT, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS geocode_jobs ("
+                "job_id TEXT NOT NULL PRIMARY KEY, "
+                "status TEXT NOT NULL, "
+                "geocoders TEXT, "
+                "total INTEGER NOT NULL, "
+                "completed INTEGER NOT NULL DEFAULT 0, "
+                "created REAL NOT NULL, "
+                "updated REAL NOT NULL, "
+                "lease_expires REAL, "
+                "lease_token TEXT, "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "error TEXT"
+                ")"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS geocode_job_addresses ("
+                "job_id TEXT NOT NULL, "
+                "address_index INTEGER NOT NULL, "
+                "address TEXT NOT NULL, "
+                "result TEXT, "
+                "PRIMARY KEY (job_id, address_index)"
+                ") WITHOUT ROWID"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS geocode_jobs_status ON geocode_jobs (status, created)")
+            self._local.connection = connection
+
+        return connection
+
+    @staticmethod
+    def _now():
+        return datetime.datetime.now().timestamp()
+
+    def create_job(self, addresses, geocoders=None):
+        """Queues a job
+
+        :param addresses: Addresses to geocode
+        :type addresses: Iterable[str]
+        :param geocoders: IDs of the geocoders to use, all of them if None
+        :type geocoders: List[str]
+
+        :return: Job ID
+        :rtype: str
+        """
+        job_id = uuid.uuid4().hex
+        now = self._now()
+
+        connection = self._get_connection()
+        with connection:
+            connection.execute("BEGIN")
+            connection.executemany(
+                "INSERT INTO geocode_job_addresses (job_id, address_index, address) VALUES (?, ?, ?)",
+                ((job_id, address_index, address) for address_index, address in enumerate(addresses))
+            )
+            total, = connection.execute(
+                "SELECT count(*) FROM geocode_job_addresses WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            connection.execute(
+                "INSERT INTO geocode_jobs (job_id, status, geocoders, total, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, STATUS_QUEUED, json.dumps(geocoders) if geocoders is not None else None, total, now, now)
+            )
+
+        return job_id
+
+    def get_job(self, job_id):
+        """:return: The job's metadata, or None if it doesn't exist
+        :rtype: dict
+        """
+        row = self._get_connection().execute(
+            "SELECT job_id, status, geocoders, total, completed, created, updated, error "
+            "FROM geocode_jobs WHERE job_id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        job_id, status, geocoders, total, completed, created, updated, error = row
+        return {
+            "job_id": job_id,
+            "status": status,
+            "geocoders": json.loads(geocoders) if geocoders is not None else None,
+            "total": total,
+            "completed": completed,
+            "created": created,
+            "updated": updated,
+            "error": error,
+        }
+
+    def claim_job(self, lease, max_attempts=None):
+        """Claims the oldest queued job, or a running job whose lease has expired
+
+        :param lease: Number of seconds the claim is valid for, unless renewed
+        :type lease: float
+        :param max_attempts: Number of claims after which a job whose lease expires is failed, rather than claimed
+            again. Unlimited if None
+        :type max_attempts: int
+
+        :return: The claimed job's ID and lease token, or None if there is nothing to do
+        :rtype: (str, str)
+        """
+        now = self._now()
+        connection = self._get_connection()
+        with connection:
+            # Taking the write lock up front, so that two workers can't claim the same job
+            connection.execute("BEGIN IMMEDIATE")
+            if max_attempts is not None:
+                connection.execute(
+                    "UPDATE geocode_jobs SET status = ?, error = COALESCE(error, ?), "
+                    "lease_expires = NULL, lease_token = NULL, updated = ? "
+                    "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                    (STATUS_FAILED, f"Gave up after {max_attempts} attempts", now,
+                     STATUS_RUNNING, now, max_attempts)
+                )
+
+            row = connection.execute(
+                "SELECT job_id FROM geocode_jobs "
+                "WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                "ORDER BY created LIMIT 1",
+                (STATUS_QUEUED, STATUS_RUNNING, now)
+            ).fetchone()
+            if row is None:
+                return None
+
+            job_id, = row
+            lease_token = uuid.uuid4().hex
+            connection.execute(
+                "UPDATE geocode_jobs SET status = ?, lease_expires = ?, lease_token = ?, attempts = attempts + 1, "
+                "updated = ? WHERE job_id = ?",
+                (STATUS_RUNNING, now + lease, lease_token, now, job_id)
+            )
+
+        return job_id, lease_token
+
+    def renew_lease(self, job_id, lease_token, lease):
+        """:return: Whether the lease is still held, and so was renewed"""
+        now = self._now()
+        cursor = self._get_connection().execute(
+            "UPDATE geocode_jobs SET lease_expires = ?, updated = ? WHERE job_id = ? AND lease_token = ?",
+            (now + lease, now, job_id, lease_token)
+        )
+
+        return cursor.rowcount == 1
+
+    def pending_addresses(self, job_id, limit):
+        """:return: Up to limit (index, address) pairs of the job that don't have results yet, in input order"""
+        return self._get_connection().execute(
+            "SELECT address_index, address FROM geocode_job_addresses "
+            "WHERE job_id = ? AND result IS NULL ORDER BY address_index LIMIT ?",
+            (job_id, limit)
+        ).fetchall()
+
+    def save_results(self, job_id, lease_token, results):
+        """Records results for some of the job's addresses
+
+        :param results: (index, result) pairs, where the result is a JSON serialised string
+        :type results: List[(int, str)]
+
+        :return: Whether the lease is still held, and so the results were saved
+        """
+        connection = self._get_connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            held, = connection.execute(
+                "SELECT count(*) FROM geocode_jobs WHERE job_id = ? AND lease_token = ?", (job_id, lease_token)
+            ).fetchone()
+            if not held:
+                return False
+
+            connection.executemany(
+                "UPDATE geocode_job_addresses SET result = ? WHERE job_id = ? AND address_index = ?",
+                ((result, job_id, address_index) for address_index, result in results)
+            )
+            connection.execute(
+                "UPDATE geocode_jobs SET "
+                "completed = (SELECT count(*) FROM geocode_job_addresses WHERE job_id = ? AND result IS NOT NULL), "
+                "updated = ? "
+                "WHERE job_id = ? AND lease_token = ?",
+                (job_id, self._now(), job_id, lease_token)
+            )
+
+        return True
+
+    def record_error(self, job_id, lease_token, error):
+        """Notes the error that stopped an attempt at the job, which is left to be claimed again once its lease expires
+
+        :return: Whether the lease is still held, and so the error was recorded
+        """
+        cursor = self._get_connection().execute(
+            "UPDATE geocode_jobs SET error = ?, updated = ? WHERE job_id = ? AND lease_token = ?",
+            (error, self._now(), job_id, lease_token)
+        )
+
+        return cursor.rowcount == 1
+
+    def finish_job(self, job_id, lease_token, error=None):
+        """Marks a job as done, or as failed if there is an error
+
+        :return: Whether the lease is still held, and so the job was finished
+        """
+        cursor = self._get_connection().execute(
+            "UPDATE geocode_jobs SET status = ?, error = ?, lease_expires = NULL, lease_token = NULL, updated = ? "
+            "WHERE job_id = ? AND lease_token = ?",
+            (STATUS_FAILED if error is not None else STATUS_DONE, error, self._now(), job_id, lease_token)
+        )
+
+        return cursor.rowcount == 1
+
+    def iter_results(self, job_id, batch_size=1000):
+        """Iterates over the job's results in input order, fetching them a batch at a time
+
+        :return: Iterator of (index, result) pairs, where the result is a JSON serialised string
+        """
+        last_index = -1
+        while True:
+            rows = self._get_connection().execute(
+                "SELECT address_index, result FROM geocode_job_addresses "
+                "WHERE job_id = ? AND address_index > ? AND result IS NOT NULL ORDER BY address_index LIMIT ?",
+                (job_id, last_index, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+
+            yield from rows
+            last_index, _ = rows[-1]
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
@@ -0,0 +1,10 @@
+# coding: utf-8
+
+# flake8: noqa
+from __future__ import absolute_import
+# import cache backends into geocoder cache package
+from cape_of_good_place_names.geocoder_cache.backends import CacheBackend, FileCacheBackend, ShardedFileCacheBackend, \
+    SqliteCacheBackend
+from cape_of_good_place_names.geocoder_cache.memory import MemoryCache
+from cape_of_good_place_names.geocoder_cache.normalise import normalise_address
+from cape_of_good_place_names.geocoder_cache.refresh import CacheRefresher
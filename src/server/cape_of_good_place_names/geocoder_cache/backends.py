@@ -0,0 +1,421 @@
+import base64
+import datetime
+import hashlib
+import logging
+import os
+import pathlib
+import pickle
+import sqlite3
+import threading
+
+from cape_of_good_place_names.geocoder_cache import fileutil, records
+
+
+class CacheBackend(object):
+    """Interface for the stores that hold cached geocoder results.
+
+    Entries are keyed by (geocoder ID, address), and carry the time at which they were created, so that the callers can
+    decide whether they are still fresh.
+    """
+
+    def get(self, geocoder_id, address):
+        """Look up a cached result
+
+        :param geocoder_id: ID of the geocoder that produced the result
+        :type geocoder_id: str
+        :param address: Address that was geocoded
+        :type address: str
+
+        :return: (result, creation timestamp) if present, else None
+        :rtype: (tuple, float) | None
+        """
+        raise NotImplementedError
+
+    def put(self, geocoder_id, address, result, created=None):
+        """Store a result
+
+        :param geocoder_id: ID of the geocoder that produced the result
+        :type geocoder_id: str
+        :param address: Address that was geocoded
+        :type address: str
+        :param result: Geocoder result tuple
+        :type result: tuple
+        :param created: Creation timestamp of the entry, defaults to now
+        :type created: float
+        """
+        raise NotImplementedError
+
+    def put_many(self, entries):
+        """Store many entries at once
+
+        :param entries: (geocoder ID, address, result, creation timestamp) entries to store
+        :type entries: Iterable[(str, str, tuple, float)]
+        """
+        for geocoder_id, address, result, created in entries:
+            self.put(geocoder_id, address, result, created)
+
+    def delete(self, geocoder_id, address):
+        """Remove an entry, if it exists
+
+        :param geocoder_id: ID of the geocoder that produced the result
+        :type geocoder_id: str
+        :param address: Address that was geocoded
+        :type address: str
+        """
+        raise NotImplementedError
+
+    def delete_many(self, entries):
+        """Remove many entries at once, skipping any that have been rewritten since they were listed
+
+        :param entries: (geocoder ID, address, creation timestamp) of the entries to remove
+        :type entries: Iterable[(str, str, float)]
+
+        :return: (geocoder ID, address) of the entries removed
+        :rtype: List[(str, str)]
+        """
+        deleted = []
+        for geocoder_id, address, created in entries:
+            cache_entry = self.get(geocoder_id, address)
+            if cache_entry is not None and cache_entry[1] <= created:
+                self.delete(geocoder_id, address)
+                deleted.append((geocoder_id, address))
+
+        return deleted
+
+    def compact(self):
+        """Reclaim space left behind by deleted entries
+
+        :return: Number of bytes reclaimed
+        :rtype: int
+        """
+        return 0
+
+    def entries(self, geocoder_id=None):
+        """Iterate over the entries' metadata
+
+        :param geocoder_id: Restrict the entries to this geocoder
+        :type geocoder_id: str
+
+        :return: iterable of (geocoder ID, address, creation timestamp, size in bytes)
+        :rtype: Iterable[(str, str, float, int)]
+        """
+        raise NotImplementedError
+
+    def usage(self):
+        """Summarise the size of the cache
+
+        :return: {geocoder ID: (number of entries, size in bytes)}
+        :rtype: dict
+        """
+        usage = {}
+        for geocoder_id, _, _, size in self.entries():
+            entry_count, total_size = usage.get(geocoder_id, (0, 0))
+            usage[geocoder_id] = (entry_count + 1, total_size + size)
+
+        return usage
+
+    def close(self):
+        pass
+
+
+class FileCacheBackend(CacheBackend):
+    """One file per (geocoder, address), in a directory per geocoder.
+
+    This is the original cache layout, kept around for existing deployments. The file's mtime is the entry's creation
+    time. Files are written as records, legacy pickle files are still read.
+    """
+    FILE_SUFFIX = ".pickle.gz"
+    TEMP_FILE_MAX_AGE = 3600  # seconds, after which temporary files are assumed to have been left by a failed write
+
+    def __init__(self, cache_dir, compression=None):
+        records.check_compression(compression)
+
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.compression = compression
+
+    def _get_cache_path(self, geocoder_id, address):
+        address_filename = base64.b64encode(address.encode()).decode() + self.FILE_SUFFIX
+        return self.cache_dir / geocoder_id / address_filename
+
+    def _dump(self, address, result):
+        return records.encode(address, result, self.compression)
+
+    def _load_legacy(self, data):
+        return None, pickle.loads(data)
+
+    def _load(self, data):
+        """:return: (address if stored, else None, result)"""
+        return records.decode(data) if records.is_record(data) else self._load_legacy(data)
+
+    def get(self, geocoder_id, address):
+        cache_path = self._get_cache_path(geocoder_id, address)
+        logging.debug(f"{geocoder_id} + '{address}' -> '{cache_path}'")
+
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                created = os.fstat(cache_file.fileno()).st_mtime
+                _, result = self._load(cache_file.read())
+                return result, created
+        except FileNotFoundError:
+            return None
+
+    def put(self, geocoder_id, address, result, created=None):
+        cache_path = self._get_cache_path(geocoder_id, address)
+        logging.debug(f"Writing '{cache_path}'")
+
+        fileutil.atomic_write(cache_path, self._dump(address, result), created)
+
+    def delete(self, geocoder_id, address):
+        cache_path = self._get_cache_path(geocoder_id, address)
+        try:
+            cache_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def delete_many(self, entries):
+        deleted = []
+        for geocoder_id, address, created in entries:
+            cache_path = self._get_cache_path(geocoder_id, address)
+            try:
+                # Files are replaced rather than rewritten, so a newer entry has a newer mtime
+                if cache_path.stat().st_mtime <= created:
+                    cache_path.unlink()
+                    deleted.append((geocoder_id, address))
+            except FileNotFoundError:
+                pass
+
+        return deleted
+
+    def compact(self):
+        # Clearing out temporary files orphaned by interrupted writes
+        reclaimed = 0
+        threshold = datetime.datetime.now().timestamp() - self.TEMP_FILE_MAX_AGE
+        for temp_path in self.cache_dir.glob("**/.*.tmp"):
+            try:
+                stat = temp_path.stat()
+                if stat.st_mtime < threshold:
+                    temp_path.unlink()
+                    reclaimed += stat.st_size
+            except FileNotFoundError:
+                pass
+
+        return reclaimed
+
+    def _geocoder_dirs(self, geocoder_id=None):
+        if not self.cache_dir.exists():
+            return []
+
+        geocoder_dirs = (
+            [self.cache_dir / geocoder_id] if geocoder_id
+            else (path for path in self.cache_dir.iterdir() if path.is_dir())
+        )
+        return filter(lambda path: path.exists(), geocoder_dirs)
+
+    def entries(self, geocoder_id=None):
+        for geocoder_dir in self._geocoder_dirs(geocoder_id):
+            with os.scandir(geocoder_dir) as dir_entries:
+                for dir_entry in dir_entries:
+                    if not dir_entry.name.endswith(self.FILE_SUFFIX):
+                        continue
+
+                    encoded_address = dir_entry.name[:-len(self.FILE_SUFFIX)]
+                    try:
+                        address = base64.b64decode(encoded_address).decode()
+                        stat = dir_entry.stat()
+                    except (ValueError, FileNotFoundError) as e:
+                        logging.warning(f"Skipping '{dir_entry.path}' because '{e.__class__.__name__}: {e}'")
+                        continue
+
+                    yield geocoder_dir.name, address, stat.st_mtime, stat.st_size
+
+
+class ShardedFileCacheBackend(FileCacheBackend):
+    """One file per (geocoder, address), named by a digest of the address and fanned out over two levels of
+    directories, i.e. `<cache dir>/<geocoder>/ab/cd/abcd...`.
+
+    As the address can't be recovered from the filename, it is stored in the file alongside the result.
+    """
+    FILE_SUFFIX = ".rec"
+
+    def _get_cache_path(self, geocoder_id, address):
+        address_digest = hashlib.sha256(address.encode()).hexdigest()
+        return (
+            self.cache_dir / geocoder_id / address_digest[:2] / address_digest[2:4] /
+            (address_digest + self.FILE_SUFFIX)
+        )
+
+    def _load_legacy(self, data):
+        return pickle.loads(data)
+
+    def entries(self, geocoder_id=None):
+        for geocoder_dir in self._geocoder_dirs(geocoder_id):
+            for cache_path in geocoder_dir.glob(f"??/??/*{self.FILE_SUFFIX}"):
+                try:
+                    with open(cache_path, 'rb') as cache_file:
+                        stat = os.fstat(cache_file.fileno())
+                        address, _ = self._load(cache_file.read())
+                except FileNotFoundError:
+                    continue
+
+                yield geocoder_dir.name, address, stat.st_mtime, stat.st_size
+
+    def usage(self):
+        # Only stat-ing the files, as the addresses aren't needed
+        usage = {}
+        for geocoder_dir in self._geocoder_dirs():
+            entry_count, total_size = 0, 0
+            for cache_path in geocoder_dir.glob(f"??/??/*{self.FILE_SUFFIX}"):
+                try:
+                    total_size += cache_path.stat().st_size
+                    entry_count += 1
+                except FileNotFoundError:
+                    continue
+
+            usage[geocoder_dir.name] = (entry_count, total_size)
+
+        return usage
+
+
+class SqliteCacheBackend(CacheBackend):
+    """All entries in a single SQLite database file, in WAL mode so that readers don't block the writer.
+
+    Each thread gets its own connection to the database. Results are stored as records, legacy pickled results are
+    still read.
+    """
+    DB_FILENAME = "geocoder_cache.sqlite3"
+    BUSY_TIMEOUT = 30  # seconds
+
+    def __init__(self, cache_dir, db_filename=DB_FILENAME, compression=None):
+        records.check_compression(compression)
+
+        self.db_path = pathlib.Path(cache_dir) / db_filename
+        self.compression = compression
+        self._local = threading.local()
+
+    def _dump(self, address, result):
+        return records.encode(address, result, self.compression)
+
+    @staticmethod
+    def _load(data):
+        if records.is_record(data):
+            _, result = records.decode(data)
+            return result
+
+        return pickle.loads(data)
+
+    def _get_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            logging.debug(f"Connecting to '{self.db_path}'")
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+            connection = sqlite3.connect(str(self.db_path), timeout=self.BUSY_TIMEOUT, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS geocoder_cache ("
+                "geocoder_id TEXT NOT NULL, "
+                "address TEXT NOT NULL, "
+                "created REAL NOT NULL, "
+                "result BLOB NOT NULL, "
+                "PRIMARY KEY (geocoder_id, address)"
+                ") WITHOUT ROWID"
+            )
+            self._local.connection = connection
+
+        return connection
+
+    def get(self, geocoder_id, address):
+        row = self._get_connection().execute(
+            "SELECT result, created FROM geocoder_cache WHERE geocoder_id = ? AND address = ?",
+            (geocoder_id, address)
+        ).fetchone()
+        if row is None:
+            return None
+
+        result_blob, created = row
+        return self._load(result_blob), created
+
+    def put(self, geocoder_id, address, result, created=None):
+        created = created if created is not None else datetime.datetime.now().timestamp()
+        self._get_connection().execute(
+            "INSERT OR REPLACE INTO geocoder_cache (geocoder_id, address, created, result) VALUES (?, ?, ?, ?)",
+            (geocoder_id, address, created, self._dump(address, result))
+        )
+
+    def put_many(self, entries):
+        connection = self._get_connection()
+        with connection:
+            connection.execute("BEGIN")
+            connection.executemany(
+                "INSERT OR REPLACE INTO geocoder_cache (geocoder_id, address, created, result) VALUES (?, ?, ?, ?)",
+                (
+                    (geocoder_id, address,
+                     created if created is not None else datetime.datetime.now().timestamp(),
+                     self._dump(address, result))
+                    for geocoder_id, address, result, created in entries
+                )
+            )
+
+    def delete(self, geocoder_id, address):
+        self._get_connection().execute(
+            "DELETE FROM geocoder_cache WHERE geocoder_id = ? AND address = ?",
+            (geocoder_id, address)
+        )
+
+    def delete_many(self, entries):
+        connection = self._get_connection()
+        deleted = []
+        with connection:
+            connection.execute("BEGIN")
+            for geocoder_id, address, created in entries:
+                cursor = connection.execute(
+                    "DELETE FROM geocoder_cache WHERE geocoder_id = ? AND address = ? AND created <= ?",
+                    (geocoder_id, address, created)
+                )
+                if cursor.rowcount:
+                    deleted.append((geocoder_id, address))
+
+        return deleted
+
+    def _db_size(self):
+        return sum(
+            path.stat().st_size
+            for path in (self.db_path, self.db_path.with_name(self.db_path.name + "-wal"))
+            if path.exists()
+        )
+
+    def compact(self):
+        """Rewrites the database file without the free pages left behind by deleted entries. Writers are blocked (up to
+        BUSY_TIMEOUT) while this runs.
+        """
+        connection = self._get_connection()
+        size_before = self._db_size()
+        connection.execute("VACUUM")
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        return max(size_before - self._db_size(), 0)
+
+    def entries(self, geocoder_id=None):
+        query = "SELECT geocoder_id, address, created, length(result) FROM geocoder_cache"
+        params = ()
+        if geocoder_id:
+            query += " WHERE geocoder_id = ?"
+            params = (geocoder_id,)
+
+        # Materialising the rows, so that callers are free to write to the cache while iterating
+        yield from self._get_connection().execute(query, params).fetchall()
+
+    def usage(self):
+        return {
+            geocoder_id: (entry_count, total_size)
+            for geocoder_id, entry_count, total_size in self._get_connection().execute(
+                "SELECT geocoder_id, count(*), sum(length(result)) FROM geocoder_cache GROUP BY geocoder_id"
+            )
+        }
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import itertools
+import logging
+import time
+
+import flask
+
+from cape_of_good_place_names import util
+
+
+def _batches(iterable, batch_size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            break
+
+        yield batch
+
+
+def collect_garbage(cache_backend, max_age, negative_max_age=None, max_bytes=None, max_entries=None,
+                    compact=False, batch_size=1000, dry_run=False):
+    """Removes expired entries from a cache backend, and then evicts the oldest entries until it is within budget.
+
+    Entries are only removed if they haven't been rewritten since they were listed, so this is safe to run against a
+    cache that is being served from.
+
+    :param cache_backend: Cache backend to clean up
+    :type cache_backend: backends.CacheBackend
+    :param max_age: Age (in seconds) beyond which an entry is never used. Either a number, or a function of the
+                    geocoder ID
+    :param negative_max_age: Age beyond which an entry without a location is never used, in the same form as max_age.
+                             Defaults to max_age
+    :param max_bytes: Budget for the total size of the entries
+    :type max_bytes: int
+    :param max_entries: Budget for the number of entries
+    :type max_entries: int
+    :param compact: Whether to reclaim the space freed up in the backend afterwards
+    :type compact: bool
+    :param batch_size: Number of entries to delete at a time
+    :type batch_size: int
+    :param dry_run: Only report what would be removed
+    :type dry_run: bool
+
+    :return: Report of what was removed
+    :rtype: dict
+    """
+    get_max_age = max_age if callable(max_age) else (lambda geocoder_id: max_age)
+    negative_max_age = negative_max_age if negative_max_age is not None else max_age
+    get_negative_max_age = negative_max_age if callable(negative_max_age) else (lambda geocoder_id: negative_max_age)
+    now = datetime.datetime.now().timestamp()
+
+    def _is_expired(geocoder_id, address, created):
+        age = now - created
+        if age > max(get_max_age(geocoder_id), get_negative_max_age(geocoder_id)):
+            return True
+        elif age <= min(get_max_age(geocoder_id), get_negative_max_age(geocoder_id)):
+            return False
+
+        # In between the thresholds, so it depends on the result
+        cache_entry = cache_backend.get(geocoder_id, address)
+        if cache_entry is None:
+            return False
+
+        result, _ = cache_entry
+        return age > (get_negative_max_age(geocoder_id) if result[1] is None else get_max_age(geocoder_id))
+
+    report = {"scanned": 0, "expired": 0, "evicted": 0, "deleted": 0, "reclaimed_bytes": 0, "compacted_bytes": 0}
+
+    expired = []
+    live = []
+    for geocoder_id, address, created, size in cache_backend.entries():
+        report["scanned"] += 1
+        (expired if _is_expired(geocoder_id, address, created) else live).append(
+            (geocoder_id, address, created, size)
+        )
+    report["expired"] = len(expired)
+
+    # Evicting oldest first, until within budget
+    live.sort(key=lambda entry: entry[2])
+    live_bytes = sum(size for *_, size in live)
+    evict_count = 0
+    while evict_count < len(live) and (
+            (max_entries is not None and len(live) - evict_count > max_entries) or
+            (max_bytes is not None and live_bytes > max_bytes)
+    ):
+        live_bytes -= live[evict_count][3]
+        evict_count += 1
+    evicted = live[:evict_count]
+    report["evicted"] = evict_count
+    report["remaining_entries"] = len(live) - evict_count
+    report["remaining_bytes"] = live_bytes
+
+    for batch in _batches(itertools.chain(expired, evicted), batch_size):
+        if dry_run:
+            report["reclaimed_bytes"] += sum(size for *_, size in batch)
+            continue
+
+        deleted = set(cache_backend.delete_many(
+            (geocoder_id, address, created) for geocoder_id, address, created, _ in batch
+        ))
+        # Entries rewritten since they were listed are skipped, so only counting the ones actually deleted
+        report["deleted"] += len(deleted)
+        report["reclaimed_bytes"] += sum(
+            size for geocoder_id, address, _, size in batch if (geocoder_id, address) in deleted
+        )
+        logging.debug(f"Deleted {report['deleted']} entries...")
+
+    if compact and not dry_run:
+        report["compacted_bytes"] = cache_backend.compact()
+
+    return report
+
+
+def get_max_ages(app):
+    """Works out the ages beyond which entries are never used, from the app's cache config
+
+    :return: (max age function, negative max age function), both of the geocoder ID
+    """
+    config = app.config
+    grace_period = config["GEOCODER_CACHE_STALE_GRACE_PERIOD"]
+
+    def _max_age(geocoder_id):
+        return config["GEOCODER_CACHE_AGE_THRESHOLD"] + grace_period
+
+    def _negative_max_age(geocoder_id):
+        return config["GEOCODER_NEGATIVE_CACHE_AGE_THRESHOLDS"].get(
+            geocoder_id, config["GEOCODER_NEGATIVE_CACHE_AGE_THRESHOLD"]
+        ) + grace_period
+
+    return _max_age, _negative_max_age
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Utility script for removing expired entries from the geocoder cache, and evicting the oldest "
+                    "entries to keep it within a size budget. Safe to run while the server is running",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("-mb", "--max-bytes", type=int, required=False,
+                        help="Size budget for the cache entries. Defaults to GEOCODER_CACHE_MAX_BYTES")
+    parser.add_argument("-me", "--max-entries", type=int, required=False,
+                        help="Budget for the number of cache entries. Defaults to GEOCODER_CACHE_MAX_ENTRIES")
+    parser.add_argument("-c", "--compact", action="store_true",
+                        help="Reclaim the freed space afterwards (VACUUMs the SQLite store, which blocks writers "
+                             "while it runs)")
+    parser.add_argument("-i", "--interval", type=int, required=False,
+                        help="Keep running, collecting garbage every this many seconds")
+    parser.add_argument("-b", "--batch-size", type=int, default=1000,
+                        help="Number of entries to delete per transaction")
+    parser.add_argument("-n", "--dry-run", action="store_true",
+                        help="Only report what would be removed")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Verbosity flag")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s-cogpn-evict-cache [%(levelname)s]: %(message)s')
+
+    app = flask.Flask("cogpn-evict-cache")
+    app.config.from_object("cape_of_good_place_names.config.config.Config")
+
+    with app.app_context():
+        cache_backend = util.get_geocoder_cache()
+
+    max_age, negative_max_age = get_max_ages(app)
+    max_bytes = args.max_bytes if args.max_bytes is not None else app.config["GEOCODER_CACHE_MAX_BYTES"]
+    max_entries = args.max_entries if args.max_entries is not None else app.config["GEOCODER_CACHE_MAX_ENTRIES"]
+
+    while True:
+        logging.info(f"Collect[ing] garbage in {cache_backend.__class__.__name__}, "
+                     f"max_bytes={max_bytes}, max_entries={max_entries}...")
+        start = time.monotonic()
+        report = collect_garbage(cache_backend, max_age, negative_max_age, max_bytes, max_entries,
+                                 args.compact, args.batch_size, args.dry_run)
+        logging.info(f"...Collect[ed] garbage in {time.monotonic() - start:.1f}s: "
+                     f"{report['expired']} expired and {report['evicted']} evicted of {report['scanned']} entries, "
+                     f"{report['reclaimed_bytes']:,} bytes reclaimed ({report['compacted_bytes']:,} compacted), "
+                     f"{report['remaining_entries']} entries ({report['remaining_bytes']:,} bytes) remaining")
+
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+    cache_backend.close()
+
+
+if __name__ == "__main__":
+    main()
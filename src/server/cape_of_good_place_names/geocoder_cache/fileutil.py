@@ -0,0 +1,29 @@
+import os
+import tempfile
+
+
+def atomic_write(path, data, created=None):
+    """Writes to a temporary file alongside the destination, and then renames it into place, so that readers only ever
+    see either the old or the new file.
+
+    :param path: Destination file
+    :type path: pathlib.Path
+    :param data: File contents
+    :type data: bytes
+    :param created: Timestamp to set as the file's mtime, if given
+    :type created: float
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(temp_fd, "wb") as temp_file:
+            temp_file.write(data)
+            temp_file.flush()
+
+        if created is not None:
+            os.utime(temp_path, (created, created))
+
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
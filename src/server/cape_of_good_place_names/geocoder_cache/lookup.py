@@ -0,0 +1,317 @@
+import asyncio
+import datetime
+import functools
+import time
+
+from flask import current_app
+
+from cape_of_good_place_names import util
+from cape_of_good_place_names.geocoder_cache import records
+from cape_of_good_place_names.geocoder_cache.normalise import normalise_address
+from cape_of_good_place_names.geocoder_upstream import GeocoderCircuitOpen, GeocoderExecutorSaturated, \
+    GeocoderLimitExceeded
+
+
+def get_cache_key(address):
+    """Cache key for an address - normalised, unless that has been switched off"""
+    return normalise_address(address) if current_app.config["GEOCODER_CACHE_NORMALISE_KEYS"] else address
+
+
+def is_error_result(result):
+    """Transient failure - the geocoder didn't return a result at all, so it is worth asking again"""
+    return result is None or isinstance(result, Exception)
+
+
+def is_negative_result(result):
+    """No match - the geocoder returned a result, but without a location"""
+    return result[1] is None
+
+
+def _get_cache_age_threshold(geocoder_id, result):
+    if is_negative_result(result):
+        return current_app.config["GEOCODER_NEGATIVE_CACHE_AGE_THRESHOLDS"].get(
+            geocoder_id, current_app.config["GEOCODER_NEGATIVE_CACHE_AGE_THRESHOLD"]
+        )
+
+    return current_app.config["GEOCODER_CACHE_AGE_THRESHOLD"]
+
+
+def _allow_upstream_request(geocoder_id):
+    """:return: Token to record the request's outcome with, or GeocoderCircuitOpen if the geocoder's circuit is open"""
+    circuit_token = util.get_geocoder_circuit_breaker().allow(geocoder_id)
+    if circuit_token is None:
+        current_app.logger.debug(f"{geocoder_id} circuit is open, skipping it")
+        util.get_metrics().inc("geocoder_circuit_rejections_total", geocoder=geocoder_id)
+        return GeocoderCircuitOpen(f"{geocoder_id} circuit is open")
+
+    return circuit_token
+
+
+def _record_upstream_result(geocoder_id, circuit_token, address, result, latency):
+    metrics = util.get_metrics()
+    circuit_breaker = util.get_geocoder_circuit_breaker()
+    if isinstance(result, GeocoderLimitExceeded):
+        current_app.logger.warning(str(result))
+        metrics.inc("geocoder_limit_rejections_total", geocoder=geocoder_id)
+        # Not the geocoder's fault, so not counting against its circuit
+        circuit_breaker.record(geocoder_id, circuit_token, None)
+    elif isinstance(result, GeocoderExecutorSaturated):
+        current_app.logger.warning(f"Not geocoding with {geocoder_id}: {result}")
+        metrics.inc("geocoder_executor_rejections_total", geocoder=geocoder_id)
+        circuit_breaker.record(geocoder_id, circuit_token, None)
+    else:
+        if isinstance(result, Exception):
+            current_app.logger.error(f"{geocoder_id} raised '{result.__class__.__name__}: {result}'")
+        circuit_breaker.record(geocoder_id, circuit_token, not is_error_result(result))
+        if is_error_result(result):
+            metrics.inc("geocoder_failures_total", geocoder=geocoder_id)
+        util.get_geocoder_selector().record_answer(
+            geocoder_id, address, latency, not is_error_result(result) and not is_negative_result(result)
+        )
+
+
+def _get_hedge_delay(geocoder_id, address):
+    """:return: Seconds after which a request to the geocoder is hedged, or None if it isn't"""
+    if not util.get_geocoder_hedger().hedges(geocoder_id):
+        return None
+
+    return util.get_geocoder_selector().latency_quantile(
+        geocoder_id, address, current_app.config["GEOCODER_HEDGE_QUANTILE"],
+        current_app.config["GEOCODER_HEDGE_MIN_SAMPLES"]
+    )
+
+
+def geocode_upstream(geocoder, address, deadline=None):
+    """Geocodes an address using a single geocoder, bypassing the cache, in the calling thread. The request is skipped
+    if the geocoder's circuit is open, and otherwise waits for the geocoder's limits to allow it, until the deadline at
+    the latest. Requests to hedged geocoders are made on the hedger's threads instead, with the calling thread waiting
+    for the first answer.
+
+    :param deadline: Monotonic time after which the caller no longer waits for the result, None if it waits for as long
+                     as it takes
+    :type deadline: float
+
+    :return: The geocoder's result, or the exception if the request was skipped or the limits were exceeded
+    """
+    geocoder_id = geocoder.__class__.__name__
+    circuit_token = _allow_upstream_request(geocoder_id)
+    if isinstance(circuit_token, GeocoderCircuitOpen):
+        return circuit_token
+
+    hedge_delay = _get_hedge_delay(geocoder_id, address)
+    limiter = util.get_geocoder_limiter()
+
+    def _hedge():
+        # A hedge is a request of its own, as far as the geocoder's limits are concerned, but it doesn't wait for its
+        # turn - it is only worth making while there is room for it alongside the original request
+        with limiter.limit(geocoder_id, time.monotonic()):
+            return geocoder.geocode(address)
+
+    latency = None
+    try:
+        with limiter.limit(geocoder_id, deadline) as wait:
+            util.get_metrics().observe("geocoder_limit_wait_seconds", wait, geocoder=geocoder_id)
+            start = time.monotonic()
+            try:
+                if hedge_delay is None:
+                    result = geocoder.geocode(address)
+                else:
+                    result = util.get_geocoder_hedger().call(
+                        geocoder_id, hedge_delay, functools.partial(geocoder.geocode, address), _hedge,
+                        functools.partial(limiter.has_capacity, geocoder_id)
+                    )
+            except Exception as e:
+                result = e
+            latency = time.monotonic() - start
+    except GeocoderLimitExceeded as e:
+        result = e
+
+    _record_upstream_result(geocoder_id, circuit_token, address, result, latency)
+
+    return result
+
+
+async def _run_in_app_context(app, func, *args):
+    """Runs func(*args) on the event loop's default executor, in the app's context, so that blocking work - cache
+    writes, and saving the selector's statistics - doesn't hold up the event loop
+    """
+    def _run():
+        with app.app_context():
+            return func(*args)
+
+    return await asyncio.get_running_loop().run_in_executor(None, _run)
+
+
+async def geocode_upstream_async(app, adapter, address, deadline=None):
+    """As geocode_upstream, but awaits the geocoder's async adapter, and waits for its limits without blocking the
+    event loop.
+
+    :param adapter: Async adapter for the geocoder
+    :type adapter: cape_of_good_place_names.geocoder_upstream.AsyncGeocoderAdapter
+    """
+    geocoder_id = adapter.geocoder_id
+    with app.app_context():
+        circuit_token = _allow_upstream_request(geocoder_id)
+        hedge_delay = _get_hedge_delay(geocoder_id, address)
+        hedger = util.get_geocoder_hedger()
+        limiter = util.get_geocoder_limiter()
+        metrics = util.get_metrics()
+    if isinstance(circuit_token, GeocoderCircuitOpen):
+        return circuit_token
+
+    async def _hedge():
+        async with limiter.limit_async(geocoder_id, time.monotonic()):
+            return await adapter.geocode(address)
+
+    latency = None
+    try:
+        async with limiter.limit_async(geocoder_id, deadline) as wait:
+            metrics.observe("geocoder_limit_wait_seconds", wait, geocoder=geocoder_id)
+            start = time.monotonic()
+            try:
+                if hedge_delay is None:
+                    result = await adapter.geocode(address)
+                else:
+                    result = await hedger.call_async(
+                        geocoder_id, hedge_delay, functools.partial(adapter.geocode, address), _hedge,
+                        functools.partial(limiter.has_capacity, geocoder_id)
+                    )
+            except Exception as e:
+                result = e
+            latency = time.monotonic() - start
+    except GeocoderLimitExceeded as e:
+        result = e
+
+    await _run_in_app_context(app, _record_upstream_result, geocoder_id, circuit_token, address, result, latency)
+
+    return result
+
+
+def geocode_and_cache(geocoder, cache_key, address, deadline=None):
+    """Geocodes an address using a single geocoder, and writes the result through to the cache. Concurrent calls for
+    the same geocoder and cache key share a single upstream request, and cache write.
+
+    :return: The result, or an empty result if the geocoder failed
+    """
+    geocoder_id = geocoder.__class__.__name__
+
+    def _geocode_and_cache():
+        return update_cache(geocoder, cache_key, address, geocode_upstream(geocoder, address, deadline))
+
+    result, coalesced = util.get_geocoder_single_flight().do((geocoder_id, cache_key), _geocode_and_cache)
+    if coalesced:
+        current_app.logger.debug(f"Shared an in-flight {geocoder_id} request for '{cache_key}'")
+        util.get_metrics().inc("geocoder_coalesced_requests_total", geocoder=geocoder_id)
+
+    return result
+
+
+async def geocode_and_cache_async(app, adapter, cache_key, address, deadline=None):
+    """As geocode_and_cache, but using the geocoder's async adapter. Calls are coalesced with those made by threads.
+
+    :param adapter: Async adapter for the geocoder
+    :type adapter: cape_of_good_place_names.geocoder_upstream.AsyncGeocoderAdapter
+    """
+    geocoder_id = adapter.geocoder_id
+    with app.app_context():
+        single_flight = util.get_geocoder_single_flight()
+
+    async def _geocode_and_cache():
+        result = await geocode_upstream_async(app, adapter, address, deadline)
+        return await _run_in_app_context(app, update_cache, adapter.geocoder, cache_key, address, result)
+
+    result, coalesced = await single_flight.do_async((geocoder_id, cache_key), _geocode_and_cache)
+    if coalesced:
+        with app.app_context():
+            current_app.logger.debug(f"Shared an in-flight {geocoder_id} request for '{cache_key}'")
+            util.get_metrics().inc("geocoder_coalesced_requests_total", geocoder=geocoder_id)
+
+    return result
+
+
+def _refresh_cached_result(app, geocoder, cache_key, address):
+    with app.app_context():
+        current_app.logger.debug(f"Refreshing {geocoder.__class__.__name__} entry for '{cache_key}'")
+        geocode_and_cache(geocoder, cache_key, address)
+
+
+def get_cached_result(geocoder, cache_key, address, allow_stale=True):
+    """Looks up a geocoder's cached result, in the memory cache and then the cache backend
+
+    Stale entries (within the grace period) are returned and refreshed in the background, unless allow_stale is False,
+    in which case they are treated as misses.
+
+    :return: Cached result, or None on a miss
+    """
+    geocoder_id = geocoder.__class__.__name__
+
+    # Trying the memory cache first, and then falling back to the cache backend
+    metrics = util.get_metrics()
+    memory_cache = util.get_geocoder_memory_cache()
+    with metrics.timer("geocoder_cache_read_seconds", geocoder=geocoder_id, tier="memory"):
+        cache_entry = memory_cache.get(geocoder_id, cache_key)
+    tier = "memory"
+    if cache_entry is None:
+        with metrics.timer("geocoder_cache_read_seconds", geocoder=geocoder_id, tier="backend"):
+            cache_entry = util.get_geocoder_cache().get(geocoder_id, cache_key)
+        tier = "backend"
+        if cache_entry is not None and not records.is_result(cache_entry[0]):
+            current_app.logger.debug(f"Found {geocoder_id} entry for '{cache_key}', but it isn't a result, ignoring it")
+            cache_entry = None
+        if cache_entry is not None:
+            memory_cache.put(geocoder_id, cache_key, *cache_entry)
+    else:
+        current_app.logger.debug(f"Found {geocoder_id} entry for '{cache_key}' in memory cache")
+
+    creation_threshold = _get_cache_age_threshold(geocoder_id, cache_entry[0]) if cache_entry is not None else None
+    grace_period = current_app.config["GEOCODER_CACHE_STALE_GRACE_PERIOD"] if allow_stale else 0
+    now = datetime.datetime.now()
+    if cache_entry is not None and (now.timestamp() - cache_entry[1]) < creation_threshold:
+        current_app.logger.debug(f"Found {geocoder_id} {'negative ' if is_negative_result(cache_entry[0]) else ''}"
+                                 f"entry for '{cache_key}', newer than {creation_threshold} seconds, using it")
+        metrics.inc("geocoder_cache_lookups_total", geocoder=geocoder_id, outcome="hit", tier=tier)
+        result, _ = cache_entry
+        return result
+    elif cache_entry is not None and (now.timestamp() - cache_entry[1]) < (creation_threshold + grace_period):
+        current_app.logger.debug(f"Found {geocoder_id} entry for '{cache_key}', but it is stale, "
+                                 f"using it and refreshing it in the background")
+        util.get_geocoder_cache_refresher().submit(
+            (geocoder_id, cache_key),
+            _refresh_cached_result, current_app._get_current_object(), geocoder, cache_key, address
+        )
+        metrics.inc("geocoder_cache_lookups_total", geocoder=geocoder_id, outcome="stale_hit", tier=tier)
+        result, _ = cache_entry
+        return result
+    elif cache_entry is not None:
+        current_app.logger.debug(f"Found {geocoder_id} entry for '{cache_key}', but it is too old")
+    else:
+        current_app.logger.debug(f"Didn't find {geocoder_id} entry for '{cache_key}'")
+
+    metrics.inc("geocoder_cache_lookups_total", geocoder=geocoder_id, outcome="miss", tier="none")
+    return None
+
+
+def update_cache(geocoder, cache_key, address, result):
+    """Writes a fresh result through to the memory cache and the cache backend. Failures are not cached.
+
+    :return: The result, or an empty result if the geocoder failed
+    """
+    geocoder_id = geocoder.__class__.__name__
+    if is_error_result(result):
+        current_app.logger.warning(f"{geocoder_id} failed to geocode '{address}' ('{result}'), not caching it")
+        return address, None, None, None
+
+    current_app.logger.debug(f"Writing {geocoder_id} {'negative ' if is_negative_result(result) else ''}"
+                             f"entry for '{cache_key}'")
+
+    created = datetime.datetime.now().timestamp()
+    try:
+        with util.get_metrics().timer("geocoder_cache_write_seconds", geocoder=geocoder_id):
+            util.get_geocoder_cache().put(geocoder_id, cache_key, result, created)
+    except ValueError as e:
+        # The geocoder returned something that isn't a location, so treating it as a failure
+        current_app.logger.error(f"{geocoder_id} returned an invalid result for '{address}' ({e}), not caching it")
+        return address, None, None, None
+    util.get_geocoder_memory_cache().put(geocoder_id, cache_key, result, created)
+
+    return result
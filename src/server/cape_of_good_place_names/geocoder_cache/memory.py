@@ -0,0 +1,117 @@
+import collections
+import datetime
+import pickle
+import threading
+
+
+class MemoryCache(object):
+    """Bounded, in-process LRU cache of geocoder results, that sits in front of the cache backend.
+
+    Entries are evicted least recently used first once either the entry or byte budget is exceeded, and expire once
+    they are older than the TTL.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=64 * 2 ** 20, ttl=None):
+        """
+        :param max_entries: Maximum number of entries to hold
+        :type max_entries: int
+        :param max_bytes: Maximum (approximate) size of the entries held, in bytes
+        :type max_bytes: int
+        :param ttl: Maximum age of an entry, in seconds, measured from the entry's creation time
+        :type ttl: float
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _entry_size(address, result):
+        return len(address.encode()) + len(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _expired(self, created, now):
+        return self.ttl is not None and (now - created) >= self.ttl
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, geocoder_id, address):
+        """Look up a result
+
+        :return: (result, creation timestamp) if present and not expired, else None
+        :rtype: (tuple, float) | None
+        """
+        key = (geocoder_id, address)
+        now = datetime.datetime.now().timestamp()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            result, created, _ = entry
+            if self._expired(created, now):
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return result, created
+
+    def put(self, geocoder_id, address, result, created=None):
+        """Store a result, evicting the least recently used entries if the cache is over budget"""
+        now = datetime.datetime.now().timestamp()
+        created = created if created is not None else now
+        if self._expired(created, now):
+            return
+
+        size = self._entry_size(address, result)
+        if size > self.max_bytes:
+            return
+
+        key = (geocoder_id, address)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (result, created, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def delete(self, geocoder_id, address):
+        with self._lock:
+            if (geocoder_id, address) in self._entries:
+                self._remove((geocoder_id, address))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
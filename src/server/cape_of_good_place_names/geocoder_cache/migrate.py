@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+import argparse
+import itertools
+import logging
+import time
+
+from cape_of_good_place_names.geocoder_cache import backends, records
+from cape_of_good_place_names.geocoder_cache.normalise import normalise_address
+
+
+TARGET_BACKENDS = {
+    "sqlite": backends.SqliteCacheBackend,
+    "sharded": backends.ShardedFileCacheBackend,
+}
+
+
+def copy_entries(source, target, batch_size=1000, delete_source=False, normalise_keys=False):
+    """Copies every entry in one cache backend into another, preserving the entries' creation times
+
+    :param source: Cache backend to read from
+    :type source: backends.CacheBackend
+    :param target: Cache backend to write to
+    :type target: backends.CacheBackend
+    :param batch_size: Number of entries to write at a time
+    :type batch_size: int
+    :param delete_source: Whether to remove the entries from the source once they have been written to the target
+    :type delete_source: bool
+    :param normalise_keys: Whether to normalise the entries' addresses, as the cache keys are when
+                           GEOCODER_CACHE_NORMALISE_KEYS is set
+    :type normalise_keys: bool
+
+    :return: Number of entries copied
+    :rtype: int
+    """
+    def _source_entries():
+        for geocoder_id, address, _, _ in source.entries():
+            cache_entry = source.get(geocoder_id, address)
+            if cache_entry is None:
+                logging.warning(f"'{geocoder_id}' + '{address}' disappeared while copying, skipping")
+                continue
+
+            result, created = cache_entry
+            if not records.is_result(result):
+                logging.warning(f"'{geocoder_id}' + '{address}' isn't a geocoder result ('{result}'), skipping")
+                continue
+
+            yield geocoder_id, address, result, created
+
+    def _target_entry(geocoder_id, address, result, created):
+        return geocoder_id, normalise_address(address) if normalise_keys else address, result, created
+
+    copied = 0
+    entries = _source_entries()
+    while True:
+        batch = list(itertools.islice(entries, batch_size))
+        if not batch:
+            break
+
+        target.put_many([_target_entry(*entry) for entry in batch])
+        copied += len(batch)
+
+        if delete_source:
+            for geocoder_id, address, *_ in batch:
+                source.delete(geocoder_id, address)
+
+        logging.info(f"Copied {copied} entries...")
+
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Utility script for moving a pickle-per-address geocoder cache into the single file SQLite store, "
+                    "or into the sharded file layout",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("-s", "--source-dir", required=True,
+                        help="Existing geocoder cache directory, with a subdirectory of pickles per geocoder")
+    parser.add_argument("-t", "--target-dir", required=False,
+                        help="Directory for the new cache. Defaults to the source directory")
+    parser.add_argument("-tb", "--target-backend", choices=sorted(TARGET_BACKENDS.keys()), default="sqlite",
+                        help="Cache backend to move the entries into")
+    parser.add_argument("-d", "--delete-source", action="store_true",
+                        help="Delete the source pickles once they have been copied")
+    parser.add_argument("-r", "--raw-keys", action="store_true",
+                        help="Keep the addresses as they are, rather than normalising them into cache keys (for "
+                             "servers with GEOCODER_CACHE_NORMALISE_KEYS switched off)")
+    parser.add_argument("-b", "--batch-size", type=int, default=1000,
+                        help="Number of entries to write per transaction")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Verbosity flag")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s-cogpn-migrate-cache [%(levelname)s]: %(message)s')
+
+    source = backends.FileCacheBackend(args.source_dir)
+    target_dir = args.target_dir or args.source_dir
+    target = TARGET_BACKENDS[args.target_backend](target_dir)
+
+    logging.info(f"Migrat[ing] '{args.source_dir}' -> {target.__class__.__name__}('{target_dir}')...")
+    start = time.monotonic()
+    copied = copy_entries(source, target, args.batch_size, args.delete_source, normalise_keys=not args.raw_keys)
+    target.close()
+    logging.info(f"...Migrat[ed] {copied} entries in {time.monotonic() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import re
+import unicodedata
+
+NON_WORD_REGEX = re.compile(r'[\W_]+')
+
+# Common abbreviations of street types and address terms, expanded to their full form
+ABBREVIATIONS = {
+    "av": "avenue",
+    "ave": "avenue",
+    "blvd": "boulevard",
+    "bvd": "boulevard",
+    "cl": "close",
+    "cnr": "corner",
+    "cres": "crescent",
+    "ct": "court",
+    "ext": "extension",
+    "hwy": "highway",
+    "ln": "lane",
+    "pde": "parade",
+    "pl": "place",
+    "rd": "road",
+    "sq": "square",
+    "str": "street",
+    "tce": "terrace",
+}
+# Abbreviations that are also used for other words (e.g. "St" for "Saint", or "Dr" for "Doctor"), only expanded where
+# they can only be a street type - at the end of the address, or just before a unit or number
+AMBIGUOUS_ABBREVIATIONS = {
+    "dr": "drive",
+    "st": "street",
+}
+UNIT_TERMS = {"apartment", "apt", "flat", "suite", "unit"}
+
+
+def _expand(token, next_token):
+    if token in AMBIGUOUS_ABBREVIATIONS:
+        if next_token is None or next_token in UNIT_TERMS or any(char.isdigit() for char in next_token):
+            return AMBIGUOUS_ABBREVIATIONS[token]
+
+        return token
+
+    return ABBREVIATIONS.get(token, token)
+
+
+def normalise_address(address):
+    """Reduces a free form address to a canonical form, for use as a cache key.
+
+    Case folds, collapses whitespace and punctuation into single spaces, and expands common abbreviations, e.g.
+    "12  Long Rd., Cape Town" -> "12 long road cape town".
+
+    :param address: Free form address string
+    :type address: str
+
+    :rtype: str
+    """
+    address = unicodedata.normalize("NFKC", address).casefold()
+    tokens = NON_WORD_REGEX.sub(" ", address).split()
+
+    return " ".join(_expand(token, next_token) for token, next_token in zip(tokens, tokens[1:] + [None]))
@@ -0,0 +1,145 @@
+"""Compact, versioned binary format for cached geocoder results:
+
+    header:      magic (3 bytes) | version (uint8) | compression (uint8)
+    body (v1):   lat (float64) | lon (float64) | key address length (uint32) | result address length (uint32) |
+                 key address (UTF-8) | result address (UTF-8) | extra result values (JSON, omitted if all null)
+
+The body is optionally compressed. Coordinates are converted to floats, with null ones stored as NaN, the key address
+is stored as empty when it is the same as the result's address, and extra values that aren't JSON serialisable are
+stored as their repr.
+"""
+
+import json
+import math
+import struct
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b"CGR"
+VERSION = 1
+HEADER = struct.Struct("<3sBB")
+BODY = struct.Struct("<ddII")
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+COMPRESSION_IDS = {
+    None: COMPRESSION_NONE,
+    "zlib": COMPRESSION_ZLIB,
+    "zstd": COMPRESSION_ZSTD,
+}
+
+
+def _compress(body, compression_id):
+    if compression_id == COMPRESSION_ZLIB:
+        return zlib.compress(body)
+    elif compression_id == COMPRESSION_ZSTD:
+        return zstandard.ZstdCompressor().compress(body)
+
+    return body
+
+
+def _decompress(body, compression_id):
+    if compression_id == COMPRESSION_ZLIB:
+        return zlib.decompress(body)
+    elif compression_id == COMPRESSION_ZSTD:
+        assert zstandard is not None, "zstd compressed record, but the 'zstandard' package is not installed!"
+        return zstandard.ZstdDecompressor().decompress(body)
+    elif compression_id != COMPRESSION_NONE:
+        raise ValueError(f"Unknown record compression '{compression_id}'")
+
+    return body
+
+
+def _to_float(value):
+    # Geocoders return coordinates as numbers, numeric strings or Decimals, with None (or an empty string) for none
+    if value is None or value == "":
+        return math.nan
+
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{value!r}' is not a coordinate")
+
+
+def _from_float(value):
+    return None if math.isnan(value) else value
+
+
+def check_compression(compression):
+    """Validates a compression setting
+
+    :param compression: None, "zlib" or "zstd"
+    :type compression: str
+    """
+    assert compression in COMPRESSION_IDS, f"'{compression}' is not a supported compression!"
+    assert compression != "zstd" or zstandard is not None, "zstd compression needs the 'zstandard' package!"
+
+
+def is_result(value):
+    """Whether a cached value is a geocoder result tuple - earlier versions could leave pickled Nones in the cache"""
+    return isinstance(value, tuple) and len(value) >= 3
+
+
+def is_record(data):
+    """Whether the bytes are in this format (as opposed to a legacy pickle)"""
+    return data[:len(MAGIC)] == MAGIC
+
+
+def encode(address, result, compression=None):
+    """Encodes a geocoder result
+
+    :param address: Address that was geocoded
+    :type address: str
+    :param result: Geocoder result tuple - (address, lat, lon, *extra values)
+    :type result: tuple
+    :param compression: None, "zlib" or "zstd"
+    :type compression: str
+
+    :rtype: bytes
+    """
+    result_address, lat, lon, *extra_values = result
+    key_bytes = address.encode() if address != result_address else b""
+    result_address_bytes = result_address.encode() if result_address is not None else b""
+    extra_bytes = (
+        json.dumps(extra_values, separators=(",", ":"), default=repr).encode()
+        if any(value is not None for value in extra_values) else b""
+    )
+    body = b"".join((
+        BODY.pack(_to_float(lat), _to_float(lon), len(key_bytes), len(result_address_bytes)),
+        key_bytes, result_address_bytes, extra_bytes
+    ))
+
+    compression_id = COMPRESSION_IDS[compression]
+    return HEADER.pack(MAGIC, VERSION, compression_id) + _compress(body, compression_id)
+
+
+def decode(data):
+    """Decodes a geocoder result
+
+    :param data: Encoded record
+    :type data: bytes
+
+    :return: (address, result)
+    :rtype: (str, tuple)
+    """
+    magic, version, compression_id = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a geocoder cache record")
+    elif version != VERSION:
+        raise ValueError(f"Unsupported geocoder cache record version '{version}'")
+
+    body = _decompress(data[HEADER.size:], compression_id)
+    lat, lon, key_length, result_address_length = BODY.unpack_from(body)
+    key_end = BODY.size + key_length
+    result_address_end = key_end + result_address_length
+
+    result_address = body[key_end:result_address_end].decode()
+    address = body[BODY.size:key_end].decode() if key_length else result_address
+    extra_values = json.loads(body[result_address_end:]) if result_address_end < len(body) else [None]
+
+    return address, (result_address, _from_float(lat), _from_float(lon), *extra_values)
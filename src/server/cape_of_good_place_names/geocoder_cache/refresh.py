@@ -0,0 +1,77 @@
+import concurrent.futures
+import logging
+import threading
+
+
+class CacheRefresher(object):
+    """Refreshes stale cache entries in the background, on a small pool of worker threads.
+
+    Only one refresh per key is in flight at a time - requests for a key that is already being refreshed are skipped.
+    """
+
+    def __init__(self, max_workers=2):
+        self.max_workers = max_workers
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix="cogpn-cache-refresh")
+        self._pending = {}
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.skipped = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, key, refresh_func, *args):
+        """Schedules a refresh, unless one is already pending for the key
+
+        :param key: Identifier of the entry being refreshed
+        :type key: Hashable
+        :param refresh_func: Function that does the refresh, called with *args
+
+        :return: Whether the refresh was scheduled
+        :rtype: bool
+        """
+        with self._lock:
+            if key in self._pending:
+                self.skipped += 1
+                return False
+
+            self._pending[key] = self._executor.submit(self._refresh, key, refresh_func, *args)
+            self.submitted += 1
+
+        return True
+
+    def _refresh(self, key, refresh_func, *args):
+        try:
+            refresh_func(*args)
+        except Exception as e:
+            logging.error(f"Refresh of '{key}' failed because '{e.__class__.__name__}: {e}'")
+            with self._lock:
+                self.failed += 1
+        else:
+            with self._lock:
+                self.completed += 1
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def wait(self, timeout=None):
+        """Blocks until the currently pending refreshes are done"""
+        with self._lock:
+            pending_futures = list(self._pending.values())
+
+        concurrent.futures.wait(pending_futures, timeout=timeout)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "submitted": self.submitted,
+                "skipped": self.skipped,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+import argparse
+import collections
+import concurrent.futures
+import csv
+import itertools
+import json
+import logging
+import pathlib
+import threading
+import time
+
+import flask
+
+from cape_of_good_place_names import util
+from cape_of_good_place_names.geocoder_cache import fileutil, lookup
+
+INPUT_FORMATS = ("csv", "ndjson")
+HIT = "hit"
+UPSTREAM = "upstream"
+FAILURE = "failure"
+
+
+def read_addresses(input_file, input_format="csv", field="address"):
+    """Reads the addresses to warm the cache with, one per record
+
+    :param input_file: Open text file
+    :param input_format: "csv" (with a header row) or "ndjson"
+    :type input_format: str
+    :param field: CSV column or JSON key that holds the address
+    :type field: str
+
+    :return: Iterator of address strings. Empty addresses are yielded as None, so that offsets match the input records
+    """
+    if input_format == "csv":
+        records = csv.DictReader(input_file)
+    elif input_format == "ndjson":
+        records = (json.loads(line) if line.strip() else {} for line in input_file)
+    else:
+        raise ValueError(f"Unknown input format '{input_format}'")
+
+    for record in records:
+        address = record.get(field)
+        yield (address.strip() or None) if isinstance(address, str) else None
+
+
+def read_checkpoint(checkpoint_path):
+    """:return: Number of input records already processed, according to the checkpoint file"""
+    checkpoint_path = pathlib.Path(checkpoint_path)
+    if not checkpoint_path.exists():
+        return 0
+
+    with open(checkpoint_path) as checkpoint_file:
+        return json.load(checkpoint_file)["offset"]
+
+
+def write_checkpoint(checkpoint_path, offset):
+    checkpoint_data = json.dumps({"offset": offset, "updated": time.time()}).encode()
+    fileutil.atomic_write(pathlib.Path(checkpoint_path), checkpoint_data)
+
+
+class WarmStats(object):
+    """Per geocoder counts and upstream timings of a warming run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = collections.defaultdict(collections.Counter)
+        self._upstream_time = collections.Counter()
+        self.addresses = 0
+        self.start = time.monotonic()
+
+    def record(self, geocoder_id, outcome, elapsed=0):
+        with self._lock:
+            self._counts[geocoder_id][outcome] += 1
+            self._upstream_time[geocoder_id] += elapsed
+
+    def address_done(self):
+        with self._lock:
+            self.addresses += 1
+
+    def report(self):
+        with self._lock:
+            duration = time.monotonic() - self.start
+            return {
+                "addresses": self.addresses,
+                "duration": duration,
+                "addresses_per_second": self.addresses / duration if duration else 0,
+                "geocoders": {
+                    geocoder_id: {
+                        "hits": counts[HIT],
+                        "upstream": counts[UPSTREAM],
+                        "failures": counts[FAILURE],
+                        "mean_upstream_latency": (
+                            self._upstream_time[geocoder_id] / (counts[UPSTREAM] + counts[FAILURE])
+                            if (counts[UPSTREAM] + counts[FAILURE]) else None
+                        ),
+                    }
+                    for geocoder_id, counts in self._counts.items()
+                }
+            }
+
+
+def _warm_entry(app, geocoder, address, stats):
+    geocoder_id = geocoder.__class__.__name__
+    with app.app_context():
+        cache_key = lookup.get_cache_key(address)
+        if lookup.get_cached_result(geocoder, cache_key, address, allow_stale=False) is not None:
+            stats.record(geocoder_id, HIT)
+            return
+
+        start = time.monotonic()
+        result = lookup.geocode_upstream(geocoder, address)
+        elapsed = time.monotonic() - start
+
+        lookup.update_cache(geocoder, cache_key, address, result)
+        stats.record(geocoder_id, FAILURE if lookup.is_error_result(result) else UPSTREAM, elapsed)
+
+
+def warm_cache(app, addresses, concurrency=4, start_offset=0, checkpoint_path=None, checkpoint_interval=1000,
+               stats=None):
+    """Geocodes addresses with every configured geocoder, writing the results through the geocoder cache.
+
+    Each geocoder gets its own pool of workers, so a slow provider doesn't hold up the others beyond the bound on the
+    number of addresses in flight. Entries that are already cached (and fresh) aren't requested again.
+
+    :param app: Flask app, configured with the geocoders and cache to use
+    :param addresses: Iterable of addresses (None entries are skipped, but counted towards the offset)
+    :param concurrency: Maximum number of concurrent requests per geocoder
+    :type concurrency: int
+    :param start_offset: Number of addresses to skip, e.g. the offset from a previous run's checkpoint
+    :type start_offset: int
+    :param checkpoint_path: File to periodically record progress in. Not written if None
+    :param checkpoint_interval: Number of completed addresses between checkpoints
+    :type checkpoint_interval: int
+    :param stats: Stats to record into. A new WarmStats is created if None
+
+    :return: Warming run stats
+    :rtype: WarmStats
+    """
+    stats = stats or WarmStats()
+    with app.app_context():
+        geocoders = util.get_geocoders()
+
+    executors = {
+        geocoder: concurrent.futures.ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix=f"cogpn-warm-{geocoder.__class__.__name__}"
+        )
+        for geocoder in geocoders
+    }
+    # Bounding the addresses in flight, so the input isn't read into memory all at once
+    in_flight = threading.BoundedSemaphore(concurrency * 2)
+
+    # Progress is tracked as a low watermark - the offset below which every address has been completely processed
+    progress_lock = threading.Lock()
+    remaining = {}
+    completed = set()
+    watermark = start_offset
+    last_checkpoint = start_offset
+
+    def _address_done(offset):
+        nonlocal watermark, last_checkpoint
+        with progress_lock:
+            completed.add(offset)
+            while watermark in completed:
+                completed.remove(watermark)
+                watermark += 1
+
+            if checkpoint_path is not None and watermark - last_checkpoint >= checkpoint_interval:
+                write_checkpoint(checkpoint_path, watermark)
+                last_checkpoint = watermark
+                logging.info(f"Checkpointed at {watermark}")
+
+        stats.address_done()
+        in_flight.release()
+
+    def _entry_done(offset, future):
+        if future.exception() is not None:
+            logging.error(f"Warming address #{offset} failed: '{future.exception()}'")
+
+        with progress_lock:
+            remaining[offset] -= 1
+            address_done = remaining[offset] == 0
+            if address_done:
+                del remaining[offset]
+
+        if address_done:
+            _address_done(offset)
+
+    try:
+        for offset, address in enumerate(itertools.islice(addresses, start_offset, None), start_offset):
+            in_flight.acquire()
+            if address is None or not executors:
+                _address_done(offset)
+                continue
+
+            with progress_lock:
+                remaining[offset] = len(executors)
+
+            for geocoder, executor in executors.items():
+                future = executor.submit(_warm_entry, app, geocoder, address, stats)
+                future.add_done_callback(lambda f, offset=offset: _entry_done(offset, f))
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True)
+
+        if checkpoint_path is not None:
+            write_checkpoint(checkpoint_path, watermark)
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Utility script for warming the geocoder cache from a list of addresses, using the configured "
+                    "geocoders and cache",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("-i", "--input-file", required=True,
+                        help="CSV (with a header row) or newline delimited JSON file of addresses")
+    parser.add_argument("-f", "--input-format", choices=INPUT_FORMATS, default=None,
+                        help="Format of the input file. Guessed from the file extension if not given")
+    parser.add_argument("-k", "--field", default="address",
+                        help="CSV column or JSON key that holds the address")
+    parser.add_argument("-c", "--concurrency", type=int, default=4,
+                        help="Maximum number of concurrent requests per geocoder")
+    parser.add_argument("-cp", "--checkpoint-file", required=False,
+                        help="File to record progress in, for resuming. Defaults to '<input file>.checkpoint'")
+    parser.add_argument("-ci", "--checkpoint-interval", type=int, default=1000,
+                        help="Number of addresses between checkpoints")
+    parser.add_argument("-r", "--restart", action="store_true",
+                        help="Ignore any existing checkpoint, and start from the beginning of the input")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="Verbosity flag")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s-cogpn-warm-cache [%(levelname)s]: %(message)s')
+
+    app = flask.Flask("cogpn-warm-cache")
+    app.config.from_object("cape_of_good_place_names.config.config.Config")
+    # The server owns the geocoder statistics file, so the warming run's statistics are only kept in memory, rather than
+    # overwriting the server's at exit
+    app.config["GEOCODER_STATS_FILE"] = None
+
+    input_format = args.input_format or ("ndjson" if args.input_file.endswith((".ndjson", ".jsonl")) else "csv")
+    checkpoint_path = args.checkpoint_file or f"{args.input_file}.checkpoint"
+    start_offset = 0 if args.restart else read_checkpoint(checkpoint_path)
+
+    logging.info(f"Warm[ing] cache from '{args.input_file}', starting at #{start_offset}...")
+    with open(args.input_file, newline="") as input_file:
+        stats = warm_cache(app, read_addresses(input_file, input_format, args.field),
+                           args.concurrency, start_offset, checkpoint_path, args.checkpoint_interval)
+
+    report = stats.report()
+    logging.info(f"...Warm[ed] cache with {report['addresses']} addresses in {report['duration']:.1f}s "
+                 f"({report['addresses_per_second']:.1f} addresses/s)")
+
+    print(f"{'geocoder':<32} {'hits':>8} {'upstream':>9} {'failures':>9} {'mean latency':>13}")
+    for geocoder_id, geocoder_report in report["geocoders"].items():
+        mean_latency = geocoder_report["mean_upstream_latency"]
+        print(f"{geocoder_id:<32} {geocoder_report['hits']:>8} {geocoder_report['upstream']:>9} "
+              f"{geocoder_report['failures']:>9} "
+              f"{f'{mean_latency * 1000:.0f}ms' if mean_latency is not None else '-':>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+# coding: utf-8
+
+# flake8: noqa
+from __future__ import absolute_import
+# import upstream request controls into geocoder upstream package
+from cape_of_good_place_names.geocoder_upstream.aio import AsyncGeocoderAdapter, EventLoopThread
+from cape_of_good_place_names.geocoder_upstream.breaker import GeocoderCircuitBreaker, GeocoderCircuitOpen
+from cape_of_good_place_names.geocoder_upstream.coalesce import SingleFlight
+from cape_of_good_place_names.geocoder_upstream.executor import GeocoderExecutor, GeocoderExecutorSaturated
+from cape_of_good_place_names.geocoder_upstream.hedging import GeocoderHedger
+from cape_of_good_place_names.geocoder_upstream.limits import GeocoderLimiter, GeocoderLimitExceeded
+from cape_of_good_place_names.geocoder_upstream.selection import GeocoderSelector
+from cape_of_good_place_names.geocoder_upstream.sessions import HttpSessionPool
@@ -0,0 +1,111 @@
+import asyncio
+import inspect
+import threading
+
+
+class AsyncGeocoderAdapter(object):
+    """Async interface to a geocode_array geocoder.
+
+    Geocoders that offer a geocode_async coroutine are awaited directly on the event loop, so holding no threads while
+    their requests are in flight. The rest are run on the geocoder executor, with the event loop awaiting the result.
+    """
+
+    def __init__(self, geocoder, executor):
+        """
+        :param geocoder: Geocoder being wrapped
+        :type geocoder: geocode_array.Geocoder.Geocoder
+        :param executor: Executor that blocking geocoders are run on
+        :type executor: cape_of_good_place_names.geocoder_upstream.GeocoderExecutor
+        """
+        self.geocoder = geocoder
+        self.executor = executor
+
+    @property
+    def geocoder_id(self):
+        return self.geocoder.__class__.__name__
+
+    @property
+    def native(self):
+        """Whether the geocoder is awaited directly, rather than being run on the executor"""
+        return inspect.iscoroutinefunction(getattr(self.geocoder, "geocode_async", None))
+
+    async def geocode(self, address):
+        """:return: The geocoder's result tuple, or None if it failed
+
+        :raises cape_of_good_place_names.geocoder_upstream.GeocoderExecutorSaturated: if a blocking geocoder can't be
+                                                                                        queued on the executor
+        """
+        if self.native:
+            return await self.geocoder.geocode_async(address)
+
+        return await asyncio.wrap_future(self.executor.submit(self.geocoder.geocode, address))
+
+
+class EventLoopThread(object):
+    """Asyncio event loop, run forever in a thread of its own, which coroutines can be submitted to from any thread.
+
+    Each worker process has one of these, which all of its async geocoder requests share. The thread is only started
+    once the first coroutine is submitted.
+    """
+
+    def __init__(self, thread_name="cogpn-geocode-loop"):
+        """
+        :param thread_name: Name of the event loop's thread
+        :type thread_name: str
+        """
+        self.loop = asyncio.new_event_loop()
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.spawned = 0
+
+        self._thread = threading.Thread(target=self._run, name=thread_name, daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedules a coroutine on the event loop, from any thread
+
+        :rtype: concurrent.futures.Future
+        """
+        with self._lock:
+            if self._thread.ident is None:
+                self._thread.start()
+            self.submitted += 1
+
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def spawn(self, coro):
+        """Schedules a coroutine as a task on the event loop, from within the event loop. The task is kept track of until
+        it finishes, so it may be left to run in the background.
+
+        :rtype: asyncio.Task
+        """
+        task = self.loop.create_task(coro)
+        with self._lock:
+            self.spawned += 1
+            self._tasks.add(task)
+        task.add_done_callback(self._forget)
+
+        return task
+
+    def _forget(self, task):
+        with self._lock:
+            self._tasks.discard(task)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tasks": len(self._tasks),
+                "submitted": self.submitted,
+                "spawned": self.spawned,
+            }
+
+    def close(self):
+        if self._thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+        self.loop.close()
@@ -0,0 +1,156 @@
+import collections
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class GeocoderCircuitOpen(Exception):
+    """Raised in place of a request to a geocoder whose circuit is open"""
+
+
+class _Circuit(object):
+    def __init__(self):
+        self.state = STATE_CLOSED
+        self.outcomes = collections.deque()  # (time, success)
+        self.opened_at = None
+        self.probes = {}  # token: start time
+
+        self.opened = 0
+        self.rejected = 0
+
+
+class GeocoderCircuitBreaker(object):
+    """Per geocoder circuit breakers, which stop requests being made to a geocoder that is failing.
+
+    A circuit opens once at least failure_rate of the requests made to its geocoder over the last window seconds have
+    failed. Requests are then rejected straight away, until open_duration seconds have passed, after which a few probe
+    requests are let through (the circuit is half open). If the probes succeed, the circuit closes again, otherwise it
+    stays open for another open_duration.
+    """
+
+    def __init__(self, window=60, failure_rate=0.5, min_requests=10, open_duration=30, probes=1):
+        """
+        :param window: Number of seconds of requests that the failure rate is worked out over
+        :type window: float
+        :param failure_rate: Fraction of failed requests at which the circuit opens
+        :type failure_rate: float
+        :param min_requests: Number of requests in the window needed before the circuit can open
+        :type min_requests: int
+        :param open_duration: Number of seconds the circuit stays open for, before probing the geocoder
+        :type open_duration: float
+        :param probes: Number of probe requests in flight at once, while half open
+        :type probes: int
+        """
+        self.window = window
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.open_duration = open_duration
+        self.max_probes = probes
+
+        self._circuits = collections.defaultdict(_Circuit)
+        self._tokens = itertools.count()
+        self._lock = threading.Lock()
+
+    def _update_state(self, geocoder_id, circuit, now):
+        if circuit.state == STATE_OPEN and now - circuit.opened_at >= self.open_duration:
+            logger.info(f"{geocoder_id} circuit half open, probing it")
+            circuit.state = STATE_HALF_OPEN
+            circuit.probes = {}
+
+        # Giving up on probes that never reported back
+        for token, probe_start in list(circuit.probes.items()):
+            if now - probe_start >= self.open_duration:
+                del circuit.probes[token]
+
+        while circuit.outcomes and now - circuit.outcomes[0][0] > self.window:
+            circuit.outcomes.popleft()
+
+    def _open(self, geocoder_id, circuit, now):
+        logger.warning(f"{geocoder_id} circuit open, not using it for {self.open_duration}s")
+        circuit.state = STATE_OPEN
+        circuit.opened_at = now
+        circuit.opened += 1
+        circuit.outcomes.clear()
+        circuit.probes = {}
+
+    def allow(self, geocoder_id):
+        """Whether a request may be made to the geocoder. Requests that are allowed must have their outcome recorded.
+
+        :return: A token to pass to record, or None if the request isn't allowed
+        """
+        now = time.monotonic()
+        with self._lock:
+            circuit = self._circuits[geocoder_id]
+            self._update_state(geocoder_id, circuit, now)
+
+            if circuit.state == STATE_CLOSED:
+                return next(self._tokens)
+            elif circuit.state == STATE_HALF_OPEN and len(circuit.probes) < self.max_probes:
+                token = next(self._tokens)
+                circuit.probes[token] = now
+                return token
+
+            circuit.rejected += 1
+            return None
+
+    def record(self, geocoder_id, token, success):
+        """Records the outcome of a request that was allowed
+
+        :param token: Value returned by allow for the request
+        :param success: Whether the geocoder answered (a result without a location still counts as an answer), or None
+                        if the request wasn't made after all
+        :type success: bool
+        """
+        now = time.monotonic()
+        with self._lock:
+            circuit = self._circuits[geocoder_id]
+            was_probe = circuit.probes.pop(token, None) is not None
+            if success is None:
+                return
+
+            self._update_state(geocoder_id, circuit, now)
+
+            if circuit.state == STATE_HALF_OPEN and was_probe:
+                if success:
+                    logger.info(f"{geocoder_id} circuit closed again")
+                    circuit.state = STATE_CLOSED
+                    circuit.outcomes.clear()
+                else:
+                    self._open(geocoder_id, circuit, now)
+            elif circuit.state == STATE_CLOSED:
+                circuit.outcomes.append((now, success))
+                failures = sum(1 for _, outcome in circuit.outcomes if not outcome)
+                if (len(circuit.outcomes) >= self.min_requests and
+                        failures >= self.failure_rate * len(circuit.outcomes)):
+                    self._open(geocoder_id, circuit, now)
+
+    def state(self, geocoder_id):
+        """:return: State of the geocoder's circuit - closed, open or half_open"""
+        with self._lock:
+            circuit = self._circuits[geocoder_id]
+            self._update_state(geocoder_id, circuit, time.monotonic())
+            return circuit.state
+
+    def stats(self):
+        """:return: {geocoder ID: {"state": ..., counter: value}}"""
+        now = time.monotonic()
+        with self._lock:
+            stats = {}
+            for geocoder_id, circuit in self._circuits.items():
+                self._update_state(geocoder_id, circuit, now)
+                stats[geocoder_id] = {
+                    "state": circuit.state,
+                    "requests": len(circuit.outcomes),
+                    "failures": sum(1 for _, outcome in circuit.outcomes if not outcome),
+                    "opened": circuit.opened,
+                    "rejected": circuit.rejected,
+                }
+
+            return stats
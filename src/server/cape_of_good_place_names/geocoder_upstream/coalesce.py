@@ -0,0 +1,90 @@
+import asyncio
+import concurrent.futures
+import threading
+
+
+class SingleFlight(object):
+    """Coalesces concurrent calls with the same key, so that only the first of them does the work, and the rest wait
+    for, and share, its outcome.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.coalesced = 0
+
+    def _join(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = concurrent.futures.Future()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        return call, leader
+
+    def _leave(self, key):
+        with self._lock:
+            del self._calls[key]
+
+    def do(self, key, func, *args):
+        """Calls func(*args), unless a call with the same key is already in flight, in which case that call's outcome is
+        waited for instead.
+
+        :param key: Identifier of the call
+        :type key: Hashable
+
+        :return: (return value, whether it came from another call)
+        """
+        call, leader = self._join(key)
+        if not leader:
+            return call.result(), True
+
+        try:
+            value = func(*args)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(value)
+        finally:
+            self._leave(key)
+
+        return value, False
+
+    async def do_async(self, key, coro_func, *args):
+        """Awaits coro_func(*args), unless a call with the same key is already in flight (in a thread, or on an event
+        loop), in which case that call's outcome is awaited instead.
+
+        :param key: Identifier of the call
+        :type key: Hashable
+
+        :return: (return value, whether it came from another call)
+        """
+        call, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(call), True
+
+        try:
+            value = await coro_func(*args)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(value)
+        finally:
+            self._leave(key)
+
+        return value, False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+            }
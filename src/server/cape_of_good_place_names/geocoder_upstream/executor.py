@@ -0,0 +1,94 @@
+import concurrent.futures
+import threading
+import time
+
+from cape_of_good_place_names import metrics
+
+
+class GeocoderExecutorSaturated(Exception):
+    """Raised when a request can't be queued, because the executor's queue is full"""
+
+
+class GeocoderExecutor(object):
+    """Long-lived pool of named worker threads, which all of the upstream geocoder requests in a process are made on.
+
+    At most max_queued requests wait for a worker, beyond which further requests are rejected (or, if they ask to,
+    wait for space in the queue).
+    """
+
+    def __init__(self, max_workers=32, max_queued=256, thread_name_prefix="cogpn-geocoder"):
+        """
+        :param max_workers: Number of worker threads
+        :type max_workers: int
+        :param max_queued: Number of requests that may wait for a worker, None for no limit
+        :type max_queued: int
+        :param thread_name_prefix: Prefix of the worker threads' names
+        :type thread_name_prefix: str
+        """
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix=thread_name_prefix)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queued) if max_queued is not None else None
+        self._lock = threading.Lock()
+
+        self.active = 0
+        self.queued = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait = metrics.Histogram()
+
+    def submit(self, func, *args, block=False):
+        """Schedules func(*args) on one of the workers
+
+        :param block: Whether to wait for space in the queue, rather than giving up if it is full
+        :type block: bool
+
+        :raises GeocoderExecutorSaturated: if the queue is full, and block is False
+
+        :rtype: concurrent.futures.Future
+        """
+        if self._slots is not None and not self._slots.acquire(blocking=block):
+            with self._lock:
+                self.rejected += 1
+            raise GeocoderExecutorSaturated(f"{self.max_queued} requests already waiting for a worker")
+
+        submitted_at = time.monotonic()
+        with self._lock:
+            self.queued += 1
+            self.submitted += 1
+
+        def _run():
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self.queue_wait.observe(time.monotonic() - submitted_at)
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+                if self._slots is not None:
+                    self._slots.release()
+
+        return self._executor.submit(_run)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queued": self.max_queued,
+                "active": self.active,
+                "queued": self.queued,
+                "utilisation": self.active / self.max_workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "queue_wait": self.queue_wait.to_dict(),
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
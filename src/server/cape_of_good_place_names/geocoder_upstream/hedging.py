@@ -0,0 +1,190 @@
+import asyncio
+import collections
+import concurrent.futures
+import threading
+
+
+class _Budget(object):
+    def __init__(self):
+        self.tokens = 0.0
+
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_exhausted = 0
+        self.limited = 0
+
+
+class GeocoderHedger(object):
+    """Hedges requests to slow geocoders - if a request hasn't been answered after a delay (typically the geocoder's
+    p95 latency), an identical request is made, and whichever answers first is used.
+
+    Hedges are limited to a budget, a fraction of each geocoder's requests, so that they can't double its quota, and
+    are left out when the caller says there is no room for them, e.g. in the geocoder's limits. The threaded requests,
+    and their hedges, are made on a small pool of threads of the hedger's own, so that waiting for them never holds up
+    the geocoder executor.
+    """
+
+    def __init__(self, geocoders=(), budget=0.05, max_burst=10, workers=16):
+        """
+        :param geocoders: IDs of the geocoders whose requests are hedged
+        :type geocoders: list
+        :param budget: Fraction of a geocoder's requests that may be hedged
+        :type budget: float
+        :param max_burst: Number of unused hedges that may be saved up, and then made in quick succession
+        :type max_burst: int
+        :param workers: Number of threads the threaded requests and their hedges are made on
+        :type workers: int
+        """
+        self.geocoders = set(geocoders)
+        self.budget = budget
+        self.max_burst = max_burst
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                                                               thread_name_prefix="cogpn-geocoder-hedge")
+        self._slots = threading.BoundedSemaphore(workers)
+        self._budgets = collections.defaultdict(_Budget)
+        self._lock = threading.Lock()
+
+    def hedges(self, geocoder_id):
+        """Whether the geocoder's requests are hedged"""
+        return geocoder_id in self.geocoders
+
+    def _earn(self, geocoder_id):
+        with self._lock:
+            budget = self._budgets[geocoder_id]
+            budget.requests += 1
+            budget.tokens = min(self.max_burst, budget.tokens + self.budget)
+
+    def _spend(self, geocoder_id):
+        with self._lock:
+            budget = self._budgets[geocoder_id]
+            if budget.tokens < 1:
+                budget.budget_exhausted += 1
+                return False
+
+            budget.tokens -= 1
+            budget.hedged += 1
+            return True
+
+    def _limited(self, geocoder_id, can_hedge):
+        if can_hedge is None or can_hedge():
+            return False
+
+        with self._lock:
+            self._budgets[geocoder_id].limited += 1
+        return True
+
+    def _won(self, geocoder_id):
+        with self._lock:
+            self._budgets[geocoder_id].hedge_wins += 1
+
+    def _submit(self, func):
+        if not self._slots.acquire(blocking=False):
+            return None
+
+        def _run():
+            try:
+                return func()
+            finally:
+                self._slots.release()
+
+        return self._executor.submit(_run)
+
+    @staticmethod
+    def _failed(future):
+        return future.cancelled() or future.exception() is not None or future.result() is None
+
+    def _first_success(self, geocoder_id, primary, hedge, done):
+        """:return: The first of the finished requests to have succeeded, preferring the original request, or None if
+                    neither has
+        """
+        for future in (primary, hedge):
+            if future in done and not self._failed(future):
+                if future is hedge:
+                    self._won(geocoder_id)
+                return future
+
+        return None
+
+    def call(self, geocoder_id, delay, func, hedge_func=None, can_hedge=None):
+        """Calls func(), and if it hasn't returned after delay seconds, and the budget allows, calls hedge_func() too.
+        The first of them to succeed (return something other than None) is returned.
+
+        :param delay: Number of seconds to wait before hedging
+        :type delay: float
+        :param hedge_func: Function making the hedge request, func if not given
+        :param can_hedge: Function returning whether a hedge may be made right now, e.g. whether the geocoder's limits
+                          have room for it. Hedges are always allowed if not given
+        """
+        self._earn(geocoder_id)
+        primary = self._submit(func)
+        if primary is None:
+            # No threads to spare, so not hedging
+            return func()
+
+        try:
+            return primary.result(timeout=delay)
+        except concurrent.futures.TimeoutError:
+            pass
+
+        if self._limited(geocoder_id, can_hedge) or not self._spend(geocoder_id):
+            return primary.result()
+
+        hedge = self._submit(hedge_func or func)
+        if hedge is None:
+            return primary.result()
+
+        # Both may finish at once, so the first to succeed is looked for, only falling back on the original request's
+        # failure once neither has
+        pending = {primary, hedge}
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            winner = self._first_success(geocoder_id, primary, hedge, done)
+            if winner is not None:
+                return winner.result()
+
+        return primary.result()
+
+    async def call_async(self, geocoder_id, delay, coro_func, hedge_coro_func=None, can_hedge=None):
+        """As call, but awaiting coro_func() (and hedge_coro_func()), on the event loop. The slower request, and both
+        of them if the call itself is cancelled, are cancelled.
+        """
+        self._earn(geocoder_id)
+        primary = asyncio.ensure_future(coro_func())
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or self._limited(geocoder_id, can_hedge) or not self._spend(geocoder_id):
+                return await primary
+
+            hedge = asyncio.ensure_future((hedge_coro_func or coro_func)())
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = self._first_success(geocoder_id, primary, hedge, done)
+                if winner is not None:
+                    return winner.result()
+
+            return primary.result()
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self):
+        """:return: {geocoder ID: {counter: value}}"""
+        with self._lock:
+            return {
+                geocoder_id: {
+                    "requests": budget.requests,
+                    "hedged": budget.hedged,
+                    "hedge_wins": budget.hedge_wins,
+                    "budget_exhausted": budget.budget_exhausted,
+                    "limited": budget.limited,
+                }
+                for geocoder_id, budget in self._budgets.items()
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,247 @@
+import asyncio
+import contextlib
+import threading
+import time
+
+
+class GeocoderLimitExceeded(Exception):
+    """Raised when a request would have had to wait longer than allowed for its geocoder's limits"""
+
+
+class TokenBucket(object):
+    """Token bucket rate limiter - allows bursts of up to burst requests, refilled at rate requests per second"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, rate)
+
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait=None):
+        """Takes a token, reserving it ahead of time if the bucket is empty, so that waiting callers are served in
+        order.
+
+        :param max_wait: Longest wait (in seconds) that is acceptable, no token is taken if it would be longer
+        :type max_wait: float
+
+        :return: Seconds to wait before the token may be used, or None if that would be longer than max_wait
+        :rtype: float
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+
+            self._tokens -= 1
+
+        return wait
+
+    def available(self):
+        """Whether a token could be taken right now, without waiting for it"""
+        with self._lock:
+            return min(self.burst, self._tokens + (time.monotonic() - self._last_refill) * self.rate) >= 1
+
+
+class _Limit(object):
+    def __init__(self, max_in_flight=None, requests_per_second=None, burst=None):
+        self.max_in_flight = max_in_flight
+        self.requests_per_second = requests_per_second
+
+        self.semaphore = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self.bucket = TokenBucket(requests_per_second, burst) if requests_per_second else None
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+
+class GeocoderLimiter(object):
+    """Enforces per geocoder limits on the number of requests in flight, and the rate at which they are made, across
+    all of the threads in a process.
+
+    Requests over either limit wait their turn, for up to max_wait seconds, or until their caller's deadline if that
+    is sooner - so that requests the caller has given up on don't hold on to a worker, or a place in the queue.
+    """
+
+    def __init__(self, limits=None, max_wait=None):
+        """
+        :param limits: {geocoder ID: {"max_in_flight": int, "requests_per_second": float, "burst": int}}, where any
+                       of the limits may be left out. Geocoders that aren't listed are not limited.
+        :type limits: dict
+        :param max_wait: Longest time (in seconds) that a request waits for its turn, None to wait indefinitely
+        :type max_wait: float
+        """
+        self.max_wait = max_wait
+
+        self._limits = {
+            geocoder_id: _Limit(**geocoder_limits)
+            for geocoder_id, geocoder_limits in (limits or {}).items()
+        }
+        self._lock = threading.Lock()
+
+    def _give_up_time(self, start, deadline):
+        """:return: Monotonic time at which a request started at start gives up waiting, or None if it never does"""
+        give_up_time = start + self.max_wait if self.max_wait is not None else None
+        if deadline is not None:
+            give_up_time = deadline if give_up_time is None else min(give_up_time, deadline)
+
+        return give_up_time
+
+    @staticmethod
+    def _remaining_wait(give_up_time):
+        return max(0.0, give_up_time - time.monotonic()) if give_up_time is not None else None
+
+    def _acquire(self, limit, give_up_time):
+        def _remaining_wait():
+            return self._remaining_wait(give_up_time)
+
+        if limit.semaphore is not None and not limit.semaphore.acquire(timeout=_remaining_wait()):
+            return False
+
+        if limit.bucket is not None:
+            wait = limit.bucket.reserve(_remaining_wait())
+            if wait is None:
+                if limit.semaphore is not None:
+                    limit.semaphore.release()
+                return False
+            time.sleep(wait)
+
+        return True
+
+    async def _acquire_async(self, limit, give_up_time):
+        def _remaining_wait():
+            return self._remaining_wait(give_up_time)
+
+        if limit.semaphore is not None:
+            # The semaphore is shared with threads, so polling for it, rather than blocking the event loop
+            poll_interval = 0.001
+            while not limit.semaphore.acquire(blocking=False):
+                remaining_wait = _remaining_wait()
+                if remaining_wait is not None and remaining_wait <= 0:
+                    return False
+                await asyncio.sleep(min(poll_interval, remaining_wait) if remaining_wait is not None else poll_interval)
+                poll_interval = min(2 * poll_interval, 0.05)
+
+        if limit.bucket is not None:
+            wait = limit.bucket.reserve(_remaining_wait())
+            if wait is None:
+                if limit.semaphore is not None:
+                    limit.semaphore.release()
+                return False
+            try:
+                await asyncio.sleep(wait)
+            except BaseException:
+                # Cancelled while waiting for its turn
+                if limit.semaphore is not None:
+                    limit.semaphore.release()
+                raise
+
+        return True
+
+    def _start_wait(self, limit):
+        with self._lock:
+            limit.waiting += 1
+
+    def _end_wait(self, limit, acquired):
+        with self._lock:
+            limit.waiting -= 1
+            if acquired:
+                limit.in_flight += 1
+            else:
+                limit.rejected += 1
+
+    def _release(self, limit):
+        with self._lock:
+            limit.in_flight -= 1
+        if limit.semaphore is not None:
+            limit.semaphore.release()
+
+    @contextlib.contextmanager
+    def limit(self, geocoder_id, deadline=None):
+        """Waits for the geocoder's limits to allow another request, which is then made in the with block
+
+        :param deadline: Monotonic time after which the request's result is no longer wanted, so it isn't worth waiting
+                         past it
+        :type deadline: float
+
+        :raises GeocoderLimitExceeded: if the request would have to wait for longer than max_wait, or past its deadline
+
+        :return: Seconds spent waiting
+        :rtype: float
+        """
+        limit = self._limits.get(geocoder_id)
+        if limit is None:
+            yield 0.0
+            return
+
+        start = time.monotonic()
+        acquired = False
+        self._start_wait(limit)
+        try:
+            acquired = self._acquire(limit, self._give_up_time(start, deadline))
+        finally:
+            self._end_wait(limit, acquired)
+
+        if not acquired:
+            raise GeocoderLimitExceeded(f"{geocoder_id} limits exceeded, gave up after {time.monotonic() - start:.1f}s")
+
+        try:
+            yield time.monotonic() - start
+        finally:
+            self._release(limit)
+
+    @contextlib.asynccontextmanager
+    async def limit_async(self, geocoder_id, deadline=None):
+        """As limit, but waits without blocking the event loop, for use in an async with block"""
+        limit = self._limits.get(geocoder_id)
+        if limit is None:
+            yield 0.0
+            return
+
+        start = time.monotonic()
+        acquired = False
+        self._start_wait(limit)
+        try:
+            acquired = await self._acquire_async(limit, self._give_up_time(start, deadline))
+        finally:
+            self._end_wait(limit, acquired)
+
+        if not acquired:
+            raise GeocoderLimitExceeded(f"{geocoder_id} limits exceeded, gave up after {time.monotonic() - start:.1f}s")
+
+        try:
+            yield time.monotonic() - start
+        finally:
+            self._release(limit)
+
+    def has_capacity(self, geocoder_id):
+        """Whether the geocoder's limits would allow another request right now, without it having to wait"""
+        limit = self._limits.get(geocoder_id)
+        if limit is None:
+            return True
+
+        with self._lock:
+            if limit.semaphore is not None and limit.in_flight + limit.waiting >= limit.max_in_flight:
+                return False
+
+        return limit.bucket is None or limit.bucket.available()
+
+    def stats(self):
+        """:return: {geocoder ID: {limit or counter: value}}"""
+        with self._lock:
+            return {
+                geocoder_id: {
+                    "max_in_flight": limit.max_in_flight,
+                    "requests_per_second": limit.requests_per_second,
+                    "in_flight": limit.in_flight,
+                    "waiting": limit.waiting,
+                    "rejected": limit.rejected,
+                }
+                for geocoder_id, limit in self._limits.items()
+            }
@@ -0,0 +1,261 @@
+import atexit
+import collections
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+
+KIND_STREET = "street"
+KIND_INTERSECTION = "intersection"
+KIND_PLACE = "place"
+
+STREET_NUMBER_REGEX = re.compile(r'(^|\s)\d+[a-z]?\s')
+INTERSECTION_REGEX = re.compile(r'(^|\s)(corner|cnr|and)\s|&')
+
+STATS_FILE_VERSION = 1
+
+# Stats file path: the selector that saves to it at exit. There's one exit hook per path, saving its latest selector,
+# so that selectors that have since been replaced can't overwrite their replacement's statistics.
+_exit_savers = {}
+_exit_savers_lock = threading.Lock()
+
+
+def address_kind(address):
+    """Rough kind of an address, which geocoders tend to do better or worse at
+
+    :return: street (with a street number), intersection or place
+    """
+    address = address.lower()
+    if INTERSECTION_REGEX.search(address):
+        return KIND_INTERSECTION
+    elif STREET_NUMBER_REGEX.search(address):
+        return KIND_STREET
+
+    return KIND_PLACE
+
+
+def _quantile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))] if sorted_values else None
+
+
+def _rate(values):
+    return sum(values) / len(values) if values else None
+
+
+def _save_at_exit(stats_path):
+    with _exit_savers_lock:
+        selector = _exit_savers.get(stats_path)
+
+    if selector is not None:
+        selector.save()
+
+
+class _Window(object):
+    def __init__(self, size, latencies=(), located=(), agreed=()):
+        self.latencies = collections.deque(latencies, maxlen=size)
+        self.located = collections.deque(located, maxlen=size)  # whether each answer had a location
+        self.agreed = collections.deque(agreed, maxlen=size)  # whether each located answer agreed with the others
+
+    def to_dict(self):
+        return {
+            "latencies": list(self.latencies),
+            "located": list(self.located),
+            "agreed": list(self.agreed),
+        }
+
+
+class GeocoderSelector(object):
+    """Keeps rolling statistics of each geocoder's latency, null rate and agreement with the other geocoders, per kind
+    of address, and uses them to skip the geocoders that are unlikely to contribute to a request's result.
+
+    A geocoder's expected contribution is the fraction of its recent answers that arrived within its timeout, had a
+    location, and agreed with the other geocoders. Geocoders are skipped once this is below min_contribution, over at
+    least min_samples answers - except for an exploration fraction of requests, so that their statistics keep up to
+    date. The statistics are saved to stats_file every save_interval seconds (and at exit, by the latest selector for
+    the file), and loaded from it at startup.
+    """
+
+    def __init__(self, stats_file=None, window=1000, min_samples=100, min_contribution=0, exploration=0.05,
+                 save_interval=60):
+        """
+        :param stats_file: Path of the JSON file the statistics are persisted to, None to only keep them in memory
+        :type stats_file: str
+        :param window: Number of recent answers kept per geocoder and kind of address
+        :type window: int
+        :param min_samples: Number of answers needed before a geocoder may be skipped
+        :type min_samples: int
+        :param min_contribution: Expected contribution below which a geocoder is skipped, 0 to never skip
+        :type min_contribution: float
+        :param exploration: Fraction of requests for which low contribution geocoders are still used
+        :type exploration: float
+        :param save_interval: Number of seconds between saves of the statistics
+        :type save_interval: float
+        """
+        self.stats_file = stats_file
+        self.window = window
+        self.min_samples = min_samples
+        self.min_contribution = min_contribution
+        self.exploration = exploration
+        self.save_interval = save_interval
+
+        self._windows = {}  # (geocoder ID, address kind): window
+        self._lock = threading.Lock()
+        self._last_saved = time.monotonic()
+
+        if self.stats_file is not None:
+            self.load()
+            self._register_exit_save()
+
+    def _register_exit_save(self):
+        stats_path = os.path.abspath(self.stats_file)
+        with _exit_savers_lock:
+            if stats_path not in _exit_savers:
+                atexit.register(_save_at_exit, stats_path)
+            _exit_savers[stats_path] = self
+
+    def _get_window(self, geocoder_id, kind):
+        window_key = (geocoder_id, kind)
+        if window_key not in self._windows:
+            self._windows[window_key] = _Window(self.window)
+
+        return self._windows[window_key]
+
+    def record_answer(self, geocoder_id, address, latency, located):
+        """Records a geocoder's answer to a request
+
+        :param latency: Number of seconds the geocoder took to answer
+        :type latency: float
+        :param located: Whether the answer had a location
+        :type located: bool
+        """
+        with self._lock:
+            window = self._get_window(geocoder_id, address_kind(address))
+            window.latencies.append(latency)
+            window.located.append(int(located))
+
+        self._maybe_save()
+
+    def record_agreement(self, geocoder_id, address, agreed):
+        """Records whether a geocoder's located answer agreed with the other geocoders' answers"""
+        with self._lock:
+            self._get_window(geocoder_id, address_kind(address)).agreed.append(int(agreed))
+
+        self._maybe_save()
+
+    def expected_contribution(self, geocoder_id, address, timeout=None):
+        """:return: Fraction of the geocoder's recent answers for this kind of address that arrived within the timeout,
+                    had a location, and agreed with the other geocoders, or None if there aren't enough of them
+           :rtype: float
+        """
+        with self._lock:
+            window = self._windows.get((geocoder_id, address_kind(address)))
+            if window is None or len(window.located) < self.min_samples:
+                return None
+
+            on_time_rate = _rate([latency <= timeout for latency in window.latencies]) if timeout is not None else 1
+            located_rate = _rate(window.located)
+            agreement_rate = _rate(window.agreed) if window.agreed else 1
+
+        return on_time_rate * located_rate * agreement_rate
+
+    def latency_quantile(self, geocoder_id, address, q, min_samples=None):
+        """:return: Quantile of the geocoder's recent latencies for this kind of address, or None if there are fewer
+                    than min_samples (by default, the selector's min_samples) of them
+           :rtype: float
+        """
+        min_samples = self.min_samples if min_samples is None else min_samples
+        with self._lock:
+            window = self._windows.get((geocoder_id, address_kind(address)))
+            if window is None or len(window.latencies) < max(min_samples, 1):
+                return None
+
+            return _quantile(sorted(window.latencies), q)
+
+    def should_skip(self, geocoder_id, address, timeout=None):
+        """Whether the geocoder is unlikely to contribute to the address' result, and so may be skipped"""
+        contribution = self.expected_contribution(geocoder_id, address, timeout)
+        return (
+            contribution is not None and contribution < self.min_contribution and
+            random.random() >= self.exploration
+        )
+
+    def stats(self):
+        """:return: {geocoder ID: {address kind: {statistic: value}}}"""
+        with self._lock:
+            stats = collections.defaultdict(dict)
+            for (geocoder_id, kind), window in self._windows.items():
+                latencies = sorted(window.latencies)
+                stats[geocoder_id][kind] = {
+                    "answers": len(window.located),
+                    "latency_p50": _quantile(latencies, 0.5),
+                    "latency_p95": _quantile(latencies, 0.95),
+                    "latency_p99": _quantile(latencies, 0.99),
+                    "null_rate": 1 - _rate(window.located) if window.located else None,
+                    "agreement_rate": _rate(window.agreed),
+                }
+
+            return dict(stats)
+
+    def _maybe_save(self):
+        if self.stats_file is not None and time.monotonic() - self._last_saved >= self.save_interval:
+            self.save()
+
+    def save(self):
+        """Writes the statistics to the stats file, atomically"""
+        if self.stats_file is None:
+            return
+
+        with self._lock:
+            self._last_saved = time.monotonic()
+            stats_data = {
+                "version": STATS_FILE_VERSION,
+                "windows": [
+                    {"geocoder": geocoder_id, "kind": kind, **window.to_dict()}
+                    for (geocoder_id, kind), window in self._windows.items()
+                ],
+            }
+
+        stats_dir = os.path.dirname(os.path.abspath(self.stats_file))
+        os.makedirs(stats_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=stats_dir, suffix=".tmp", delete=False) as temp_file:
+            json.dump(stats_data, temp_file)
+        os.replace(temp_file.name, self.stats_file)
+
+    def close(self):
+        """Saves the statistics, and stops saving them at exit - for once the selector has been replaced"""
+        if self.stats_file is None:
+            return
+
+        self.save()
+        stats_path = os.path.abspath(self.stats_file)
+        with _exit_savers_lock:
+            if _exit_savers.get(stats_path) is self:
+                _exit_savers[stats_path] = None
+
+    def load(self):
+        """Reads the statistics from the stats file, if there is one"""
+        if not os.path.exists(self.stats_file):
+            return
+
+        try:
+            with open(self.stats_file) as stats_file:
+                stats_data = json.load(stats_file)
+            assert stats_data["version"] == STATS_FILE_VERSION, f"unknown version '{stats_data['version']}'"
+
+            windows = {
+                (window_data["geocoder"], window_data["kind"]): _Window(
+                    self.window, window_data["latencies"], window_data["located"], window_data["agreed"]
+                )
+                for window_data in stats_data["windows"]
+            }
+        except (OSError, ValueError, KeyError, AssertionError) as e:
+            logging.warning(f"Couldn't load geocoder stats from '{self.stats_file}', starting afresh: "
+                            f"{e.__class__.__name__}: {e}")
+            return
+
+        with self._lock:
+            self._windows = windows
@@ -0,0 +1,114 @@
+import threading
+import time
+
+import requests
+import requests.adapters
+
+
+class _PooledAdapter(requests.adapters.HTTPAdapter):
+    """HTTP adapter that keeps count of the requests made, and of the connections opened, across its pools"""
+
+    def __init__(self, *args, **kwargs):
+        self._lock = threading.Lock()
+        self.closed_requests = 0
+        self.closed_connections = 0
+        super().__init__(*args, **kwargs)
+
+    def _pools(self):
+        pools = []
+        for pool_key in self.poolmanager.pools.keys():
+            try:
+                pools.append(self.poolmanager.pools[pool_key])
+            except KeyError:
+                pass  # evicted in the meantime
+
+        return pools
+
+    def counts(self):
+        """:return: (requests made, connections opened)"""
+        pools = self._pools()
+        with self._lock:
+            return (
+                self.closed_requests + sum(pool.num_requests for pool in pools),
+                self.closed_connections + sum(pool.num_connections for pool in pools),
+            )
+
+    def close(self):
+        pools = self._pools()
+        with self._lock:
+            self.closed_requests += sum(pool.num_requests for pool in pools)
+            self.closed_connections += sum(pool.num_connections for pool in pools)
+            super().close()
+
+
+class HttpSessionPool(object):
+    """Keep-alive HTTP connection pool, shared by the geocoders' outbound requests.
+
+    Offers the same request methods as a requests.Session, and is safe to use from many threads at once - each thread
+    gets its own session, but they all share one adapter, and so one set of connection pools. Once the pool has gone
+    unused for longer than idle_timeout, its connections are dropped, rather than risking reusing connections that the
+    servers have already closed.
+    """
+
+    def __init__(self, pool_connections=10, pool_size=32, idle_timeout=60, max_retries=0):
+        """
+        :param pool_connections: Number of hosts to keep connection pools for
+        :type pool_connections: int
+        :param pool_size: Number of connections kept open per host
+        :type pool_size: int
+        :param idle_timeout: Number of seconds unused after which the open connections are dropped
+        :type idle_timeout: float
+        :param max_retries: Number of times a failed connection is retried
+        :type max_retries: int
+        """
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+
+        self._adapter = _PooledAdapter(pool_connections=pool_connections, pool_maxsize=pool_size,
+                                       max_retries=max_retries)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._last_used = time.monotonic()
+        self.idle_resets = 0
+
+    def session(self):
+        """:return: The calling thread's session, which shares this pool's connections
+        :rtype: requests.Session
+        """
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            self._local.session = session
+
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_used > self.idle_timeout:
+                self._adapter.close()
+                self.idle_resets += 1
+            self._last_used = now
+
+        return session
+
+    def request(self, method, url, **kwargs):
+        return self.session().request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.session().get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.session().post(url, **kwargs)
+
+    def stats(self):
+        request_count, connection_count = self._adapter.counts()
+        return {
+            "requests": request_count,
+            "connections": connection_count,
+            "reused": max(0, request_count - connection_count),
+            "reuse_rate": max(0, request_count - connection_count) / request_count if request_count else None,
+            "idle_resets": self.idle_resets,
+        }
+
+    def close(self):
+        self._adapter.close()
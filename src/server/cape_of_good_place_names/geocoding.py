@@ -0,0 +1,417 @@
+import asyncio
+import concurrent.futures
+import pprint
+import time
+
+from flask import current_app, json
+from geocode_array import geocode_array
+
+from cape_of_good_place_names.geocoder_cache import lookup
+from cape_of_good_place_names.geocoder_upstream import AsyncGeocoderAdapter, GeocoderExecutorSaturated
+from cape_of_good_place_names.models.geocode_result import GeocodeResult
+from cape_of_good_place_names import util
+
+ENGINE_THREADED = "threaded"
+ENGINE_ASYNCIO = "asyncio"
+
+
+def get_geocoders(geocoders=None):
+    """:return: The configured geocoders, optionally restricted to those with the given IDs"""
+    return [
+        geocoder for geocoder in util.get_geocoders()
+        if (geocoders is None) or
+           (geocoders and geocoder.__class__.__name__ in geocoders)
+    ]
+
+
+def get_unknown_geocoders(geocoders):
+    """:return: The given geocoder IDs that aren't of any configured geocoder"""
+    configured_ids = {geocoder.__class__.__name__ for geocoder in util.get_geocoders()}
+    return [geocoder_id for geocoder_id in (geocoders or []) if geocoder_id not in configured_ids]
+
+
+def _geocode_and_cache(app, geocoder, cache_key, address, deadline=None):
+    with app.app_context():
+        return lookup.geocode_and_cache(geocoder, cache_key, address, deadline)
+
+
+def _get_timeout(geocoder):
+    return current_app.config["GEOCODER_TIMEOUTS"].get(
+        geocoder.__class__.__name__, current_app.config["GEOCODER_TIMEOUT"]
+    )
+
+
+def _agree(results, min_agreeing, dispersion_threshold):
+    """Whether at least min_agreeing of the results are within dispersion_threshold of each other"""
+    located_results = [
+        (gc.__class__.__name__, *result_tuple)
+        for gc, result_tuple in results.items()
+        if None not in result_tuple[:3]
+    ]
+    if len(located_results) < min_agreeing:
+        return False
+
+    combined_result = geocode_array.combine_geocode_results(located_results)
+    return (
+        combined_result is not None and None not in combined_result[:2] and
+        combined_result[2] <= dispersion_threshold and len(combined_result[-1]) >= min_agreeing
+    )
+
+
+def _has_quorum(results):
+    """Whether at least GEOCODE_QUORUM of the results agree, i.e. are within DISPERSION_THRESHOLD of each other"""
+    quorum = current_app.config["GEOCODE_QUORUM"]
+    if not quorum:
+        return False
+
+    return _agree(results, quorum, geocode_array.DISPERSION_THRESHOLD)
+
+
+def _cascade_agrees(results):
+    """Whether enough of the results agree for the geocoder cascade to stop, rather than moving on to the next tier"""
+    dispersion_threshold = current_app.config["GEOCODER_CASCADE_DISPERSION_THRESHOLD"]
+    return _agree(
+        results, current_app.config["GEOCODER_CASCADE_MIN_AGREEING"],
+        dispersion_threshold if dispersion_threshold is not None else geocode_array.DISPERSION_THRESHOLD
+    )
+
+
+def _get_tiers(geocoder_classes):
+    """Splits the geocoders into GEOCODER_TIERS, with any that aren't in a tier making up a final tier of their own
+
+    :return: List of lists of geocoders, in the order they are queried
+    """
+    tiers_config = current_app.config["GEOCODER_TIERS"]
+    if not tiers_config:
+        return [geocoder_classes] if geocoder_classes else []
+
+    tiers = [
+        [geocoder for geocoder in geocoder_classes if geocoder.__class__.__name__ in tier_geocoder_ids]
+        for tier_geocoder_ids in tiers_config
+    ]
+    tiered_geocoders = {geocoder for tier in tiers for geocoder in tier}
+    tiers.append([geocoder for geocoder in geocoder_classes if geocoder not in tiered_geocoders])
+
+    return [tier for tier in tiers if tier]
+
+
+def _geocode_uncached(app, address, cache_key, uncached_geocoders, results):
+    """Fans out to the geocoders on the shared geocoder executor, waiting for each until its timeout, or a quorum"""
+    metrics = util.get_metrics()
+
+    start = time.monotonic()
+    executor = util.get_geocoder_executor()
+    pending_futures = {}
+    deadlines = {}
+    for geocoder in uncached_geocoders:
+        deadline = start + _get_timeout(geocoder)
+        try:
+            future = executor.submit(_geocode_and_cache, app, geocoder, cache_key, address, deadline)
+        except GeocoderExecutorSaturated as e:
+            current_app.logger.warning(f"Not geocoding with {geocoder.__class__.__name__}: {e}")
+            metrics.inc("geocoder_executor_rejections_total", geocoder=geocoder.__class__.__name__)
+            continue
+        pending_futures[future] = geocoder
+        deadlines[future] = deadline
+
+    # Stragglers that aren't waited for still finish (and are cached) in the background, but don't wait for their
+    # geocoder's limits past their deadline
+    while pending_futures and not _has_quorum(results):
+        timeout = max(0, min(deadlines[future] for future in pending_futures) - time.monotonic())
+        done_futures, _ = concurrent.futures.wait(pending_futures, timeout=timeout,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done_futures:
+            results[pending_futures.pop(future)] = future.result()
+
+        now = time.monotonic()
+        for future in [future for future in pending_futures if deadlines[future] <= now]:
+            geocoder_id = pending_futures.pop(future).__class__.__name__
+            current_app.logger.warning(f"{geocoder_id} timed out after {now - start:.1f}s, leaving it out")
+            metrics.inc("geocoder_timeouts_total", geocoder=geocoder_id)
+
+    return len(pending_futures)
+
+
+async def _geocode_uncached_async(app, address, cache_key, uncached_geocoders, results):
+    """As _geocode_uncached, but fanning out on the geocode event loop, as one task per geocoder"""
+    with app.app_context():
+        metrics = util.get_metrics()
+        executor = util.get_geocoder_executor()
+        event_loop = util.get_geocode_event_loop()
+        timeouts = {geocoder: _get_timeout(geocoder) for geocoder in uncached_geocoders}
+
+    start = time.monotonic()
+    # Stragglers that aren't waited for still finish (and are cached) in the background, but don't wait for their
+    # geocoder's limits past their deadline
+    pending_tasks = {
+        event_loop.spawn(lookup.geocode_and_cache_async(app, AsyncGeocoderAdapter(geocoder, executor),
+                                                         cache_key, address, start + timeouts[geocoder])): geocoder
+        for geocoder in uncached_geocoders
+    }
+    deadlines = {task: start + timeouts[geocoder] for task, geocoder in pending_tasks.items()}
+
+    while pending_tasks:
+        with app.app_context():
+            if _has_quorum(results):
+                break
+
+        timeout = max(0, min(deadlines[task] for task in pending_tasks) - time.monotonic())
+        done_tasks, _ = await asyncio.wait(pending_tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        for task in done_tasks:
+            results[pending_tasks.pop(task)] = task.result()
+
+        now = time.monotonic()
+        for task in [task for task in pending_tasks if deadlines[task] <= now]:
+            geocoder_id = pending_tasks.pop(task).__class__.__name__
+            app.logger.warning(f"{geocoder_id} timed out after {now - start:.1f}s, leaving it out")
+            metrics.inc("geocoder_timeouts_total", geocoder=geocoder_id)
+
+    return len(pending_tasks)
+
+
+def _select_geocoders(address, geocoder_classes):
+    """Leaves out the geocoders that the geocoder selector expects not to contribute to the address' result, unless that
+    would leave none of them
+    """
+    selector = util.get_geocoder_selector()
+    selected_geocoders = [
+        geocoder for geocoder in geocoder_classes
+        if not selector.should_skip(geocoder.__class__.__name__, address, _get_timeout(geocoder))
+    ]
+    if not selected_geocoders:
+        return geocoder_classes
+
+    for geocoder in geocoder_classes:
+        if geocoder not in selected_geocoders:
+            current_app.logger.debug(f"Not expecting {geocoder.__class__.__name__} to contribute, skipping it")
+            util.get_metrics().inc("geocoder_selection_skips_total", geocoder=geocoder.__class__.__name__)
+
+    return selected_geocoders
+
+
+def _record_agreement(address, results, answered_geocoders):
+    """Records whether each of the geocoders that answered agreed with the combined result"""
+    located_results = [
+        (gc.__class__.__name__, *result_tuple)
+        for gc, result_tuple in results.items()
+        if None not in result_tuple[:3]
+    ]
+    if len(located_results) < 2:
+        return
+
+    combined_result = geocode_array.combine_geocode_results(located_results)
+    if combined_result is None or None in combined_result[:2]:
+        return
+
+    agreeing_geocoder_ids = (
+        set(combined_result[-1]) if combined_result[2] <= geocode_array.DISPERSION_THRESHOLD else set()
+    )
+    selector = util.get_geocoder_selector()
+    for geocoder in answered_geocoders:
+        if None not in results[geocoder][:3]:
+            selector.record_agreement(geocoder.__class__.__name__, address,
+                                      geocoder.__class__.__name__ in agreeing_geocoder_ids)
+
+
+def geocode_address(address, cache_key, geocoder_classes):
+    """Geocodes an address with each of the geocoders, using the cache where possible
+
+    Each geocoder is given GEOCODER_TIMEOUT seconds (or its GEOCODER_TIMEOUTS entry) to answer, and if GEOCODE_QUORUM
+    is set, the results are returned as soon as that many of them agree. Either way, the geocoders that haven't
+    answered yet are left out of the results, but their answers are still cached when they arrive.
+
+    The geocoders are fanned out to from the shared geocoder executor, or from the geocode event loop if GEOCODE_ENGINE
+    is asyncio. If GEOCODER_TIERS is set, they are queried a tier at a time, only moving on to the next tier while the
+    results don't agree, and the geocoders in the tiers that aren't reached are left out of the results. Geocoders that
+    the geocoder selector doesn't expect to contribute are left out too.
+
+    :return: {geocoder: result tuple}
+    """
+    results = dict(filter(lambda tup: tup[1], (
+        (geocoder, lookup.get_cached_result(geocoder, cache_key, address))
+        for geocoder in geocoder_classes
+    )))
+    # Only fanning out to the geocoders that missed the cache
+    uncached_geocoders = [
+        geocoder for geocoder in geocoder_classes
+        if geocoder not in results
+    ]
+    current_app.logger.debug(f"{len(results)} cache hit(s), {len(uncached_geocoders)} cache miss(es)")
+    uncached_geocoders = _select_geocoders(address, uncached_geocoders) if uncached_geocoders else uncached_geocoders
+
+    app = current_app._get_current_object()
+    metrics = util.get_metrics()
+    cascading = bool(current_app.config["GEOCODER_TIERS"])
+    tiers = [
+        [geocoder for geocoder in tier if geocoder in uncached_geocoders]
+        for tier in _get_tiers(geocoder_classes)
+    ]
+    for tier_number, tier_geocoders in enumerate(tiers):
+        # Cached results are free, so they count towards the cascade's agreement before any geocoders are queried
+        if cascading and _cascade_agrees(results):
+            skipped_geocoders = [geocoder for tier in tiers[tier_number:] for geocoder in tier]
+            current_app.logger.debug(f"Results agree, not escalating to {len(skipped_geocoders)} geocoder(s)")
+            for geocoder in skipped_geocoders:
+                metrics.inc("geocoder_cascade_skips_total", geocoder=geocoder.__class__.__name__)
+            break
+        elif cascading and tier_number:
+            current_app.logger.debug(f"Results don't agree, escalating to tier {tier_number}")
+            metrics.inc("geocode_cascade_escalations_total", tier=str(tier_number))
+
+        if not tier_geocoders:
+            continue
+        elif current_app.config["GEOCODE_ENGINE"] == ENGINE_ASYNCIO:
+            still_pending = util.get_geocode_event_loop().submit(
+                _geocode_uncached_async(app, address, cache_key, tier_geocoders, results)
+            ).result()
+        else:
+            still_pending = _geocode_uncached(app, address, cache_key, tier_geocoders, results)
+
+        if still_pending:
+            current_app.logger.debug(f"Quorum reached, not waiting for {still_pending} geocoder(s)")
+            metrics.inc("geocode_quorum_returns_total")
+
+    _record_agreement(address, results, [geocoder for geocoder in uncached_geocoders if geocoder in results])
+
+    # Keeping the geocoders' configured order
+    return {
+        geocoder: results.get(geocoder, (address, None, None, None))
+        for geocoder in geocoder_classes
+    }
+
+
+def iter_geocoded_addresses(addresses, geocoder_classes):
+    """Geocodes many addresses with each of the geocoders, using the cache where possible. The (address, geocoder)
+    pairs are run on the shared geocoder executor, roughly GEOCODE_BATCH_CONCURRENCY at a time.
+
+    Addresses are yielded as soon as all of their geocoders have returned, so not necessarily in order. Only a bounded
+    number of addresses are in flight at a time.
+
+    :param addresses: {cache key: address}
+
+    :return: Iterator of (cache key, {geocoder: result tuple})
+    """
+    app = current_app._get_current_object()
+    concurrency = current_app.config["GEOCODE_BATCH_CONCURRENCY"]
+    max_addresses_in_flight = 2 * concurrency
+
+    def _geocode_entry(geocoder, cache_key, address):
+        with app.app_context():
+            result = lookup.get_cached_result(geocoder, cache_key, address)
+            if result is not None:
+                return result
+
+        return _geocode_and_cache(app, geocoder, cache_key, address)
+
+    executor = util.get_geocoder_executor()
+    pending_addresses = iter(addresses.items())
+    pending_futures = {}
+    partial_results = {}
+    while True:
+        # Topping up the addresses in flight
+        while len(partial_results) < max_addresses_in_flight and len(pending_futures) < concurrency:
+            cache_key, address = next(pending_addresses, (None, None))
+            if cache_key is None:
+                break
+
+            partial_results[cache_key] = {}
+            for geocoder in geocoder_classes:
+                # Waiting for space in the executor's queue, rather than failing the batch's requests
+                future = executor.submit(_geocode_entry, geocoder, cache_key, address, block=True)
+                pending_futures[future] = (cache_key, geocoder)
+
+            if not geocoder_classes:
+                yield cache_key, partial_results.pop(cache_key)
+
+        if not pending_futures:
+            break
+
+        done_futures, _ = concurrent.futures.wait(pending_futures, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done_futures:
+            cache_key, geocoder = pending_futures.pop(future)
+            partial_results[cache_key][geocoder] = future.result()
+
+            if len(partial_results[cache_key]) == len(geocoder_classes):
+                # Keeping the geocoders' configured order
+                address_results = partial_results.pop(cache_key)
+                yield cache_key, {geocoder: address_results[geocoder] for geocoder in geocoder_classes}
+
+
+def format_results(combined_results, encode_values=True):
+    """Converts the geocoders' result tuples into GeocodeResults, and merges in a combined result
+
+    :param combined_results: {geocoder: result tuple}
+    :param encode_values: Whether the GeoJSON values are JSON encoded into strings, as the API did before v1.2. If not,
+                          they are left as objects, to be encoded once, along with the rest of the response, and no
+                          match is an empty FeatureCollection, rather than null.
+    :type encode_values: bool
+
+    :rtype: List[GeocodeResult]
+    """
+    geocoder_results = {
+        geocoder: (
+            {
+                "type": "FeatureCollection",
+                "features": [{
+                    "type": "Feature",
+                    "geometry": {
+                        "type": "Point",
+                        "coordinates": [result[2], result[1]]  # converting Geocoder (lat, long) -> GeoJSON Point (x, y)
+                    },
+                    "properties": {
+                        "address": result[0]
+                    }
+                }]
+            } if result[1] is not None
+            else None if encode_values
+            else {"type": "FeatureCollection", "features": []}
+        )
+        for geocoder, result in combined_results.items()
+    }
+    current_app.logger.debug("geocoder_results=\n'{pprint.pformat(geocoder_results)}'")
+
+    encode_value = json.dumps if encode_values else (lambda value: value)
+    response_results = [
+        GeocodeResult(geocoder.__class__.__name__, encode_value(geocoder_result),
+                      1 if combined_results[geocoder][1] is not None else 0)
+        for geocoder, geocoder_result in geocoder_results.items()
+    ]
+
+    # Merging in a combined result
+    combined_result = geocode_array.combine_geocode_results(
+        [
+            (gc.__class__.__name__, *result_tuple)
+            for gc, result_tuple in combined_results.items()
+            if None not in result_tuple[:3]
+        ]
+    )
+    current_app.logger.debug("combined_result=\n'{}'".format(pprint.pformat(combined_result)))
+
+    if combined_result and None not in combined_result[:2]:
+        current_app.logger.debug("Adding in combined_result")
+        combined_confidence = 1
+        combined_confidence -= (
+                (geocode_array.DISPERSION_THRESHOLD - combined_result[2]) /
+                geocode_array.DISPERSION_THRESHOLD
+        )
+
+        response_results += [
+            GeocodeResult("CombinedGeocoders",
+                          encode_value({
+                              "type": "FeatureCollection",
+                              "features": [{
+                                  "type": "Feature",
+                                  "geometry": {
+                                      "type": "Point",
+                                      "coordinates": [combined_result[1], combined_result[0]]
+                                  },
+                                  "properties": {
+                                      "geocoders": combined_result[-1]
+                                  }
+                              }]
+                          }), combined_confidence)
+        ]
+    else:
+        current_app.logger.warning("Combined result not merged in")
+
+    return response_results
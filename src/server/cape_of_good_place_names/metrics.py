@@ -0,0 +1,170 @@
+import bisect
+import collections
+import contextlib
+import threading
+import time
+
+# Upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram(object):
+    """Cumulative-bucket histogram of observed values, in the style of a Prometheus histogram"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimates a quantile by interpolating within the bucket that it falls into
+
+        :return: Estimated value, or None if nothing has been observed
+        """
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.bucket_counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0
+                if i == len(self.buckets):
+                    return lower  # can't interpolate into +Inf
+
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+
+        return self.buckets[-1]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip(list(map(str, self.buckets)) + ["+Inf"], self.bucket_counts)),
+        }
+
+
+class MetricsRegistry(object):
+    """In-process counters, gauges and histograms, each identified by a name and a set of labels.
+
+    Exported either as a JSON-friendly dictionary, or in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = collections.defaultdict(float)
+        self._gauges = {}
+        self._histograms = {}
+        self._help = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[self._key(name, labels)] += value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """Observes the time spent in the with block, in seconds"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start, **labels)
+
+    def get_counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def get_gauge(self, name, **labels):
+        with self._lock:
+            return self._gauges.get(self._key(name, labels))
+
+    def get_histogram(self, name, **labels):
+        """:return: Snapshot of the histogram, as a dict, or None if nothing has been observed"""
+        with self._lock:
+            histogram = self._histograms.get(self._key(name, labels))
+            return histogram.to_dict() if histogram is not None else None
+
+    def to_dict(self):
+        """:return: {metric name: [{"labels": {...}, "value": ...}, ...]}, histogram values are dicts"""
+        metrics = collections.defaultdict(list)
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                metrics[name].append({"labels": dict(labels), "value": value})
+            for (name, labels), value in self._gauges.items():
+                metrics[name].append({"labels": dict(labels), "value": value})
+            for (name, labels), histogram in self._histograms.items():
+                metrics[name].append({"labels": dict(labels), "value": histogram.to_dict()})
+
+        return dict(metrics)
+
+    @staticmethod
+    def _format_labels(labels, **extra_labels):
+        labels = (*labels, *extra_labels.items())
+        if not labels:
+            return ""
+
+        def _escape(value):
+            return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+        return "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in labels) + "}"
+
+    def to_prometheus(self):
+        """:return: Metrics in the Prometheus text exposition format"""
+        lines = []
+        written_headers = set()
+
+        def _header(name, metric_type):
+            if name in written_headers:
+                return
+            written_headers.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                _header(name, "counter")
+                lines.append(f"{name}{self._format_labels(labels)} {value}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                _header(name, "gauge")
+                lines.append(f"{name}{self._format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                _header(name, "histogram")
+                cumulative = 0
+                for upper_bound, bucket_count in zip((*histogram.buckets, "+Inf"), histogram.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{self._format_labels(labels, le=upper_bound)} {cumulative}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
@@ -4,8 +4,12 @@
 from __future__ import absolute_import
 # import models into model package
 from cape_of_good_place_names.models.error import Error
+from cape_of_good_place_names.models.geocode_batch_result import GeocodeBatchResult
+from cape_of_good_place_names.models.geocode_batch_results import GeocodeBatchResults
+from cape_of_good_place_names.models.geocode_job import GeocodeJob
 from cape_of_good_place_names.models.geocode_result import GeocodeResult
 from cape_of_good_place_names.models.geocode_results import GeocodeResults
+from cape_of_good_place_names.models.geocoder_status import GeocoderStatus
 from cape_of_good_place_names.models.geolookup_result import GeolookupResult
 from cape_of_good_place_names.models.geolookup_results import GeolookupResults
 from cape_of_good_place_names.models.scrub_result import ScrubResult
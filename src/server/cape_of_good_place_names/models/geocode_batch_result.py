@@ -0,0 +1,127 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+from datetime import date, datetime  # noqa: F401
+
+from typing import List, Dict  # noqa: F401
+
+from cape_of_good_place_names.models.base_model_ import Model
+from cape_of_good_place_names.models.geocode_result import GeocodeResult  # noqa: F401,E501
+from cape_of_good_place_names import util
+
+
+class GeocodeBatchResult(Model):
+    """NOTE: This class is auto generated by the swagger code generator program.
+
+    Do not edit the class manually.
+    """
+    def __init__(self, index: int=None, address: str=None, results: List[GeocodeResult]=None):  # noqa: E501
+        """GeocodeBatchResult - a model defined in Swagger
+
+        :param index: The index of this GeocodeBatchResult.  # noqa: E501
+        :type index: int
+        :param address: The address of this GeocodeBatchResult.  # noqa: E501
+        :type address: str
+        :param results: The results of this GeocodeBatchResult.  # noqa: E501
+        :type results: List[GeocodeResult]
+        """
+        self.swagger_types = {
+            'index': int,
+            'address': str,
+            'results': List[GeocodeResult]
+        }
+
+        self.attribute_map = {
+            'index': 'index',
+            'address': 'address',
+            'results': 'results'
+        }
+        self._index = index
+        self._address = address
+        self._results = results
+
+    @classmethod
+    def from_dict(cls, dikt) -> 'GeocodeBatchResult':
+        """Returns the dict as a model
+
+        :param dikt: A dict.
+        :type: dict
+        :return: The GeocodeBatchResult of this GeocodeBatchResult.  # noqa: E501
+        :rtype: GeocodeBatchResult
+        """
+        return util.deserialize_model(dikt, cls)
+
+    @property
+    def index(self) -> int:
+        """Gets the index of this GeocodeBatchResult.
+
+        Position of the address in the request's addresses  # noqa: E501
+
+        :return: The index of this GeocodeBatchResult.
+        :rtype: int
+        """
+        return self._index
+
+    @index.setter
+    def index(self, index: int):
+        """Sets the index of this GeocodeBatchResult.
+
+        Position of the address in the request's addresses  # noqa: E501
+
+        :param index: The index of this GeocodeBatchResult.
+        :type index: int
+        """
+        if index is None:
+            raise ValueError("Invalid value for `index`, must not be `None`")  # noqa: E501
+
+        self._index = index
+
+    @property
+    def address(self) -> str:
+        """Gets the address of this GeocodeBatchResult.
+
+        Address, as given in the request  # noqa: E501
+
+        :return: The address of this GeocodeBatchResult.
+        :rtype: str
+        """
+        return self._address
+
+    @address.setter
+    def address(self, address: str):
+        """Sets the address of this GeocodeBatchResult.
+
+        Address, as given in the request  # noqa: E501
+
+        :param address: The address of this GeocodeBatchResult.
+        :type address: str
+        """
+        if address is None:
+            raise ValueError("Invalid value for `address`, must not be `None`")  # noqa: E501
+
+        self._address = address
+
+    @property
+    def results(self) -> List[GeocodeResult]:
+        """Gets the results of this GeocodeBatchResult.
+
+        Array of Geocoding results for the address  # noqa: E501
+
+        :return: The results of this GeocodeBatchResult.
+        :rtype: List[GeocodeResult]
+        """
+        return self._results
+
+    @results.setter
+    def results(self, results: List[GeocodeResult]):
+        """Sets the results of this GeocodeBatchResult.
+
+        Array of Geocoding results for the address  # noqa: E501
+
+        :param results: The results of this GeocodeBatchResult.
+        :type results: List[GeocodeResult]
+        """
+        if results is None:
+            raise ValueError("Invalid value for `results`, must not be `None`")  # noqa: E501
+
+        self._results = results
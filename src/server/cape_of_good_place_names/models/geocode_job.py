@@ -0,0 +1,247 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+from datetime import date, datetime  # noqa: F401
+
+from typing import List, Dict  # noqa: F401
+
+from cape_of_good_place_names.models.base_model_ import Model
+from cape_of_good_place_names import util
+
+
+class GeocodeJob(Model):
+    """NOTE: This class is auto generated by the swagger code generator program.
+
+    Do not edit the class manually.
+    """
+    def __init__(self, job_id: str=None, status: str=None, total: int=None, completed: int=None,
+                 created: datetime=None, updated: datetime=None, error: str=None):  # noqa: E501
+        """GeocodeJob - a model defined in Swagger
+
+        :param job_id: The job_id of this GeocodeJob.  # noqa: E501
+        :type job_id: str
+        :param status: The status of this GeocodeJob.  # noqa: E501
+        :type status: str
+        :param total: The total of this GeocodeJob.  # noqa: E501
+        :type total: int
+        :param completed: The completed of this GeocodeJob.  # noqa: E501
+        :type completed: int
+        :param created: The created of this GeocodeJob.  # noqa: E501
+        :type created: datetime
+        :param updated: The updated of this GeocodeJob.  # noqa: E501
+        :type updated: datetime
+        :param error: The error of this GeocodeJob.  # noqa: E501
+        :type error: str
+        """
+        self.swagger_types = {
+            'job_id': str,
+            'status': str,
+            'total': int,
+            'completed': int,
+            'created': datetime,
+            'updated': datetime,
+            'error': str
+        }
+
+        self.attribute_map = {
+            'job_id': 'job_id',
+            'status': 'status',
+            'total': 'total',
+            'completed': 'completed',
+            'created': 'created',
+            'updated': 'updated',
+            'error': 'error'
+        }
+        self._job_id = job_id
+        self._status = status
+        self._total = total
+        self._completed = completed
+        self._created = created
+        self._updated = updated
+        self._error = error
+
+    @classmethod
+    def from_dict(cls, dikt) -> 'GeocodeJob':
+        """Returns the dict as a model
+
+        :param dikt: A dict.
+        :type: dict
+        :return: The GeocodeJob of this GeocodeJob.  # noqa: E501
+        :rtype: GeocodeJob
+        """
+        return util.deserialize_model(dikt, cls)
+
+    @property
+    def job_id(self) -> str:
+        """Gets the job_id of this GeocodeJob.
+
+        ID of the job, for fetching its status and results  # noqa: E501
+
+        :return: The job_id of this GeocodeJob.
+        :rtype: str
+        """
+        return self._job_id
+
+    @job_id.setter
+    def job_id(self, job_id: str):
+        """Sets the job_id of this GeocodeJob.
+
+        ID of the job, for fetching its status and results  # noqa: E501
+
+        :param job_id: The job_id of this GeocodeJob.
+        :type job_id: str
+        """
+        if job_id is None:
+            raise ValueError("Invalid value for `job_id`, must not be `None`")  # noqa: E501
+
+        self._job_id = job_id
+
+    @property
+    def status(self) -> str:
+        """Gets the status of this GeocodeJob.
+
+        One of queued, running, done or failed  # noqa: E501
+
+        :return: The status of this GeocodeJob.
+        :rtype: str
+        """
+        return self._status
+
+    @status.setter
+    def status(self, status: str):
+        """Sets the status of this GeocodeJob.
+
+        One of queued, running, done or failed  # noqa: E501
+
+        :param status: The status of this GeocodeJob.
+        :type status: str
+        """
+        allowed_values = ["queued", "running", "done", "failed"]  # noqa: E501
+        if status not in allowed_values:
+            raise ValueError(
+                "Invalid value for `status` ({0}), must be one of {1}"
+                .format(status, allowed_values)
+            )
+
+        self._status = status
+
+    @property
+    def total(self) -> int:
+        """Gets the total of this GeocodeJob.
+
+        Number of addresses in the job  # noqa: E501
+
+        :return: The total of this GeocodeJob.
+        :rtype: int
+        """
+        return self._total
+
+    @total.setter
+    def total(self, total: int):
+        """Sets the total of this GeocodeJob.
+
+        Number of addresses in the job  # noqa: E501
+
+        :param total: The total of this GeocodeJob.
+        :type total: int
+        """
+        if total is None:
+            raise ValueError("Invalid value for `total`, must not be `None`")  # noqa: E501
+
+        self._total = total
+
+    @property
+    def completed(self) -> int:
+        """Gets the completed of this GeocodeJob.
+
+        Number of addresses geocoded so far  # noqa: E501
+
+        :return: The completed of this GeocodeJob.
+        :rtype: int
+        """
+        return self._completed
+
+    @completed.setter
+    def completed(self, completed: int):
+        """Sets the completed of this GeocodeJob.
+
+        Number of addresses geocoded so far  # noqa: E501
+
+        :param completed: The completed of this GeocodeJob.
+        :type completed: int
+        """
+        if completed is None:
+            raise ValueError("Invalid value for `completed`, must not be `None`")  # noqa: E501
+
+        self._completed = completed
+
+    @property
+    def created(self) -> datetime:
+        """Gets the created of this GeocodeJob.
+
+        Server time the job was submitted  # noqa: E501
+
+        :return: The created of this GeocodeJob.
+        :rtype: datetime
+        """
+        return self._created
+
+    @created.setter
+    def created(self, created: datetime):
+        """Sets the created of this GeocodeJob.
+
+        Server time the job was submitted  # noqa: E501
+
+        :param created: The created of this GeocodeJob.
+        :type created: datetime
+        """
+        if created is None:
+            raise ValueError("Invalid value for `created`, must not be `None`")  # noqa: E501
+
+        self._created = created
+
+    @property
+    def updated(self) -> datetime:
+        """Gets the updated of this GeocodeJob.
+
+        Server time of the job's last progress  # noqa: E501
+
+        :return: The updated of this GeocodeJob.
+        :rtype: datetime
+        """
+        return self._updated
+
+    @updated.setter
+    def updated(self, updated: datetime):
+        """Sets the updated of this GeocodeJob.
+
+        Server time of the job's last progress  # noqa: E501
+
+        :param updated: The updated of this GeocodeJob.
+        :type updated: datetime
+        """
+
+        self._updated = updated
+
+    @property
+    def error(self) -> str:
+        """Gets the error of this GeocodeJob.
+
+        Reason the job failed, if it did  # noqa: E501
+
+        :return: The error of this GeocodeJob.
+        :rtype: str
+        """
+        return self._error
+
+    @error.setter
+    def error(self, error: str):
+        """Sets the error of this GeocodeJob.
+
+        Reason the job failed, if it did  # noqa: E501
+
+        :param error: The error of this GeocodeJob.
+        :type error: str
+        """
+
+        self._error = error
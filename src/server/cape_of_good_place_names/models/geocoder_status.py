@@ -0,0 +1,100 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+from datetime import date, datetime  # noqa: F401
+
+from typing import List, Dict  # noqa: F401
+
+from cape_of_good_place_names.models.base_model_ import Model
+from cape_of_good_place_names import util
+
+
+class GeocoderStatus(Model):
+    """NOTE: This class is auto generated by the swagger code generator program.
+
+    Do not edit the class manually.
+    """
+    def __init__(self, geocoder_id: str=None, circuit_state: str=None):  # noqa: E501
+        """GeocoderStatus - a model defined in Swagger
+
+        :param geocoder_id: The geocoder_id of this GeocoderStatus.  # noqa: E501
+        :type geocoder_id: str
+        :param circuit_state: The circuit_state of this GeocoderStatus.  # noqa: E501
+        :type circuit_state: str
+        """
+        self.swagger_types = {
+            'geocoder_id': str,
+            'circuit_state': str
+        }
+
+        self.attribute_map = {
+            'geocoder_id': 'geocoder_id',
+            'circuit_state': 'circuit_state'
+        }
+        self._geocoder_id = geocoder_id
+        self._circuit_state = circuit_state
+
+    @classmethod
+    def from_dict(cls, dikt) -> 'GeocoderStatus':
+        """Returns the dict as a model
+
+        :param dikt: A dict.
+        :type: dict
+        :return: The GeocoderStatus of this GeocoderStatus.  # noqa: E501
+        :rtype: GeocoderStatus
+        """
+        return util.deserialize_model(dikt, cls)
+
+    @property
+    def geocoder_id(self) -> str:
+        """Gets the geocoder_id of this GeocoderStatus.
+
+        Geocoder ID  # noqa: E501
+
+        :return: The geocoder_id of this GeocoderStatus.
+        :rtype: str
+        """
+        return self._geocoder_id
+
+    @geocoder_id.setter
+    def geocoder_id(self, geocoder_id: str):
+        """Sets the geocoder_id of this GeocoderStatus.
+
+        Geocoder ID  # noqa: E501
+
+        :param geocoder_id: The geocoder_id of this GeocoderStatus.
+        :type geocoder_id: str
+        """
+        if geocoder_id is None:
+            raise ValueError("Invalid value for `geocoder_id`, must not be `None`")  # noqa: E501
+
+        self._geocoder_id = geocoder_id
+
+    @property
+    def circuit_state(self) -> str:
+        """Gets the circuit_state of this GeocoderStatus.
+
+        State of the geocoder's circuit breaker - closed (in use), open (skipped, because it has been failing) or half_open (being probed)  # noqa: E501
+
+        :return: The circuit_state of this GeocoderStatus.
+        :rtype: str
+        """
+        return self._circuit_state
+
+    @circuit_state.setter
+    def circuit_state(self, circuit_state: str):
+        """Sets the circuit_state of this GeocoderStatus.
+
+        State of the geocoder's circuit breaker - closed (in use), open (skipped, because it has been failing) or half_open (being probed)  # noqa: E501
+
+        :param circuit_state: The circuit_state of this GeocoderStatus.
+        :type circuit_state: str
+        """
+        allowed_values = ["closed", "open", "half_open"]  # noqa: E501
+        if circuit_state not in allowed_values:
+            raise ValueError(
+                "Invalid value for `circuit_state` ({0}), must be one of {1}"
+                .format(circuit_state, allowed_values)
+            )
+
+        self._circuit_state = circuit_state
@@ -0,0 +1,167 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+import base64
+import json
+import tempfile
+
+from flask import current_app
+
+from cape_of_good_place_names import util
+from cape_of_good_place_names.test import BaseTestCase, test_geocode_controller
+
+
+class AdminTestConfig(test_geocode_controller.GeocoderTestConfig):
+    ADMIN_USERS = ["Bob"]
+
+
+class TestAdminController(BaseTestCase):
+    """AdminController integration tests"""
+
+    def setUp(self) -> None:
+        self.test_secret_key = "Bob"
+        self.test_secret_value = "your uncle"
+        self.test_secrets = {self.test_secret_key: self.test_secret_value}
+        self.test_user_secrets = {
+            '3d224707797b570fe4523f6ff4b9d68be72815d80c19530000919efad9e6cfe2':  # sha256("Bob" + "your uncle")
+                '037525e1e2b6f9f169c483caf4aba43bc50885fdb9a2efe023635cd9534999ab'
+            # sha256("your uncle" + "your uncle")
+        }
+
+        cred_string = f"{self.test_secret_key}:{self.test_secret_value}"
+        credentials = base64.b64encode(cred_string.encode('utf-8')).decode('utf-8')
+        self.authorisation_headers = {"Authorization": "Basic {}".format(credentials)}
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        AdminTestConfig.GEOCODER_CACHE_DIR = self.tempdir.name
+        test_geocode_controller.MockGeocoder.CALL_COUNT = 0
+
+        current_app.config.from_object(AdminTestConfig)
+        util.flush_caches()
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def _geocode(self, address):
+        response = self.client.open(
+            '/v1/geocode',
+            method='GET',
+            query_string=[('address', address)],
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+
+    def test_metrics(self):
+        """Tests that the cache statistics are reported per geocoder
+
+        """
+        self._geocode("12 Long Street")
+        self._geocode("12 Long St")
+        self._geocode("1 Loop Street")
+
+        response = self.client.open(
+            '/v1.1/admin/metrics',
+            method='GET',
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+
+        data_dict = json.loads(response.data)
+        geocoder_stats = data_dict["geocoder_cache"]["geocoders"]["MockGeocoder"]
+        self.assertEqual(geocoder_stats["hits"], 1, "Cache hits not counted")
+        self.assertEqual(geocoder_stats["memory_hits"], 1, "Memory cache hits not counted")
+        self.assertEqual(geocoder_stats["misses"], 2, "Cache misses not counted")
+        self.assertEqual(geocoder_stats["stale_hits"], 0, "Stale cache hits miscounted")
+        self.assertEqual(geocoder_stats["entries"], 2, "Cache entries not counted")
+        self.assertGreater(geocoder_stats["bytes"], 0, "Cache size not reported")
+        self.assertEqual(geocoder_stats["write_latency"]["count"], 2, "Cache write latency not recorded")
+        self.assertEqual(geocoder_stats["backend_read_latency"]["count"], 2, "Cache read latency not recorded")
+
+        # Prometheus format
+        response = self.client.open(
+            '/v1.1/admin/metrics',
+            method='GET',
+            query_string=[('output', 'prometheus')],
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        self.assertIn("text/plain", response.content_type, "Prometheus format not being returned")
+        self.assertIn(
+            'geocoder_cache_lookups_total{geocoder="MockGeocoder",outcome="miss",tier="none"} 2',
+            response.data.decode(), "Cache misses not exported"
+        )
+        self.assertIn('geocoder_cache_entries{geocoder="MockGeocoder"} 2', response.data.decode(),
+                      "Cache entries not exported")
+
+    def test_metrics_cache_usage_interval(self):
+        """Tests that the cache's size isn't worked out more often than the usage interval allows
+
+        """
+        tc = AdminTestConfig()
+        tc.GEOCODER_CACHE_USAGE_INTERVAL = 3600
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        def _cache_entries():
+            response = self.client.open(
+                '/v1.1/admin/metrics',
+                method='GET',
+                headers=self.authorisation_headers
+            )
+            self.assert200(response,
+                           'Response body is : ' + response.data.decode('utf-8'))
+            return json.loads(response.data)["geocoder_cache"]["geocoders"]["MockGeocoder"]["entries"]
+
+        self._geocode("12 Long Street")
+        self.assertEqual(_cache_entries(), 1)
+        self._geocode("1 Loop Street")
+        self.assertEqual(_cache_entries(), 1, "Cache usage worked out again within the interval")
+
+        # A new cache backend gets a fresh look
+        util.flush_caches()
+        self.assertEqual(_cache_entries(), 2, "Cache usage not worked out for the new cache backend")
+
+    def test_metrics_admin_only(self):
+        """Tests that only admin users can see the metrics, in secure mode
+
+        """
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".json") as temp_secrets_file, \
+                tempfile.NamedTemporaryFile(mode="w", suffix=".json") as temp_user_secrets_file:
+            json.dump(self.test_secrets, temp_secrets_file)
+            temp_secrets_file.flush()
+            json.dump(self.test_user_secrets, temp_user_secrets_file)
+            temp_user_secrets_file.flush()
+
+            tc = AdminTestConfig()
+            tc.SECRETS_FILE = temp_secrets_file.name
+            tc.USER_SECRETS_FILE = temp_user_secrets_file.name
+            tc.USER_SECRETS_SALT_KEY = self.test_secret_key
+            current_app.config.from_object(tc)
+            util.flush_caches()
+
+            response = self.client.open(
+                '/v1.1/admin/metrics',
+                method='GET',
+                headers=self.authorisation_headers
+            )
+            self.assert200(response,
+                           'Response body is : ' + response.data.decode('utf-8'))
+
+            tc.ADMIN_USERS = []
+            current_app.config.from_object(tc)
+            response = self.client.open(
+                '/v1.1/admin/metrics',
+                method='GET',
+                headers=self.authorisation_headers
+            )
+            self.assert403(response,
+                           'Response body is : ' + response.data.decode('utf-8'))
+
+
+if __name__ == '__main__':
+    import unittest
+
+    unittest.main()
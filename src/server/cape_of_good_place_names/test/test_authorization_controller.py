@@ -9,6 +9,8 @@ from geocode_array.Geocoder import Geocoder
 from six import BytesIO
 
 from cape_of_good_place_names import util
+from cape_of_good_place_names.config import config
+from cape_of_good_place_names.geocoder_cache import FileCacheBackend
 from cape_of_good_place_names.models.error import Error  # noqa: E501
 from cape_of_good_place_names.models.geocode_results import GeocodeResults  # noqa: E501
 from cape_of_good_place_names.test import BaseTestCase
@@ -18,6 +20,10 @@ class AuthorizationTestConfig(object):
     TIMEZONE = "Africa/Johannesburg"
     GEOCODERS = []
     GEOCODERS_MIN = 0
+    GEOCODER_CACHE_DIR = tempfile.gettempdir()
+    GEOCODER_CACHE_BACKEND = (
+        FileCacheBackend, {"cache_dir": [config.ConfigNamespace.CONFIG, "GEOCODER_CACHE_DIR"]}
+    )
     SCRUBBERS = []
     SCRUBBERS_MIN = 0
     USER_SECRETS_FILE = ""
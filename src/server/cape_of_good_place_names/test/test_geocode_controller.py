@@ -1,9 +1,13 @@
 # coding: utf-8
 
 from __future__ import absolute_import
+import asyncio
 import base64
 import os
+import pickle
 import tempfile
+import threading
+import time
 
 from flask import json, current_app
 from geocode_array.Geocoder import Geocoder
@@ -11,6 +15,10 @@ from six import BytesIO
 
 from cape_of_good_place_names import util
 from cape_of_good_place_names.config import config
+from cape_of_good_place_names.geocode_jobs import JobStore, runner
+from cape_of_good_place_names.geocoder_cache import FileCacheBackend, MemoryCache, SqliteCacheBackend, lookup, warm
+from cape_of_good_place_names.geocoder_upstream import GeocoderCircuitBreaker, GeocoderHedger, GeocoderLimiter, \
+    GeocoderSelector, selection
 from cape_of_good_place_names.models.error import Error  # noqa: E501
 from cape_of_good_place_names.models.geocode_results import GeocodeResults  # noqa: E501
 from cape_of_good_place_names.test import BaseTestCase
@@ -19,20 +27,60 @@ from cape_of_good_place_names.test import BaseTestCase
 class MockGeocoder(Geocoder):
     X = 0.0001
     Y = 0.000
+    CALL_COUNT = 0
+
     def geocode(self, address_string, *extra_args) -> (float, float) or None:
+        MockGeocoder.CALL_COUNT += 1
         return address_string, self.X, self.Y, None
 
 
 class MockGeocoder2(Geocoder):
+    CALL_COUNT = 0
+
     def geocode(self, address_string, *extra_args) -> (float, float) or None:
+        MockGeocoder2.CALL_COUNT += 1
         return address_string, 0.0001, 0.0001, None
 
 
 class BadMockGeocoder(Geocoder):
+    CALL_COUNT = 0
+
     def geocode(self, address_string, *extra_args) -> (float, float) or None:
+        BadMockGeocoder.CALL_COUNT += 1
         return address_string, None, "", None
 
 
+class ErrorMockGeocoder(Geocoder):
+    CALL_COUNT = 0
+
+    def geocode(self, address_string, *extra_args) -> (float, float) or None:
+        ErrorMockGeocoder.CALL_COUNT += 1
+        return None
+
+
+class SlowMockGeocoder(Geocoder):
+    DELAY = 0.5
+    CALL_COUNT = 0
+
+    def geocode(self, address_string, *extra_args) -> (float, float) or None:
+        SlowMockGeocoder.CALL_COUNT += 1
+        time.sleep(self.DELAY)
+        return address_string, 0.0001, 0.0002, None
+
+
+class AsyncMockGeocoder(Geocoder):
+    DELAY = 0.05
+    CALL_COUNT = 0
+
+    def geocode(self, address_string, *extra_args) -> (float, float) or None:
+        raise AssertionError("Blocking geocode called for a natively async geocoder")
+
+    async def geocode_async(self, address_string):
+        AsyncMockGeocoder.CALL_COUNT += 1
+        await asyncio.sleep(self.DELAY)
+        return address_string, 0.0001, 0.0001, None
+
+
 class GeocoderTestConfig:
     TIMEZONE = "Africa/Johannesburg"
     GEOCODERS = [
@@ -42,7 +90,34 @@ class GeocoderTestConfig:
     ]
     GEOCODER_CACHE_DIR = None
     GEOCODER_CACHE_AGE_THRESHOLD = 1000
+    GEOCODER_NEGATIVE_CACHE_AGE_THRESHOLD = 1000
+    GEOCODER_NEGATIVE_CACHE_AGE_THRESHOLDS = {}
+    GEOCODER_CACHE_NORMALISE_KEYS = True
+    GEOCODER_CACHE_STALE_GRACE_PERIOD = 0
+    GEOCODER_CACHE_USAGE_INTERVAL = 0
+    GEOCODER_CACHE_BACKEND = (
+        FileCacheBackend, {"cache_dir": [config.ConfigNamespace.CONFIG, "GEOCODER_CACHE_DIR"]}
+    )
+    GEOCODER_MEMORY_CACHE = (
+        MemoryCache, {"ttl": [config.ConfigNamespace.CONFIG, "GEOCODER_CACHE_AGE_THRESHOLD"]}
+    )
     GEOCODERS_MIN = 1
+    GEOCODE_ENGINE = "threaded"
+    GEOCODER_TIMEOUT = 10
+    GEOCODER_TIMEOUTS = {}
+    GEOCODE_QUORUM = None
+    GEOCODER_TIERS = None
+    GEOCODER_CASCADE_MIN_AGREEING = 2
+    GEOCODER_CASCADE_DISPERSION_THRESHOLD = None
+    GEOCODER_HEDGE_QUANTILE = 0.95
+    GEOCODER_HEDGE_MIN_SAMPLES = 20
+    GEOCODE_BATCH_MAX_ADDRESSES = 10
+    GEOCODE_BATCH_STREAM_MAX_ADDRESSES = 100
+    GEOCODE_BATCH_CONCURRENCY = 4
+    GEOCODE_JOBS_MAX_ADDRESSES = 100
+    GEOCODE_JOB_STORE = (
+        JobStore, {"jobs_dir": [config.ConfigNamespace.CONFIG, "GEOCODER_CACHE_DIR"]}
+    )
     USER_SECRETS_FILE = ""
     USER_SECRETS_SALT_KEY = ""
     SCRUBBERS = []
@@ -60,10 +135,19 @@ class TestGeocodeController(BaseTestCase):
         self.tempdir = tempfile.TemporaryDirectory()
         GeocoderTestConfig.GEOCODER_CACHE_DIR = self.tempdir.name
 
-        for gc in [MockGeocoder, MockGeocoder2, BadMockGeocoder]:
+        for gc in [MockGeocoder, MockGeocoder2, BadMockGeocoder, ErrorMockGeocoder, SlowMockGeocoder,
+                   AsyncMockGeocoder]:
             gc_cache_path = os.path.join(self.tempdir.name, gc.__name__)
             os.mkdir(gc_cache_path)
 
+        # Resetting the mock geocoders' state
+        MockGeocoder.X, MockGeocoder.Y = 0.0001, 0.000
+        MockGeocoder.CALL_COUNT = 0
+        MockGeocoder2.CALL_COUNT = 0
+        BadMockGeocoder.CALL_COUNT = 0
+        ErrorMockGeocoder.CALL_COUNT = 0
+        SlowMockGeocoder.CALL_COUNT = 0
+
     def tearDown(self) -> None:
         self.tempdir.cleanup()
 
@@ -159,6 +243,47 @@ class TestGeocodeController(BaseTestCase):
             cache_files = os.listdir(cache_path)
             self.assertEqual(len(cache_files), 1, "Cache result file not getting created as expected!")
 
+    def test_geocode_v1_2(self):
+        """Testing that v1.2 returns the geocoded values as GeoJSON objects, rather than JSON encoded strings
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+            (
+                BadMockGeocoder, {}
+            ),
+        ]
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        response = self.client.open(
+            '/v1.2/geocode',
+            method='GET',
+            query_string=[('address', 'address_example')],
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+
+        result, bad_result, combined_result = json.loads(response.data)["results"]
+        self.assertDictEqual(
+            {"features": [
+                {"geometry": {"coordinates": [0.000, 0.0001], "type": "Point"},
+                 "properties": {"address": "address_example"}, "type": "Feature"}],
+                "type": "FeatureCollection"},
+            result["geocoded_value"],
+            "Geocoded value not returned as an object"
+        )
+        self.assertDictEqual({"features": [], "type": "FeatureCollection"}, bad_result["geocoded_value"],
+                             "No match not returned as an empty FeatureCollection")
+        self.assertEqual(bad_result["confidence"], 0, "No match returned with confidence")
+        self.assertEqual(combined_result["geocoder_id"], "CombinedGeocoders")
+        self.assertListEqual(combined_result["geocoded_value"]["features"][0]["properties"]["geocoders"],
+                             ["MockGeocoder"], "Combined geocoded value not returned as an object")
+
     def test_geocode_cache(self):
         """Tests that geocode cache is being used
 
@@ -207,7 +332,198 @@ class TestGeocodeController(BaseTestCase):
         result_dict2 = json.loads(result["geocoded_value"])
         self.assertDictEqual(result_dict, result_dict2, "Second read not getting cached value!")
 
+        # Earlier versions could leave pickled Nones in the cache, which are misses
+        cache_path = util.get_geocoder_cache()._get_cache_path(
+            MockGeocoder.__name__, lookup.get_cache_key("other_address_example")
+        )
+        with open(cache_path, "wb") as cache_file:
+            pickle.dump(None, cache_file)
+        response = self.client.open(
+            '/v1/geocode',
+            method='GET',
+            query_string=[('address', 'other_address_example')],
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        result, *_ = json.loads(response.data)["results"]
+        self.assertEqual(result["confidence"], 1, "Pickled None not treated as a miss")
+
+    def test_geocode_cache_skips_upstream(self):
+        """Tests that geocoders with cached results are not called upstream
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+            (
+                MockGeocoder2, {}
+            ),
+        ]
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        # Cold cache - every geocoder is called once
+        query_string = [('address', 'address_example')]
+        response = self.client.open(
+            '/v1/geocode',
+            method='GET',
+            query_string=query_string,
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(MockGeocoder.CALL_COUNT, 1, "Cold cache not calling geocoder")
+        self.assertEqual(MockGeocoder2.CALL_COUNT, 1, "Cold cache not calling geocoder")
+
+        # Warm cache - no geocoder is called
+        response = self.client.open(
+            '/v1/geocode',
+            method='GET',
+            query_string=query_string,
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(MockGeocoder.CALL_COUNT, 1, "Fully cached request is calling geocoder upstream!")
+        self.assertEqual(MockGeocoder2.CALL_COUNT, 1, "Fully cached request is calling geocoder upstream!")
+
+        data_dict = json.loads(response.data)
+        self.assertEqual(3, len(data_dict["results"]), "Cached results not being returned")
+
+        # Partially warm cache - only the geocoder that missed is called
+        util.get_geocoder_cache().delete(MockGeocoder2.__name__, 'address example')
+        util.get_geocoder_memory_cache().delete(MockGeocoder2.__name__, 'address example')
+
+        response = self.client.open(
+            '/v1/geocode',
+            method='GET',
+            query_string=query_string,
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(MockGeocoder.CALL_COUNT, 1, "Cached geocoder is being called upstream!")
+        self.assertEqual(MockGeocoder2.CALL_COUNT, 2, "Uncached geocoder not being called")
+
+    def test_geocode_sqlite_cache(self):
+        """Tests that the geocode cache works with the single file SQLite backend
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+        ]
+        tc.GEOCODER_CACHE_BACKEND = (
+            SqliteCacheBackend, {"cache_dir": [config.ConfigNamespace.CONFIG, "GEOCODER_CACHE_DIR"]}
+        )
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        query_string = [('address', 'address_example')]
+        for _ in range(2):
+            # Going to the SQLite store every time
+            util.get_geocoder_memory_cache().clear()
+            response = self.client.open(
+                '/v1/geocode',
+                method='GET',
+                query_string=query_string,
+                headers=self.authorisation_headers
+            )
+            self.assert200(response,
+                           'Response body is : ' + response.data.decode('utf-8'))
+
+        self.assertEqual(MockGeocoder.CALL_COUNT, 1, "SQLite cache not being used")
+        self.assertTrue(os.path.exists(os.path.join(self.tempdir.name, SqliteCacheBackend.DB_FILENAME)),
+                        "SQLite cache file not getting created as expected!")
+        self.assertEqual(len(os.listdir(os.path.join(self.tempdir.name, MockGeocoder.__name__))), 0,
+                         "Pickle cache files being created by the SQLite backend!")
+
+    def test_geocode_memory_cache(self):
+        """Tests that the memory cache is consulted before the cache backend
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+        ]
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        query_string = [('address', 'address_example')]
+        for _ in range(3):
+            response = self.client.open(
+                '/v1/geocode',
+                method='GET',
+                query_string=query_string,
+                headers=self.authorisation_headers
+            )
+            self.assert200(response,
+                           'Response body is : ' + response.data.decode('utf-8'))
+
+        memory_cache_stats = util.get_geocoder_memory_cache().stats()
+        self.assertEqual(memory_cache_stats["entries"], 1, "Memory cache not getting populated")
+        self.assertEqual(memory_cache_stats["hits"], 2, "Memory cache not being used")
 
+        # Removing the backend's entry - the memory cache should still serve it
+        util.get_geocoder_cache().delete(MockGeocoder.__name__, 'address example')
+        response = self.client.open(
+            '/v1/geocode',
+            method='GET',
+            query_string=query_string,
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(MockGeocoder.CALL_COUNT, 1, "Memory cache not consulted before the backend")
+
+    def test_geocode_cache_normalised_keys(self):
+        """Tests that differently written versions of the same address share a cache entry
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+        ]
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        for address in ("12 Long Rd, Cape Town", "12  long road cape town", "12 LONG RD., CAPE TOWN"):
+            response = self.client.open(
+                '/v1/geocode',
+                method='GET',
+                query_string=[('address', address)],
+                headers=self.authorisation_headers
+            )
+            self.assert200(response,
+                           'Response body is : ' + response.data.decode('utf-8'))
+
+        self.assertEqual(MockGeocoder.CALL_COUNT, 1, "Equivalent addresses not sharing a cache entry")
+        self.assertIsNotNone(util.get_geocoder_cache().get(MockGeocoder.__name__, "12 long road cape town"),
+                             "Cache entry not stored under the normalised address")
+
+        # Switching off normalisation
+        tc.GEOCODER_CACHE_NORMALISE_KEYS = False
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        response = self.client.open(
+            '/v1/geocode',
+            method='GET',
+            query_string=[('address', "12 Long Rd, Cape Town")],
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(MockGeocoder.CALL_COUNT, 2, "Cache keys being normalised despite being switched off")
 
     def test_combined_geocode(self):
         """Testing that combined geocode result is blended into results
@@ -349,6 +665,879 @@ class TestGeocodeController(BaseTestCase):
             "Combined geocoded value not excluding bad geocoder properly"
         )
 
+    def test_negative_cache(self):
+        """Testing that no match results are cached with their own threshold, and that failures aren't cached
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+            (
+                BadMockGeocoder, {}
+            ),
+            (
+                ErrorMockGeocoder, {}
+            ),
+        ]
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        query_string = [('address', 'address_example')]
+        for _ in range(2):
+            response = self.client.open(
+                '/v1/geocode',
+                method='GET',
+                query_string=query_string,
+                headers=self.authorisation_headers
+            )
+            self.assert200(response,
+                           'Response body is : ' + response.data.decode('utf-8'))
+
+        self.assertEqual(BadMockGeocoder.CALL_COUNT, 1, "No match result not being cached")
+        self.assertEqual(ErrorMockGeocoder.CALL_COUNT, 2, "Failed geocode being cached")
+        self.assertIsNone(util.get_geocoder_cache().get(ErrorMockGeocoder.__name__, 'address example'),
+                          "Failed geocode written to the cache")
+
+        data_dict = json.loads(response.data)
+        results = data_dict["results"]
+        self.assertEqual(4, len(results), "Geocoder is not returning the expected number of test results")
+        _, bad_result, error_result, _ = results
+        self.assertIsNone(json.loads(bad_result["geocoded_value"]), "No match geocoder not returning a null result")
+        self.assertIsNone(json.loads(error_result["geocoded_value"]), "Failed geocoder not returning a null result")
+
+        # Expiring the no match entries for the bad geocoder only
+        tc.GEOCODER_NEGATIVE_CACHE_AGE_THRESHOLDS = {BadMockGeocoder.__name__: 0}
+        current_app.config.from_object(tc)
+
+        response = self.client.open(
+            '/v1/geocode',
+            method='GET',
+            query_string=query_string,
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(BadMockGeocoder.CALL_COUNT, 2, "No match threshold not applied per geocoder")
+        self.assertEqual(MockGeocoder.CALL_COUNT, 1, "No match threshold applied to matched results")
+
+    def test_stale_while_revalidate(self):
+        """Testing that stale results are returned straight away, and refreshed in the background
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+        ]
+        tc.GEOCODER_CACHE_AGE_THRESHOLD = 0
+        tc.GEOCODER_CACHE_STALE_GRACE_PERIOD = 1000
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        def _geocode():
+            response = self.client.open(
+                '/v1/geocode',
+                method='GET',
+                query_string=[('address', 'address_example')],
+                headers=self.authorisation_headers
+            )
+            self.assert200(response,
+                           'Response body is : ' + response.data.decode('utf-8'))
+
+            result, *_ = json.loads(response.data)["results"]
+            return json.loads(result["geocoded_value"])["features"][0]["geometry"]["coordinates"]
+
+        self.assertListEqual(_geocode(), [0.0, 0.0001], "Geocoded value not mapped through correctly")
+        self.assertEqual(MockGeocoder.CALL_COUNT, 1, "Cold cache not calling geocoder")
+
+        # The entry is now stale, so it should be returned, and refreshed in the background
+        MockGeocoder.X = 5
+        MockGeocoder.Y = 10
+        self.assertListEqual(_geocode(), [0.0, 0.0001], "Stale value not being returned")
+
+        util.get_geocoder_cache_refresher().wait()
+        self.assertEqual(MockGeocoder.CALL_COUNT, 2, "Stale value not being refreshed")
+        self.assertListEqual(_geocode(), [10, 5], "Refreshed value not being returned")
+
+        # Outside of the grace period, the request waits for the geocoder
+        tc.GEOCODER_CACHE_STALE_GRACE_PERIOD = 0
+        current_app.config.from_object(tc)
+        util.get_geocoder_cache_refresher().wait()
+        MockGeocoder.X = 0.0001
+        MockGeocoder.Y = 0.000
+        self.assertListEqual(_geocode(), [0.0, 0.0001], "Expired value being returned")
+
+    def test_geocode_batch(self):
+        """Testing that a batch of addresses is deduplicated, and the results returned per input address
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+            (
+                MockGeocoder2, {}
+            ),
+        ]
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        addresses = ["12 Long St", "1 Loop Street", "12 LONG STREET"]
+        response = self.client.open(
+            '/v1.1/geocode/batch',
+            method='POST',
+            json={"addresses": addresses},
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+
+        data_dict = json.loads(response.data)
+        results = data_dict["results"]
+        self.assertListEqual([result["index"] for result in results], [0, 1, 2], "Results not keyed by input index")
+        self.assertListEqual([result["address"] for result in results], addresses, "Input addresses not returned")
+        self.assertEqual(MockGeocoder.CALL_COUNT, 2, "Duplicate addresses not being deduplicated")
+        self.assertEqual(MockGeocoder2.CALL_COUNT, 2, "Duplicate addresses not being deduplicated")
+
+        for result in results:
+            self.assertListEqual([geocode_result["geocoder_id"] for geocode_result in result["results"]],
+                                 ["MockGeocoder", "MockGeocoder2", "CombinedGeocoders"],
+                                 "Geocoder results not returned for each address")
+        self.assertEqual(results[0]["results"], results[2]["results"], "Duplicate addresses have different results")
+
+        # Cached results should be used, and the geocoders filter applied
+        response = self.client.open(
+            '/v1.1/geocode/batch',
+            method='POST',
+            json={"addresses": ["1 Loop St"], "geocoders": ["MockGeocoder"]},
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        result, = json.loads(response.data)["results"]
+        self.assertListEqual([geocode_result["geocoder_id"] for geocode_result in result["results"]],
+                             ["MockGeocoder", "CombinedGeocoders"], "Geocoders filter not applied")
+        self.assertEqual(MockGeocoder.CALL_COUNT, 2, "Batch not using the cache")
+
+        # Batch size limit
+        response = self.client.open(
+            '/v1.1/geocode/batch',
+            method='POST',
+            json={"addresses": ["12 Long Street"] * (tc.GEOCODE_BATCH_MAX_ADDRESSES + 1)},
+            headers=self.authorisation_headers
+        )
+        self.assert400(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+
+        # Unknown geocoders
+        call_count = MockGeocoder.CALL_COUNT
+        response = self.client.open(
+            '/v1.1/geocode/batch',
+            method='POST',
+            json={"addresses": ["2 Loop St"], "geocoders": ["MockGeocoder", "NotAGeocoder"]},
+            headers=self.authorisation_headers
+        )
+        self.assert400(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        self.assertIn("NotAGeocoder", response.json["message"], "Unknown geocoder not reported")
+        self.assertEqual(MockGeocoder.CALL_COUNT, call_count, "Batch with unknown geocoders geocoded")
+
+    def test_geocode_batch_stream(self):
+        """Testing that batch results are streamed back as newline delimited JSON
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+            (
+                MockGeocoder2, {}
+            ),
+        ]
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        addresses = [f"{number} Long Street" for number in range(tc.GEOCODE_BATCH_MAX_ADDRESSES + 5)]
+        addresses += ["1 LONG ST"]
+        response = self.client.open(
+            '/v1.1/geocode/batch',
+            method='POST',
+            json={"addresses": addresses},
+            headers={**self.authorisation_headers, "Accept": "application/x-ndjson"}
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(response.mimetype, "application/x-ndjson", "Batch results not being streamed")
+
+        results = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertListEqual(sorted(result["index"] for result in results), list(range(len(addresses))),
+                             "Not every address' results being streamed")
+        self.assertEqual(MockGeocoder.CALL_COUNT, len(addresses) - 1, "Duplicate addresses not being deduplicated")
+
+        results_by_index = {result["index"]: result for result in results}
+        self.assertEqual(results_by_index[len(addresses) - 1]["address"], "1 LONG ST", "Input address not returned")
+        self.assertEqual(results_by_index[len(addresses) - 1]["results"], results_by_index[1]["results"],
+                         "Duplicate addresses have different results")
+        self.assertListEqual([geocode_result["geocoder_id"] for geocode_result in results_by_index[0]["results"]],
+                             ["MockGeocoder", "MockGeocoder2", "CombinedGeocoders"],
+                             "Geocoder results not returned for each address")
+
+        # Unknown geocoders are reported before anything is streamed
+        response = self.client.open(
+            '/v1.1/geocode/batch',
+            method='POST',
+            json={"addresses": addresses, "geocoders": ["NotAGeocoder"]},
+            headers={**self.authorisation_headers, "Accept": "application/x-ndjson"}
+        )
+        self.assert400(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        self.assertIn("NotAGeocoder", response.json["message"], "Unknown geocoder not reported")
+
+    def test_warm_cache(self):
+        """Testing that warming the cache writes through to the same cache used by the geocode endpoint, and resumes
+        from its checkpoint
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+            (
+                MockGeocoder2, {}
+            ),
+        ]
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        input_path = os.path.join(self.tempdir.name, "addresses.csv")
+        checkpoint_path = input_path + ".checkpoint"
+        with open(input_path, "w") as input_file:
+            input_file.write("id,address\n1,12 Long St\n2,\n3,1 Loop Street\n4,12 long street\n")
+
+        def _warm():
+            with open(input_path, newline="") as input_file:
+                return warm.warm_cache(self.app, warm.read_addresses(input_file), concurrency=1,
+                                       start_offset=warm.read_checkpoint(checkpoint_path),
+                                       checkpoint_path=checkpoint_path, checkpoint_interval=1)
+
+        report = _warm().report()
+        self.assertEqual(report["addresses"], 4, "Not every input record processed")
+        self.assertEqual(warm.read_checkpoint(checkpoint_path), 4, "Checkpoint not at the end of the input")
+        self.assertEqual(report["geocoders"]["MockGeocoder"]["upstream"] + report["geocoders"]["MockGeocoder"]["hits"],
+                         3, "Empty address not skipped")
+        self.assertEqual(MockGeocoder.CALL_COUNT, 2, "Cached addresses being geocoded again")
+        self.assertEqual(MockGeocoder2.CALL_COUNT, 2, "Cached addresses being geocoded again")
+        self.assertIsNotNone(util.get_geocoder_cache().get(MockGeocoder2.__name__, "1 loop street"),
+                             "Warmed entry not in the cache")
+
+        # Resuming from the checkpoint shouldn't redo anything
+        call_count = MockGeocoder.CALL_COUNT
+        self.assertEqual(_warm().report()["addresses"], 0, "Checkpoint not being resumed from")
+        self.assertEqual(MockGeocoder.CALL_COUNT, call_count, "Checkpointed addresses being geocoded again")
+
+        # ...and the geocode endpoint should be served from the warmed cache
+        response = self.client.open(
+            '/v1/geocode',
+            method='GET',
+            query_string=[('address', '1 Loop St.')],
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(MockGeocoder.CALL_COUNT, call_count, "Warmed cache not used by the geocode endpoint")
+
+    def test_geocode_job(self):
+        """Testing that jobs are queued, worked through and their results fetched
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+            (
+                MockGeocoder2, {}
+            ),
+        ]
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        addresses = [f"{number} Long Street" for number in range(25)] + ["1 LONG ST"]
+        response = self.client.open(
+            '/v1.1/geocode/jobs',
+            method='POST',
+            json={"addresses": addresses, "geocoders": ["MockGeocoder"]},
+            headers=self.authorisation_headers
+        )
+        self.assertStatus(response, 202, 'Response body is : ' + response.data.decode('utf-8'))
+        job_id = response.json["job_id"]
+        self.assertEqual(response.json["status"], "queued", "Job not queued")
+        self.assertEqual(response.json["total"], len(addresses), "Job not holding every address")
+
+        job_runner = runner.JobRunner(self.app, util.get_geocode_job_store(), chunk_size=10)
+        self.assertEqual(job_runner.run_once(), job_id, "Queued job not claimed")
+        self.assertIsNone(job_runner.run_once(), "Finished job claimed again")
+
+        response = self.client.open(
+            f'/v1.1/geocode/jobs/{job_id}',
+            method='GET',
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(response.json["status"], "done", "Job not finished")
+        self.assertEqual(response.json["completed"], len(addresses), "Not every address geocoded")
+
+        response = self.client.open(
+            f'/v1.1/geocode/jobs/{job_id}/results',
+            method='GET',
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        self.assertEqual(response.mimetype, "application/x-ndjson", "Job results not newline delimited JSON")
+
+        results = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertListEqual([result["index"] for result in results], list(range(len(addresses))),
+                             "Job results not in input order")
+        self.assertEqual(results[-1]["results"], results[1]["results"], "Duplicate addresses have different results")
+        self.assertListEqual([geocode_result["geocoder_id"] for geocode_result in results[0]["results"]],
+                             ["MockGeocoder", "CombinedGeocoders"],
+                             "Job's geocoders not used")
+        self.assertEqual(MockGeocoder.CALL_COUNT, len(addresses) - 1, "Duplicate addresses not being deduplicated")
+        self.assertEqual(MockGeocoder2.CALL_COUNT, 0, "Geocoder not in the job being used")
+
+        response = self.client.open(
+            '/v1.1/geocode/jobs',
+            method='POST',
+            json={"addresses": addresses, "geocoders": ["MockGeocoder", "NotAGeocoder"]},
+            headers=self.authorisation_headers
+        )
+        self.assert400(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        self.assertIn("NotAGeocoder", response.json["message"], "Unknown geocoder not reported")
+        self.assertIsNone(job_runner.run_once(), "Job with unknown geocoders queued")
+
+        response = self.client.open(
+            '/v1.1/geocode/jobs/not-a-job',
+            method='GET',
+            headers=self.authorisation_headers
+        )
+        self.assert404(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+
+    def test_geocode_job_resume(self):
+        """Testing that a job interrupted part way through is picked up again, once its lease expires
+
+        """
+        tc = GeocoderTestConfig()
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        job_store = util.get_geocode_job_store()
+        addresses = [f"{number} Long Street" for number in range(10)]
+        job_id = job_store.create_job(addresses)
+
+        # A worker that dies after its first chunk
+        claimed_job_id, lease_token = job_store.claim_job(lease=-1)
+        self.assertEqual(claimed_job_id, job_id, "Queued job not claimed")
+        self.assertTrue(job_store.save_results(job_id, lease_token, [(0, json.dumps({"index": 0}))]),
+                        "Results not saved")
+        self.assertEqual(job_store.get_job(job_id)["status"], "running", "Claimed job not running")
+
+        job_runner = runner.JobRunner(self.app, job_store, chunk_size=3)
+        self.assertEqual(job_runner.run_once(), job_id, "Job with an expired lease not claimed again")
+        self.assertEqual(MockGeocoder.CALL_COUNT, len(addresses) - 1, "Job not resumed from where it left off")
+
+        job = job_store.get_job(job_id)
+        self.assertEqual(job["status"], "done", "Resumed job not finished")
+        self.assertEqual(job["completed"], len(addresses), "Not every address geocoded")
+        self.assertEqual(len(list(job_store.iter_results(job_id, batch_size=4))), len(addresses),
+                         "Not every result returned")
+
+        # ...and the worker that lost its lease can't touch it anymore
+        self.assertFalse(job_store.renew_lease(job_id, lease_token, 60), "Lost lease renewed")
+        self.assertFalse(job_store.save_results(job_id, lease_token, [(0, json.dumps({"index": -1}))]),
+                         "Results saved without the lease")
+        self.assertFalse(job_store.finish_job(job_id, lease_token, error="Too late"), "Job finished without the lease")
+        _, first_result = next(job_store.iter_results(job_id))
+        self.assertEqual(json.loads(first_result)["index"], 0, "Result overwritten without the lease")
+        self.assertEqual(job_store.get_job(job_id)["status"], "done", "Job changed without the lease")
+
+        # ...but a job with a live lease is left alone
+        job_id = job_store.create_job(addresses)
+        self.assertEqual(job_store.claim_job(lease=60)[0], job_id, "Queued job not claimed")
+        self.assertIsNone(job_runner.run_once(), "Job with a live lease claimed by another worker")
+
+    def test_geocode_job_retry(self):
+        """Testing that a job that hits an error is tried again, up to a limit, unless the error is going to recur
+
+        """
+        tc = GeocoderTestConfig()
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        class FailingJobRunner(runner.JobRunner):
+            def _geocode_chunk(self, job, pending):
+                raise RuntimeError("Upstream fell over")
+
+        job_store = util.get_geocode_job_store()
+        job_id = job_store.create_job([f"{number} Long Street" for number in range(10)])
+
+        # Leases that expire straight away, so that failed attempts can be claimed again immediately
+        job_runner = FailingJobRunner(self.app, job_store, lease=-1, max_attempts=2)
+        self.assertEqual(job_runner.run_once(), job_id, "Queued job not claimed")
+        job = job_store.get_job(job_id)
+        self.assertEqual(job["status"], "running", "Job failed on its first error")
+        self.assertIn("Upstream fell over", job["error"], "Job's error not recorded")
+
+        self.assertEqual(job_runner.run_once(), job_id, "Job with an error not tried again")
+        self.assertIsNone(job_runner.run_once(), "Job tried more than max_attempts times")
+        job = job_store.get_job(job_id)
+        self.assertEqual(job["status"], "failed", "Job not failed after max_attempts")
+        self.assertIn("Upstream fell over", job["error"], "Job's last error not reported")
+
+        # A job whose geocoders aren't configured is failed without retrying
+        job_id = job_store.create_job(["1 Long Street"], geocoders=["NotAGeocoder"])
+        job_runner = runner.JobRunner(self.app, job_store, lease=-1)
+        self.assertEqual(job_runner.run_once(), job_id, "Queued job not claimed")
+        job = job_store.get_job(job_id)
+        self.assertEqual(job["status"], "failed", "Job with unknown geocoders retried")
+        self.assertIn("NotAGeocoder", job["error"], "Unknown geocoder not reported")
+        self.assertIsNone(job_runner.run_once(), "Failed job claimed again")
+
+    def test_geocoder_limits(self):
+        """Testing that requests over a geocoder's limits wait, or are given up on (and not cached)
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+            (
+                MockGeocoder2, {}
+            ),
+        ]
+        tc.GEOCODER_LIMITER = (
+            GeocoderLimiter, {"limits": [config.ConfigNamespace.CONFIG, "GEOCODER_LIMITS"],
+                              "max_wait": [config.ConfigNamespace.CONFIG, "GEOCODER_LIMIT_MAX_WAIT"]}
+        )
+        tc.GEOCODER_LIMITS = {"MockGeocoder": {"requests_per_second": 5, "burst": 1}}
+        tc.GEOCODER_LIMIT_MAX_WAIT = 0.1
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        def _geocode(address):
+            response = self.client.open(
+                '/v1.1/geocode',
+                method='GET',
+                query_string=[('address', address)],
+                headers=self.authorisation_headers
+            )
+            self.assert200(response,
+                           'Response body is : ' + response.data.decode('utf-8'))
+            return {result["geocoder_id"]: result for result in response.json["results"]}
+
+        self.assertEqual(_geocode("1 Long Street")["MockGeocoder"]["confidence"], 1, "Request within limits failed")
+
+        # Over the rate, and would have to wait for longer than allowed
+        results = _geocode("2 Long Street")
+        self.assertEqual(results["MockGeocoder"]["confidence"], 0, "Request over the limits not given up on")
+        self.assertEqual(results["MockGeocoder2"]["confidence"], 1, "Unlimited geocoder held up")
+        self.assertEqual(MockGeocoder.CALL_COUNT, 1, "Request over the limits made")
+        self.assertEqual(util.get_metrics().get_counter("geocoder_limit_rejections_total", geocoder="MockGeocoder"), 1,
+                         "Rejected request not counted")
+
+        # ...and the failure isn't cached
+        time.sleep(0.2)
+        self.assertEqual(_geocode("2 Long Street")["MockGeocoder"]["confidence"], 1, "Rejected request cached")
+        self.assertEqual(util.get_metrics().get_histogram("geocoder_limit_wait_seconds",
+                                                          geocoder="MockGeocoder")["count"], 2,
+                         "Queued wait time not recorded")
+
+    def test_geocoder_timeouts(self):
+        """Testing that slow geocoders are left out of the results after their timeout, or once there is a quorum, and
+        that their late answers are still cached
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+            (
+                MockGeocoder2, {}
+            ),
+            (
+                SlowMockGeocoder, {}
+            ),
+        ]
+        tc.GEOCODER_TIMEOUTS = {"SlowMockGeocoder": 0.1}
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        def _geocode(address):
+            start = time.monotonic()
+            response = self.client.open(
+                '/v1.1/geocode',
+                method='GET',
+                query_string=[('address', address)],
+                headers=self.authorisation_headers
+            )
+            self.assert200(response,
+                           'Response body is : ' + response.data.decode('utf-8'))
+            return {result["geocoder_id"]: result for result in response.json["results"]}, time.monotonic() - start
+
+        def _wait_for_cache_entry(address):
+            for _ in range(50):
+                if util.get_geocoder_cache().get("SlowMockGeocoder", address) is not None:
+                    return True
+                time.sleep(0.05)
+            return False
+
+        results, duration = _geocode("1 Long Street")
+        self.assertLess(duration, SlowMockGeocoder.DELAY, "Slow geocoder not timed out")
+        self.assertEqual(results["SlowMockGeocoder"]["confidence"], 0, "Timed out geocoder not left out")
+        self.assertEqual(results["MockGeocoder"]["confidence"], 1, "Other geocoders left out")
+        self.assertIn("CombinedGeocoders", results, "Combined result not returned")
+        self.assertEqual(util.get_metrics().get_counter("geocoder_timeouts_total", geocoder="SlowMockGeocoder"), 1,
+                         "Timeout not counted")
+
+        # The late answer is cached in the background...
+        self.assertTrue(_wait_for_cache_entry("1 long street"), "Late answer not cached")
+        results, _ = _geocode("1 Long Street")
+        self.assertEqual(results["SlowMockGeocoder"]["confidence"], 1, "Late answer not used")
+        self.assertEqual(SlowMockGeocoder.CALL_COUNT, 1, "Cached late answer not used")
+
+        # Returning as soon as two geocoders agree, without waiting for the third
+        tc.GEOCODER_TIMEOUTS = {}
+        tc.GEOCODE_QUORUM = 2
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        results, duration = _geocode("2 Long Street")
+        self.assertLess(duration, SlowMockGeocoder.DELAY, "Not returning once there is a quorum")
+        self.assertEqual(results["SlowMockGeocoder"]["confidence"], 0, "Slow geocoder not left out")
+        self.assertEqual(results["MockGeocoder2"]["confidence"], 1, "Quorum geocoders left out")
+        self.assertEqual(util.get_metrics().get_counter("geocode_quorum_returns_total"), 1,
+                         "Early return not counted")
+        self.assertTrue(_wait_for_cache_entry("2 long street"), "Late answer not cached")
+
+        # ...but not if they disagree
+        MockGeocoder.X, MockGeocoder.Y = 10, 10
+        results, duration = _geocode("3 Long Street")
+        self.assertGreaterEqual(duration, SlowMockGeocoder.DELAY, "Returning without a quorum")
+        self.assertEqual(results["SlowMockGeocoder"]["confidence"], 1, "Slow geocoder left out without a quorum")
+
+    def test_geocoder_cascade(self):
+        """Testing that later tiers of geocoders are only queried when the earlier tiers' results don't agree
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+            (
+                MockGeocoder2, {}
+            ),
+            (
+                SlowMockGeocoder, {}
+            ),
+        ]
+        tc.GEOCODER_TIERS = [["MockGeocoder", "MockGeocoder2"]]
+        current_app.config.from_object(tc)
+        util.flush_caches()
+        SlowMockGeocoder.CALL_COUNT = 0
+
+        def _geocode(address):
+            response = self.client.open(
+                '/v1.1/geocode',
+                method='GET',
+                query_string=[('address', address)],
+                headers=self.authorisation_headers
+            )
+            self.assert200(response,
+                           'Response body is : ' + response.data.decode('utf-8'))
+            return {result["geocoder_id"]: result for result in response.json["results"]}
+
+        # The first tier agrees, so the untiered geocoder isn't queried
+        results = _geocode("1 Long Street")
+        self.assertEqual(SlowMockGeocoder.CALL_COUNT, 0, "Escalated even though the first tier agrees")
+        self.assertEqual(results["SlowMockGeocoder"]["confidence"], 0, "Geocoder that wasn't queried not left out")
+        self.assertEqual(results["MockGeocoder2"]["confidence"], 1, "First tier left out")
+        self.assertIn("CombinedGeocoders", results, "Combined result not returned")
+        self.assertEqual(util.get_metrics().get_counter("geocoder_cascade_skips_total", geocoder="SlowMockGeocoder"),
+                         1, "Skipped geocoder not counted")
+
+        # ...but it is once the first tier disagrees
+        MockGeocoder.X, MockGeocoder.Y = 10, 10
+        results = _geocode("2 Long Street")
+        self.assertEqual(SlowMockGeocoder.CALL_COUNT, 1, "Not escalated when the first tier disagrees")
+        self.assertEqual(results["SlowMockGeocoder"]["confidence"], 1, "Later tier's result not returned")
+        self.assertEqual(util.get_metrics().get_counter("geocode_cascade_escalations_total", tier="1"), 1,
+                         "Escalation not counted")
+
+    def test_geocoder_selection(self):
+        """Testing that geocoders whose answers don't contribute are skipped, based on their statistics
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+            (
+                MockGeocoder2, {}
+            ),
+            (
+                BadMockGeocoder, {}
+            ),
+        ]
+        tc.GEOCODER_SELECTION_MIN_SAMPLES = 3
+        tc.GEOCODER_SELECTION_MIN_CONTRIBUTION = 0.1
+        tc.GEOCODER_SELECTION_EXPLORATION = 0
+        tc.GEOCODER_SELECTOR = (
+            GeocoderSelector, {"min_samples": [config.ConfigNamespace.CONFIG, "GEOCODER_SELECTION_MIN_SAMPLES"],
+                               "min_contribution": [config.ConfigNamespace.CONFIG,
+                                                    "GEOCODER_SELECTION_MIN_CONTRIBUTION"],
+                               "exploration": [config.ConfigNamespace.CONFIG, "GEOCODER_SELECTION_EXPLORATION"]}
+        )
+        current_app.config.from_object(tc)
+        util.flush_caches()
+        BadMockGeocoder.CALL_COUNT = 0
+
+        def _geocode(address):
+            response = self.client.open(
+                '/v1.1/geocode',
+                method='GET',
+                query_string=[('address', address)],
+                headers=self.authorisation_headers
+            )
+            self.assert200(response,
+                           'Response body is : ' + response.data.decode('utf-8'))
+
+        for i in range(3):
+            _geocode(f"{i} Long Street")
+        self.assertEqual(BadMockGeocoder.CALL_COUNT, 3, "Geocoder skipped before there were enough answers")
+        stats = util.get_geocoder_selector().stats()
+        self.assertEqual(stats["BadMockGeocoder"][selection.KIND_STREET]["null_rate"], 1, "Empty answers not recorded")
+        self.assertEqual(stats["MockGeocoder"][selection.KIND_STREET]["agreement_rate"], 1, "Agreement not recorded")
+
+        # The geocoder that never finds anything is skipped for this kind of address, but not for others
+        _geocode("3 Long Street")
+        self.assertEqual(BadMockGeocoder.CALL_COUNT, 3, "Geocoder that doesn't contribute not skipped")
+        self.assertEqual(util.get_metrics().get_counter("geocoder_selection_skips_total", geocoder="BadMockGeocoder"),
+                         1, "Skipped geocoder not counted")
+        _geocode("Groote Schuur Hospital")
+        self.assertEqual(BadMockGeocoder.CALL_COUNT, 4, "Geocoder skipped for another kind of address")
+
+    def test_geocoder_hedging(self):
+        """Testing that requests to hedged geocoders are made again once they've taken longer than usual
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+            (
+                SlowMockGeocoder, {}
+            ),
+        ]
+        tc.GEOCODER_HEDGED = ["SlowMockGeocoder"]
+        tc.GEOCODER_HEDGE_MIN_SAMPLES = 1
+        tc.GEOCODER_HEDGE_BUDGET = 1
+        tc.GEOCODER_HEDGER = (
+            GeocoderHedger, {"geocoders": [config.ConfigNamespace.CONFIG, "GEOCODER_HEDGED"],
+                             "budget": [config.ConfigNamespace.CONFIG, "GEOCODER_HEDGE_BUDGET"]}
+        )
+        current_app.config.from_object(tc)
+        util.flush_caches()
+        SlowMockGeocoder.CALL_COUNT = 0
+
+        # It usually answers far quicker than it's about to
+        util.get_geocoder_selector().record_answer("SlowMockGeocoder", "1 Long Street", 0.05, located=True)
+
+        response = self.client.open(
+            '/v1.1/geocode',
+            method='GET',
+            query_string=[('address', "1 Long Street")],
+            headers=self.authorisation_headers
+        )
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        geocoder_ids = [result["geocoder_id"] for result in json.loads(response.data)["results"]]
+        self.assertIn(SlowMockGeocoder.__name__, geocoder_ids, "Hedged geocoder's result missing")
+
+        self.assertEqual(SlowMockGeocoder.CALL_COUNT, 2, "Slow request not hedged")
+        self.assertEqual(util.get_geocoder_hedger().stats()["SlowMockGeocoder"]["hedged"], 1, "Hedge not counted")
+        self.assertEqual(MockGeocoder.CALL_COUNT, 1, "Geocoder hedged without being configured to be")
+
+    def test_geocode_asyncio_engine(self):
+        """Testing that the asyncio engine fans out to both blocking and natively async geocoders, and times out slow
+        geocoders
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+            (
+                AsyncMockGeocoder, {}
+            ),
+            (
+                SlowMockGeocoder, {}
+            ),
+        ]
+        tc.GEOCODE_ENGINE = "asyncio"
+        tc.GEOCODER_TIMEOUTS = {"SlowMockGeocoder": 0.1}
+
+        cache_write_threads = []
+
+        class ThreadRecordingMemoryCache(MemoryCache):
+            def put(self, *args, **kwargs):
+                cache_write_threads.append(threading.current_thread().name)
+                return super().put(*args, **kwargs)
+
+        tc.GEOCODER_MEMORY_CACHE = (ThreadRecordingMemoryCache, {})
+        current_app.config.from_object(tc)
+        util.flush_caches()
+        AsyncMockGeocoder.CALL_COUNT = 0
+
+        start = time.monotonic()
+        response = self.client.open(
+            '/v1.1/geocode',
+            method='GET',
+            query_string=[('address', "1 Long Street")],
+            headers=self.authorisation_headers
+        )
+        duration = time.monotonic() - start
+        self.assert200(response,
+                       'Response body is : ' + response.data.decode('utf-8'))
+        results = {result["geocoder_id"]: result for result in response.json["results"]}
+
+        self.assertLess(duration, SlowMockGeocoder.DELAY, "Slow geocoder not timed out")
+        self.assertEqual(results["MockGeocoder"]["confidence"], 1, "Blocking geocoder's result not returned")
+        self.assertEqual(results["AsyncMockGeocoder"]["confidence"], 1, "Async geocoder's result not returned")
+        self.assertEqual(results["SlowMockGeocoder"]["confidence"], 0, "Timed out geocoder not left out")
+        self.assertIn("CombinedGeocoders", results, "Combined result not returned")
+        self.assertEqual(AsyncMockGeocoder.CALL_COUNT, 1, "Async geocoder not awaited")
+        self.assertEqual(util.get_metrics().get_counter("geocoder_timeouts_total", geocoder="SlowMockGeocoder"), 1,
+                         "Timeout not counted")
+
+        # The results are cached, as with the threaded engine
+        self.assertIsNotNone(util.get_geocoder_cache().get("AsyncMockGeocoder", "1 long street"),
+                             "Async geocoder's result not cached")
+        self.assertGreaterEqual(util.get_geocode_event_loop().stats()["submitted"], 1,
+                                "Geocode not run on the event loop")
+        self.assertTrue(cache_write_threads, "Results not written to the memory cache")
+        self.assertNotIn("cogpn-geocode-loop", cache_write_threads, "Cache written to on the event loop")
+
+    def test_geocoder_circuit_breaker(self):
+        """Testing that failing geocoders are skipped, and that this is reflected in their status
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                MockGeocoder, {}
+            ),
+            (
+                ErrorMockGeocoder, {}
+            ),
+        ]
+        tc.GEOCODER_CIRCUIT_BREAKER = (
+            GeocoderCircuitBreaker, {
+                "min_requests": [config.ConfigNamespace.CONFIG, "GEOCODER_CIRCUIT_BREAKER_MIN_REQUESTS"]
+            }
+        )
+        tc.GEOCODER_CIRCUIT_BREAKER_MIN_REQUESTS = 2
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        def _geocoder_statuses():
+            response = self.client.open(
+                '/v1.1/geocoders',
+                method='GET',
+                query_string=[('include_status', 'true')],
+                headers=self.authorisation_headers
+            )
+            self.assert200(response,
+                           'Response body is : ' + response.data.decode('utf-8'))
+            return {status["geocoder_id"]: status["circuit_state"] for status in response.json}
+
+        self.assertDictEqual(_geocoder_statuses(), {"MockGeocoder": "closed", "ErrorMockGeocoder": "closed"},
+                             "Geocoder statuses not returned")
+
+        for number in range(5):
+            response = self.client.open(
+                '/v1.1/geocode',
+                method='GET',
+                query_string=[('address', f"{number} Long Street")],
+                headers=self.authorisation_headers
+            )
+            self.assert200(response,
+                           'Response body is : ' + response.data.decode('utf-8'))
+
+        self.assertEqual(ErrorMockGeocoder.CALL_COUNT, 2, "Failing geocoder not skipped")
+        self.assertEqual(MockGeocoder.CALL_COUNT, 5, "Working geocoder skipped")
+        self.assertDictEqual(_geocoder_statuses(), {"MockGeocoder": "closed", "ErrorMockGeocoder": "open"},
+                             "Open circuit not reflected in the geocoder statuses")
+        self.assertEqual(util.get_metrics().get_counter("geocoder_circuit_rejections_total",
+                                                        geocoder="ErrorMockGeocoder"), 3,
+                         "Skipped requests not counted")
+
+    def test_geocode_single_flight(self):
+        """Testing that concurrent requests for the same address share their upstream requests
+
+        """
+        tc = GeocoderTestConfig()
+        tc.GEOCODERS = [
+            (
+                SlowMockGeocoder, {}
+            ),
+        ]
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        responses = []
+
+        def _geocode(address):
+            with self.app.test_client() as client:
+                responses.append(client.open(
+                    '/v1.1/geocode',
+                    method='GET',
+                    query_string=[('address', address)],
+                    headers=self.authorisation_headers
+                ))
+
+        threads = [
+            threading.Thread(target=_geocode, args=(address,))
+            for address in ("12 Long Street", "12 LONG ST", "12 Long St.")
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for response in responses:
+            self.assert200(response,
+                           'Response body is : ' + response.data.decode('utf-8'))
+            self.assertEqual(response.json["results"][0]["confidence"], 1, "Shared result not returned")
+        self.assertEqual(SlowMockGeocoder.CALL_COUNT, 1, "Concurrent identical requests not coalesced")
+        self.assertEqual(util.get_metrics().get_counter("geocoder_coalesced_requests_total",
+                                                        geocoder="SlowMockGeocoder"), 2,
+                         "Coalesced requests not counted")
+
 
 if __name__ == '__main__':
     import unittest
@@ -0,0 +1,365 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+import datetime
+import decimal
+import os
+import pickle
+import tempfile
+import threading
+
+from cape_of_good_place_names.geocoder_cache import backends, evict, memory, migrate, normalise, records, refresh
+from cape_of_good_place_names.test import BaseTestCase
+
+
+class TestGeocoderCache(BaseTestCase):
+    """Unit tests for the geocoder cache backends"""
+
+    def setUp(self) -> None:
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.test_result = ("12 Long Street", -33.92, 18.42, None)
+
+    def tearDown(self) -> None:
+        self.tempdir.cleanup()
+
+    def _backend_checks(self, cache_backend):
+        # Empty cache
+        self.assertIsNone(cache_backend.get("MockGeocoder", "12 Long Street"), "Empty cache returning a value")
+        self.assertListEqual(list(cache_backend.entries()), [], "Empty cache has entries")
+
+        # Writing and reading back
+        before = datetime.datetime.now().timestamp()
+        cache_backend.put("MockGeocoder", "12 Long Street", self.test_result)
+        result, created = cache_backend.get("MockGeocoder", "12 Long Street")
+        self.assertTupleEqual(result, self.test_result, "Cached value not read back correctly")
+        self.assertGreaterEqual(created, before - 1, "Creation time not set correctly")
+
+        # Geocoders don't share entries
+        self.assertIsNone(cache_backend.get("MockGeocoder2", "12 Long Street"), "Cache entries leaking across geocoders")
+
+        # Explicit creation times
+        cache_backend.put_many([("MockGeocoder2", "12 Long Street", self.test_result, 1000)])
+        _, created = cache_backend.get("MockGeocoder2", "12 Long Street")
+        self.assertAlmostEqual(created, 1000, msg="Explicit creation time not being stored")
+
+        entries = sorted(cache_backend.entries())
+        self.assertListEqual([(geocoder_id, address) for geocoder_id, address, *_ in entries],
+                             [("MockGeocoder", "12 Long Street"), ("MockGeocoder2", "12 Long Street")],
+                             "Cache entries not listed correctly")
+        self.assertEqual(len(list(cache_backend.entries("MockGeocoder"))), 1, "Cache entries not filtered by geocoder")
+
+        # Deleting
+        cache_backend.delete("MockGeocoder", "12 Long Street")
+        self.assertIsNone(cache_backend.get("MockGeocoder", "12 Long Street"), "Cache entry not deleted")
+        cache_backend.delete("MockGeocoder", "12 Long Street")
+
+    def test_file_backend(self):
+        """Vanilla test case for the pickle-per-address backend
+
+        """
+        self._backend_checks(backends.FileCacheBackend(self.tempdir.name))
+
+    def test_sharded_file_backend(self):
+        """Vanilla test case for the sharded file backend
+
+        """
+        cache_backend = backends.ShardedFileCacheBackend(self.tempdir.name)
+        self._backend_checks(cache_backend)
+
+        # Long addresses, and addresses whose base64 encoding contains a "/"
+        long_address = "12 Long Street, " * 100
+        slash_address = "???"
+        for address in (long_address, slash_address):
+            cache_backend.put("MockGeocoder", address, self.test_result)
+            result, _ = cache_backend.get("MockGeocoder", address)
+            self.assertTupleEqual(result, self.test_result, "Cached value not read back correctly")
+
+        # Checking the layout - fixed length filenames, two levels down, and no temporary files left behind
+        cache_paths = [
+            os.path.relpath(os.path.join(dir_path, filename), os.path.join(self.tempdir.name, "MockGeocoder"))
+            for dir_path, _, filenames in os.walk(os.path.join(self.tempdir.name, "MockGeocoder"))
+            for filename in filenames
+        ]
+        self.assertEqual(len(cache_paths), 2, "Unexpected files in the cache directory")
+        for cache_path in cache_paths:
+            shard1, shard2, filename = cache_path.split(os.sep)
+            self.assertTrue(filename.startswith(shard1 + shard2), "Cache file not in the expected shard")
+            self.assertEqual(len(filename), 64 + len(cache_backend.FILE_SUFFIX), "Cache filename not fixed length")
+
+        self.assertSetEqual({address for _, address, *_ in cache_backend.entries("MockGeocoder")},
+                            {long_address, slash_address}, "Addresses not recovered from the cache files")
+
+    def test_sqlite_backend(self):
+        """Vanilla test case for the single file SQLite backend
+
+        """
+        cache_backend = backends.SqliteCacheBackend(self.tempdir.name)
+        self._backend_checks(cache_backend)
+        cache_backend.close()
+
+    def test_records(self):
+        """Vanilla test case for the cached result record format
+
+        """
+        for compression in (None, "zlib"):
+            data = records.encode("12 Long Street", self.test_result, compression)
+            self.assertTrue(records.is_record(data), "Record not recognised")
+            self.assertTupleEqual(records.decode(data), ("12 Long Street", self.test_result),
+                                  "Record not decoded correctly")
+
+            # Different key and result addresses, metadata, and a failed geocode
+            result = ("12 Long St, Cape Town, 8001", -33.92, 18.42, {"place_id": 1234})
+            self.assertTupleEqual(records.decode(records.encode("12 Long Street", result, compression)),
+                                  ("12 Long Street", result), "Record with metadata not decoded correctly")
+
+            _, failed_result = records.decode(records.encode("12 Long Street", ("12 Long Street", None, "", None)))
+            self.assertTupleEqual(failed_result, ("12 Long Street", None, None, None),
+                                  "Failed geocode record not decoded correctly")
+
+        # Coordinates that aren't floats are still positive results
+        for lat, lon in (("-33.92", "18.42"), (decimal.Decimal("-33.92"), decimal.Decimal("18.42"))):
+            _, result = records.decode(records.encode("12 Long Street", ("12 Long Street", lat, lon, None)))
+            self.assertTupleEqual(result, ("12 Long Street", -33.92, 18.42, None),
+                                  f"{lat.__class__.__name__} coordinates not decoded correctly")
+        with self.assertRaises(ValueError, msg="Garbage coordinates accepted"):
+            records.encode("12 Long Street", ("12 Long Street", "north-ish", 18.42, None))
+
+        self.assertFalse(records.is_record(pickle.dumps(self.test_result)), "Pickle recognised as a record")
+        with self.assertRaises(AssertionError, msg="Unknown compression accepted"):
+            records.check_compression("lzma")
+
+    def test_legacy_entries(self):
+        """Testing that the backends read legacy pickled entries
+
+        """
+        cache_backend = backends.FileCacheBackend(self.tempdir.name)
+        cache_path = cache_backend._get_cache_path("MockGeocoder", "12 Long Street")
+        cache_path.parent.mkdir(parents=True)
+        with open(cache_path, "wb") as cache_file:
+            pickle.dump(self.test_result, cache_file)
+
+        result, _ = cache_backend.get("MockGeocoder", "12 Long Street")
+        self.assertTupleEqual(result, self.test_result, "Legacy pickle not read correctly")
+
+        sharded_backend = backends.ShardedFileCacheBackend(self.tempdir.name)
+        cache_path = sharded_backend._get_cache_path("MockGeocoder", "12 Long Street")
+        cache_path.parent.mkdir(parents=True)
+        with open(cache_path, "wb") as cache_file:
+            pickle.dump(("12 Long Street", self.test_result), cache_file)
+
+        result, _ = sharded_backend.get("MockGeocoder", "12 Long Street")
+        self.assertTupleEqual(result, self.test_result, "Legacy sharded pickle not read correctly")
+
+        sqlite_backend = backends.SqliteCacheBackend(self.tempdir.name)
+        sqlite_backend._dump = lambda address, result: pickle.dumps(result)
+        sqlite_backend.put("MockGeocoder", "12 Long Street", self.test_result)
+        del sqlite_backend._dump
+
+        result, _ = sqlite_backend.get("MockGeocoder", "12 Long Street")
+        self.assertTupleEqual(result, self.test_result, "Legacy SQLite pickle not read correctly")
+        sqlite_backend.close()
+
+    def test_normalise_address(self):
+        """Vanilla test case for the cache key normalisation
+
+        """
+        for address in ("12 Long Rd, Cape Town", "12  long road cape town", " 12 LONG RD., CAPE-TOWN\n"):
+            self.assertEqual(normalise.normalise_address(address), "12 long road cape town",
+                             f"'{address}' not normalised correctly")
+
+        self.assertEqual(normalise.normalise_address("Cnr Main Rd & Kloof Ave"), "corner main road kloof avenue",
+                         "Abbreviations not expanded")
+        self.assertEqual(normalise.normalise_address("Strand Street"), "strand street",
+                         "Words starting with an abbreviation being expanded")
+
+        # "St" and "Dr" are only street types at the end of the address, or before a unit or number
+        for address, normalised in (("12 Long St", "12 long street"),
+                                    ("Long St 12", "long street 12"),
+                                    ("Kloof Dr Unit 4", "kloof drive unit 4"),
+                                    ("St James Rd", "st james road"),
+                                    ("12 St Georges Mall", "12 st georges mall"),
+                                    ("Dr Smith, 1 Long Street", "dr smith 1 long street")):
+            self.assertEqual(normalise.normalise_address(address), normalised, f"'{address}' not normalised correctly")
+
+    def test_cache_refresher(self):
+        """Vanilla test case for the background cache refresher
+
+        """
+        refresher = refresh.CacheRefresher(max_workers=1)
+        release = threading.Event()
+        refreshed = []
+
+        def _refresh(value):
+            release.wait()
+            refreshed.append(value)
+
+        self.assertTrue(refresher.submit("key", _refresh, 1), "Refresh not scheduled")
+        self.assertFalse(refresher.submit("key", _refresh, 2), "Duplicate refresh scheduled")
+        self.assertTrue(refresher.submit("other key", _refresh, 3), "Refresh not scheduled")
+
+        release.set()
+        refresher.wait()
+        self.assertListEqual(sorted(refreshed), [1, 3], "Refreshes not run")
+
+        # Once a refresh is done, the key can be refreshed again
+        self.assertTrue(refresher.submit("key", _refresh, 4), "Refresh not scheduled")
+        refresher.wait()
+
+        stats = refresher.stats()
+        self.assertDictEqual(stats, {"pending": 0, "submitted": 3, "skipped": 1, "completed": 3, "failed": 0},
+                             "Refresh stats not counted correctly")
+        refresher.shutdown()
+
+    def test_migrate(self):
+        """Testing that the pickle tree is imported into the SQLite store
+
+        """
+        source = backends.FileCacheBackend(self.tempdir.name)
+        source.put("MockGeocoder", "12 Long Street", self.test_result, 1000)
+        source.put("MockGeocoder2", "Civic Centre, Hertzog Blvd", self.test_result)
+        # Earlier versions could leave pickled Nones in the cache
+        with open(source._get_cache_path("MockGeocoder", "Nowhere"), "wb") as cache_file:
+            pickle.dump(None, cache_file)
+
+        target = backends.SqliteCacheBackend(self.tempdir.name)
+        copied = migrate.copy_entries(source, target, batch_size=1)
+        self.assertEqual(copied, 2, "Not all cache entries copied")
+        self.assertIsNone(target.get("MockGeocoder", "Nowhere"), "Pickled None copied")
+
+        result, created = target.get("MockGeocoder", "12 Long Street")
+        self.assertTupleEqual(result, self.test_result, "Cached value not copied correctly")
+        self.assertAlmostEqual(created, 1000, msg="Creation time not preserved when copying")
+        self.assertIsNotNone(target.get("MockGeocoder2", "Civic Centre, Hertzog Blvd"), "Cached value not copied")
+
+        target.close()
+
+        # The legacy keys are raw addresses, so normalising them as the server now does
+        normalised_target = backends.SqliteCacheBackend(os.path.join(self.tempdir.name, "normalised"))
+        migrate.copy_entries(source, normalised_target, normalise_keys=True)
+        cache_key = normalise.normalise_address("Civic Centre, Hertzog Blvd")
+        self.assertNotEqual(cache_key, "Civic Centre, Hertzog Blvd")
+        self.assertIsNotNone(normalised_target.get("MockGeocoder2", cache_key), "Cache key not normalised")
+        self.assertIsNone(normalised_target.get("MockGeocoder2", "Civic Centre, Hertzog Blvd"),
+                          "Raw address copied as the cache key")
+
+        normalised_target.close()
+
+    def test_relayout(self):
+        """Testing that the pickle tree is moved into the sharded layout
+
+        """
+        source = backends.FileCacheBackend(self.tempdir.name)
+        source.put("MockGeocoder", "12 Long Street", self.test_result, 1000)
+
+        target = backends.ShardedFileCacheBackend(self.tempdir.name)
+        copied = migrate.copy_entries(source, target, delete_source=True)
+        self.assertEqual(copied, 1, "Not all cache entries copied")
+
+        result, created = target.get("MockGeocoder", "12 Long Street")
+        self.assertTupleEqual(result, self.test_result, "Cached value not copied correctly")
+        self.assertAlmostEqual(created, 1000, msg="Creation time not preserved when copying")
+        self.assertListEqual(list(source.entries()), [], "Source entries not deleted")
+
+    def _collect_garbage_checks(self, cache_backend):
+        now = datetime.datetime.now().timestamp()
+        negative_result = ("Nowhere", None, None, None)
+        cache_backend.put_many([
+            ("MockGeocoder", "1 Long Street", self.test_result, now - 5000),  # expired
+            ("MockGeocoder", "2 Long Street", self.test_result, now - 500),
+            ("MockGeocoder", "3 Long Street", self.test_result, now - 400),
+            ("MockGeocoder", "4 Long Street", self.test_result, now - 300),
+            ("MockGeocoder", "Nowhere", negative_result, now - 500),  # expired, as a negative entry
+        ])
+
+        report = evict.collect_garbage(cache_backend, max_age=1000, negative_max_age=100, max_entries=2)
+        self.assertEqual(report["scanned"], 5, "Not all entries scanned")
+        self.assertEqual(report["expired"], 2, "Expired entries not removed")
+        self.assertEqual(report["evicted"], 1, "Entry budget not enforced")
+        self.assertEqual(report["deleted"], 3, "Entries not deleted")
+        self.assertGreater(report["reclaimed_bytes"], 0, "Reclaimed bytes not reported")
+        self.assertListEqual(
+            sorted(address for _, address, *_ in cache_backend.entries()), ["3 Long Street", "4 Long Street"],
+            "Oldest entries not evicted first"
+        )
+
+        # Entries rewritten since they were listed are left alone
+        cache_backend.put("MockGeocoder", "3 Long Street", self.test_result)
+        deleted = cache_backend.delete_many([("MockGeocoder", "3 Long Street", now - 400),
+                                             ("MockGeocoder", "4 Long Street", now - 300)])
+        self.assertListEqual(deleted, [("MockGeocoder", "4 Long Street")], "Rewritten entry deleted")
+        self.assertIsNotNone(cache_backend.get("MockGeocoder", "3 Long Street"), "Rewritten entry deleted")
+
+        # Size budget
+        cache_backend.put("MockGeocoder", "5 Long Street", self.test_result)
+        report = evict.collect_garbage(cache_backend, max_age=1000, max_bytes=1, compact=True)
+        self.assertEqual(report["evicted"], 2, "Size budget not enforced")
+        self.assertEqual(report["remaining_bytes"], 0, "Remaining bytes not reported")
+        self.assertListEqual(list(cache_backend.entries()), [], "Entries not evicted")
+
+        # Entries rewritten between being listed and deleted aren't counted as reclaimed
+        cache_backend.put("MockGeocoder", "6 Long Street", self.test_result, now - 5000)
+        listed_entries = list(cache_backend.entries())
+        cache_backend.put("MockGeocoder", "6 Long Street", self.test_result)
+        cache_backend.entries = lambda geocoder_id=None: iter(listed_entries)
+        report = evict.collect_garbage(cache_backend, max_age=1000)
+        del cache_backend.entries
+        self.assertEqual(report["expired"], 1)
+        self.assertEqual(report["deleted"], 0, "Rewritten entry deleted")
+        self.assertEqual(report["reclaimed_bytes"], 0, "Rewritten entry counted as reclaimed")
+
+    def test_collect_garbage(self):
+        """Testing that expired entries are removed, and the oldest evicted to keep within budget
+
+        """
+        for cache_backend in (backends.SqliteCacheBackend(self.tempdir.name),
+                              backends.ShardedFileCacheBackend(self.tempdir.name + "/sharded")):
+            self._collect_garbage_checks(cache_backend)
+            cache_backend.close()
+
+        # Orphaned temporary files are cleared out when compacting
+        cache_backend = backends.FileCacheBackend(self.tempdir.name + "/files")
+        temp_path = cache_backend.cache_dir / "MockGeocoder" / ".orphan.tmp"
+        temp_path.parent.mkdir(parents=True)
+        temp_path.write_bytes(b"partial")
+        os.utime(temp_path, (1000, 1000))
+        self.assertEqual(cache_backend.compact(), len(b"partial"), "Orphaned temporary file not reclaimed")
+        self.assertFalse(temp_path.exists(), "Orphaned temporary file not removed")
+
+    def test_memory_cache(self):
+        """Vanilla test case for the in-process LRU cache
+
+        """
+        memory_cache = memory.MemoryCache(max_entries=2, ttl=1000)
+        self.assertIsNone(memory_cache.get("MockGeocoder", "1 Long Street"), "Empty cache returning a value")
+
+        memory_cache.put("MockGeocoder", "1 Long Street", self.test_result)
+        memory_cache.put("MockGeocoder", "2 Long Street", self.test_result)
+        result, _ = memory_cache.get("MockGeocoder", "1 Long Street")
+        self.assertTupleEqual(result, self.test_result, "Cached value not read back correctly")
+
+        # "2 Long Street" is now the least recently used entry
+        memory_cache.put("MockGeocoder", "3 Long Street", self.test_result)
+        self.assertIsNone(memory_cache.get("MockGeocoder", "2 Long Street"), "Least recently used entry not evicted")
+        self.assertIsNotNone(memory_cache.get("MockGeocoder", "1 Long Street"), "Recently used entry evicted")
+
+        # Entries older than the TTL are dropped
+        memory_cache.put("MockGeocoder", "4 Long Street", self.test_result, created=0)
+        self.assertIsNone(memory_cache.get("MockGeocoder", "4 Long Street"), "Expired entry being returned")
+
+        stats = memory_cache.stats()
+        self.assertEqual(stats["entries"], 2, "Entry budget not enforced")
+        self.assertEqual(stats["evictions"], 1, "Evictions not counted")
+        self.assertEqual(stats["hits"], 2, "Hits not counted")
+        self.assertEqual(stats["misses"], 3, "Misses not counted")
+
+        # Byte budget
+        memory_cache = memory.MemoryCache(max_bytes=memory_cache._entry_size("1 Long Street", self.test_result))
+        memory_cache.put("MockGeocoder", "1 Long Street", self.test_result)
+        memory_cache.put("MockGeocoder", "2 Long Street", self.test_result)
+        self.assertEqual(memory_cache.stats()["entries"], 1, "Byte budget not enforced")
+
+
+if __name__ == '__main__':
+    import unittest
+
+    unittest.main()
@@ -0,0 +1,547 @@
+# coding: utf-8
+
+from __future__ import absolute_import
+import asyncio
+import http.server
+import json
+import os
+import tempfile
+import threading
+import time
+
+from cape_of_good_place_names.geocoder_upstream import aio, breaker, coalesce, executor, hedging, limits, selection, \
+    sessions
+from cape_of_good_place_names.test import BaseTestCase
+
+
+class KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"lat": -33.9, "lon": 18.4}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestGeocoderUpstream(BaseTestCase):
+    """Unit tests for the controls on requests to the upstream geocoders"""
+
+    def test_token_bucket(self):
+        """Testing that the token bucket allows a burst, and then spaces out the requests
+
+        """
+        bucket = limits.TokenBucket(rate=10, burst=2)
+        self.assertEqual(bucket.reserve(), 0, "Burst not allowed")
+        self.assertEqual(bucket.reserve(), 0, "Burst not allowed")
+
+        wait = bucket.reserve()
+        self.assertAlmostEqual(wait, 0.1, delta=0.01, msg="Requests beyond the burst not being spaced out")
+        self.assertAlmostEqual(bucket.reserve(), wait + 0.1, delta=0.01, msg="Waiting requests not being queued")
+
+        self.assertIsNone(bucket.reserve(max_wait=0.1), "Wait longer than max_wait allowed")
+
+    def test_geocoder_limiter(self):
+        """Testing that the limiter caps the requests in flight, and gives up on requests that wait for too long
+
+        """
+        limiter = limits.GeocoderLimiter({"MockGeocoder": {"max_in_flight": 2}}, max_wait=0.5)
+
+        # Unlimited geocoders aren't held up
+        with limiter.limit("MockGeocoder2") as wait:
+            self.assertEqual(wait, 0, "Unlimited geocoder waiting")
+
+        in_flight = []
+        max_in_flight = []
+        lock = threading.Lock()
+
+        def _request():
+            with limiter.limit("MockGeocoder"):
+                with lock:
+                    in_flight.append(1)
+                    max_in_flight.append(len(in_flight))
+                time.sleep(0.05)
+                with lock:
+                    in_flight.pop()
+
+        threads = [threading.Thread(target=_request) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(max(max_in_flight), 2, "More requests in flight than allowed")
+        self.assertDictEqual(limiter.stats()["MockGeocoder"],
+                             {"max_in_flight": 2, "requests_per_second": None, "in_flight": 0, "waiting": 0,
+                              "rejected": 0},
+                             "Limiter stats not tracked correctly")
+
+        # Requests that wait for too long are given up on
+        with limiter.limit("MockGeocoder"), limiter.limit("MockGeocoder"):
+            with self.assertRaises(limits.GeocoderLimitExceeded):
+                with limiter.limit("MockGeocoder"):
+                    pass
+        self.assertEqual(limiter.stats()["MockGeocoder"]["rejected"], 1, "Rejected request not counted")
+
+        # ...as are requests whose caller has given up on them, even if they could wait for longer
+        with limiter.limit("MockGeocoder"), limiter.limit("MockGeocoder"):
+            start = time.monotonic()
+            with self.assertRaises(limits.GeocoderLimitExceeded):
+                with limiter.limit("MockGeocoder", deadline=start + 0.05):
+                    pass
+            self.assertLess(time.monotonic() - start, 0.25, "Request waiting past its deadline")
+        self.assertEqual(limiter.stats()["MockGeocoder"]["rejected"], 2, "Abandoned request not counted")
+
+        with limiter.limit("MockGeocoder") as wait:
+            self.assertLess(wait, 0.5, "Slots not released by rejected requests")
+
+    def test_circuit_breaker(self):
+        """Testing that circuits open once enough requests fail, and close again once a probe succeeds
+
+        """
+        circuit_breaker = breaker.GeocoderCircuitBreaker(window=60, failure_rate=0.5, min_requests=4,
+                                                         open_duration=0.1)
+
+        def _request(success):
+            token = circuit_breaker.allow("MockGeocoder")
+            if token is not None:
+                circuit_breaker.record("MockGeocoder", token, success)
+            return token is not None
+
+        # Failures below the failure rate, or the minimum number of requests, don't open the circuit
+        for success in (True, True, False):
+            self.assertTrue(_request(success), "Request not allowed")
+        self.assertEqual(circuit_breaker.state("MockGeocoder"), breaker.STATE_CLOSED, "Circuit opened too soon")
+
+        self.assertTrue(_request(False), "Request not allowed")
+        self.assertEqual(circuit_breaker.state("MockGeocoder"), breaker.STATE_OPEN, "Circuit not opened")
+        self.assertFalse(_request(True), "Request allowed while open")
+        self.assertEqual(circuit_breaker.state("MockGeocoder2"), breaker.STATE_CLOSED, "Circuits shared by geocoders")
+
+        # Only a single probe at a time, and a failed probe opens the circuit again
+        time.sleep(0.1)
+        self.assertEqual(circuit_breaker.state("MockGeocoder"), breaker.STATE_HALF_OPEN, "Circuit not half open")
+        probe_token = circuit_breaker.allow("MockGeocoder")
+        self.assertIsNotNone(probe_token, "Probe not allowed")
+        self.assertIsNone(circuit_breaker.allow("MockGeocoder"), "More than one probe allowed")
+        circuit_breaker.record("MockGeocoder", probe_token, False)
+        self.assertEqual(circuit_breaker.state("MockGeocoder"), breaker.STATE_OPEN, "Circuit not reopened")
+
+        # ...and a successful probe closes it
+        time.sleep(0.1)
+        self.assertTrue(_request(True), "Probe not allowed")
+        self.assertEqual(circuit_breaker.state("MockGeocoder"), breaker.STATE_CLOSED, "Circuit not closed")
+
+        stats = circuit_breaker.stats()["MockGeocoder"]
+        self.assertEqual(stats["opened"], 2, "Circuit openings not counted")
+        self.assertEqual(stats["rejected"], 2, "Rejected requests not counted")
+
+    def test_single_flight(self):
+        """Testing that concurrent calls with the same key share a single call
+
+        """
+        single_flight = coalesce.SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def _slow_call(value):
+            calls.append(value)
+            started.set()
+            release.wait(5)
+            return value
+
+        results = {}
+
+        def _do(name, key):
+            results[name] = single_flight.do(key, _slow_call, name)
+
+        leader = threading.Thread(target=_do, args=("leader", "12 long street"))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=_do, args=(f"follower-{i}", "12 long street")) for i in range(3)]
+        for follower in followers:
+            follower.start()
+        other = threading.Thread(target=_do, args=("other", "1 loop street"))
+        other.start()
+
+        # Waiting for the followers to join the leader's call
+        for _ in range(100):
+            if single_flight.stats()["coalesced"] == 3:
+                break
+            time.sleep(0.01)
+        release.set()
+        for thread in [leader, *followers, other]:
+            thread.join()
+
+        self.assertListEqual(sorted(calls), ["leader", "other"], "Concurrent calls with the same key not coalesced")
+        self.assertTupleEqual(results["leader"], ("leader", False), "Leader's result not returned")
+        for i in range(3):
+            self.assertTupleEqual(results[f"follower-{i}"], ("leader", True), "Leader's result not shared")
+        self.assertDictEqual(single_flight.stats(), {"in_flight": 0, "calls": 2, "coalesced": 3},
+                             "Single flight stats not tracked correctly")
+
+        # Failures are shared too, and the key is free again afterwards
+        def _failing_call():
+            raise ValueError("Upstream failure")
+
+        with self.assertRaises(ValueError):
+            single_flight.do("12 long street", _failing_call)
+        self.assertTupleEqual(single_flight.do("12 long street", _slow_call, "again"), ("again", False),
+                              "Key not released after a call")
+
+    def test_geocoder_executor(self):
+        """Testing that the executor runs requests on its named workers, and rejects them once its queue is full
+
+        """
+        geocoder_executor = executor.GeocoderExecutor(max_workers=2, max_queued=1)
+        release = threading.Event()
+
+        def _request():
+            release.wait(5)
+            return threading.current_thread().name
+
+        futures = [geocoder_executor.submit(_request) for _ in range(3)]
+        with self.assertRaises(executor.GeocoderExecutorSaturated):
+            geocoder_executor.submit(_request)
+
+        stats = geocoder_executor.stats()
+        self.assertEqual(stats["queued"] + stats["active"], 3, "Requests in flight not tracked")
+        self.assertEqual(stats["rejected"], 1, "Rejected request not counted")
+
+        release.set()
+        for future in futures:
+            self.assertTrue(future.result().startswith("cogpn-geocoder"), "Worker threads not named")
+
+        # Blocking submissions wait for space in the queue, rather than being rejected
+        release.clear()
+        futures = [geocoder_executor.submit(_request) for _ in range(3)]
+        threading.Timer(0.1, release.set).start()
+        self.assertTrue(geocoder_executor.submit(_request, block=True).result().startswith("cogpn-geocoder"),
+                        "Blocking submission not run")
+        for future in futures:
+            future.result()
+
+        stats = geocoder_executor.stats()
+        self.assertEqual(stats["completed"], 7, "Completed requests not counted")
+        self.assertEqual(stats["queue_wait"]["count"], 7, "Queue wait times not recorded")
+        self.assertEqual(stats["queued"] + stats["active"], 0, "Finished requests still in flight")
+        geocoder_executor.shutdown()
+
+    def test_http_session_pool(self):
+        """Testing that the session pool reuses connections across requests and threads, and drops idle connections
+
+        """
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/search"
+
+        session_pool = sessions.HttpSessionPool(pool_size=2, idle_timeout=0.2)
+        try:
+            for _ in range(5):
+                self.assertEqual(session_pool.get(url, timeout=5).json()["lat"], -33.9, "Request not made")
+
+            stats = session_pool.stats()
+            self.assertEqual(stats["requests"], 5, "Requests not counted")
+            self.assertEqual(stats["connections"], 1, "Connection not kept alive")
+            self.assertEqual(stats["reused"], 4, "Connection reuse not counted")
+
+            # Threads share the pool's connections
+            threads = [threading.Thread(target=session_pool.get, args=(url,), kwargs={"timeout": 5})
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertLessEqual(session_pool.stats()["connections"], 1 + len(threads),
+                                 "Connections opened for more than each request")
+            self.assertEqual(session_pool.stats()["requests"], 9, "Requests across threads not counted")
+
+            # Idle connections are dropped, and a fresh one opened
+            connections = session_pool.stats()["connections"]
+            time.sleep(0.3)
+            session_pool.get(url, timeout=5)
+            stats = session_pool.stats()
+            self.assertEqual(stats["idle_resets"], 1, "Idle connections not dropped")
+            self.assertEqual(stats["connections"], connections + 1, "Fresh connection not opened")
+            self.assertEqual(stats["requests"], 10, "Requests before the reset not counted")
+        finally:
+            session_pool.close()
+            server.shutdown()
+            server.server_close()
+
+    def test_async_geocoder_adapter(self):
+        """Testing that the async adapter awaits native geocoders on the event loop, and runs the rest on the executor
+
+        """
+        class BlockingGeocoder(object):
+            def geocode(self, address):
+                return address, threading.current_thread().name
+
+        class NativeGeocoder(object):
+            async def geocode_async(self, address):
+                return address, threading.current_thread().name
+
+        event_loop = aio.EventLoopThread()
+        geocoder_executor = executor.GeocoderExecutor(max_workers=2)
+        try:
+            blocking_adapter = aio.AsyncGeocoderAdapter(BlockingGeocoder(), geocoder_executor)
+            native_adapter = aio.AsyncGeocoderAdapter(NativeGeocoder(), geocoder_executor)
+            self.assertFalse(blocking_adapter.native, "Blocking geocoder treated as native")
+            self.assertTrue(native_adapter.native, "Native geocoder not detected")
+
+            _, blocking_thread = event_loop.submit(blocking_adapter.geocode("1 Long Street")).result(5)
+            self.assertTrue(blocking_thread.startswith("cogpn-geocoder"), "Blocking geocoder not run on the executor")
+            _, native_thread = event_loop.submit(native_adapter.geocode("1 Long Street")).result(5)
+            self.assertEqual(native_thread, "cogpn-geocode-loop", "Native geocoder not awaited on the event loop")
+
+            # Async limits are shared with the threads, and don't block the event loop
+            limiter = limits.GeocoderLimiter({"MockGeocoder": {"max_in_flight": 1}}, max_wait=0.1)
+
+            async def _limited_request():
+                async with limiter.limit_async("MockGeocoder") as wait:
+                    await asyncio.sleep(0.05)
+                    return wait
+
+            async def _limited_requests():
+                return await asyncio.gather(_limited_request(), _limited_request())
+
+            waits = event_loop.submit(_limited_requests()).result(5)
+            self.assertAlmostEqual(max(waits), 0.05, delta=0.04, msg="Async request not waiting its turn")
+
+            with limiter.limit("MockGeocoder"):
+                with self.assertRaises(limits.GeocoderLimitExceeded):
+                    event_loop.submit(_limited_request()).result(5)
+            self.assertEqual(limiter.stats()["MockGeocoder"]["rejected"], 1, "Rejected async request not counted")
+
+            # Async calls are coalesced with threaded ones
+            single_flight = coalesce.SingleFlight()
+            release = threading.Event()
+
+            def _blocking_call():
+                release.wait(5)
+                return "threaded"
+
+            async def _async_call():
+                return "async"
+
+            leader = threading.Thread(target=single_flight.do, args=("12 long street", _blocking_call))
+            leader.start()
+            while single_flight.stats()["in_flight"] == 0:
+                time.sleep(0.01)
+            follower = event_loop.submit(single_flight.do_async("12 long street", _async_call))
+            time.sleep(0.05)
+            release.set()
+            leader.join()
+            self.assertTupleEqual(follower.result(5), ("threaded", True), "Async call not coalesced")
+        finally:
+            event_loop.close()
+            geocoder_executor.shutdown()
+
+    def test_geocoder_selector(self):
+        """Testing that the selector skips geocoders that don't contribute, per kind of address, and that its statistics
+        survive a restart
+
+        """
+        self.assertEqual(selection.address_kind("12 Long Street, Cape Town"), selection.KIND_STREET)
+        self.assertEqual(selection.address_kind("Cnr Long and Wale Streets"), selection.KIND_INTERSECTION)
+        self.assertEqual(selection.address_kind("Groote Schuur Hospital"), selection.KIND_PLACE)
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            stats_file = os.path.join(tempdir, "stats.json")
+            selector = selection.GeocoderSelector(stats_file=stats_file, min_samples=4, min_contribution=0.5,
+                                                  exploration=0)
+
+            for i in range(4):
+                selector.record_answer("MockGeocoder", f"{i} Long Street", 0.1, located=True)
+                selector.record_agreement("MockGeocoder", f"{i} Long Street", agreed=True)
+                # Usually empty, and an outlier when it isn't
+                selector.record_answer("MockGeocoder2", f"{i} Long Street", 0.1, located=(i == 0))
+                selector.record_agreement("MockGeocoder2", f"{i} Long Street", agreed=False)
+                # Slow, but with good answers
+                selector.record_answer("SlowMockGeocoder", f"{i} Long Street", 2, located=True)
+
+            self.assertEqual(selector.expected_contribution("MockGeocoder", "5 Long Street"), 1)
+            self.assertEqual(selector.expected_contribution("MockGeocoder2", "5 Long Street"), 0)
+            self.assertFalse(selector.should_skip("MockGeocoder", "5 Long Street"), "Contributing geocoder skipped")
+            self.assertTrue(selector.should_skip("MockGeocoder2", "5 Long Street"), "Outlier geocoder not skipped")
+            self.assertFalse(selector.should_skip("MockGeocoder2", "Groote Schuur Hospital"),
+                             "Geocoder skipped for a kind of address it hasn't answered for")
+            self.assertFalse(selector.should_skip("SlowMockGeocoder", "5 Long Street", timeout=5),
+                             "Geocoder skipped even though it answers in time")
+            self.assertTrue(selector.should_skip("SlowMockGeocoder", "5 Long Street", timeout=1),
+                            "Geocoder skipped even though it answers too late")
+
+            stats = selector.stats()["MockGeocoder2"][selection.KIND_STREET]
+            self.assertEqual(stats["answers"], 4, "Answers not counted")
+            self.assertEqual(stats["null_rate"], 0.75, "Null rate not worked out correctly")
+            self.assertEqual(stats["agreement_rate"], 0, "Agreement rate not worked out correctly")
+
+            # Picking up where it left off after a restart
+            selector.save()
+            restarted_selector = selection.GeocoderSelector(stats_file=stats_file, min_samples=4, min_contribution=0.5,
+                                                            exploration=0)
+            self.assertDictEqual(restarted_selector.stats(), selector.stats(), "Statistics not persisted")
+            self.assertTrue(restarted_selector.should_skip("MockGeocoder2", "5 Long Street"),
+                            "Persisted statistics not used")
+
+            # Only the latest selector for the stats file saves it at exit, so a replaced one can't overwrite it...
+            restarted_selector.record_answer("MockGeocoder", "Groote Schuur Hospital", 0.1, located=True)
+            selection._save_at_exit(os.path.abspath(stats_file))
+            with open(stats_file) as saved_file:
+                saved_windows = json.load(saved_file)["windows"]
+            self.assertIn(selection.KIND_PLACE, [window["kind"] for window in saved_windows],
+                          "Statistics saved at exit by a replaced selector")
+
+            # ...and once it has been closed, it doesn't either
+            restarted_selector.close()
+            os.remove(stats_file)
+            selection._save_at_exit(os.path.abspath(stats_file))
+            self.assertFalse(os.path.exists(stats_file), "Statistics saved at exit by a closed selector")
+
+            # Unreadable statistics are started afresh
+            with open(stats_file, "w") as corrupt_file:
+                corrupt_file.write("{")
+            corrupt_selector = selection.GeocoderSelector(stats_file=stats_file)
+            self.assertDictEqual(corrupt_selector.stats(), {}, "Unreadable statistics not ignored")
+            corrupt_selector.close()
+
+    def test_geocoder_hedger(self):
+        """Testing that slow requests are hedged, that the first answer is used, and that hedges are kept to the budget
+
+        """
+        class TailGeocoder(object):
+            """Slow for its first request, fast after that"""
+
+            def __init__(self):
+                self.calls = 0
+                self.lock = threading.Lock()
+
+            def geocode(self, address):
+                with self.lock:
+                    self.calls += 1
+                    call = self.calls
+                time.sleep(1 if call == 1 else 0.01)
+                return address, call
+
+            async def geocode_async(self, address):
+                with self.lock:
+                    self.calls += 1
+                    call = self.calls
+                await asyncio.sleep(1 if call == 1 else 0.01)
+                return address, call
+
+        selector = selection.GeocoderSelector(min_samples=4)
+        for latency in (0.01, 0.02, 0.03, 0.5):
+            selector.record_answer("TailGeocoder", "1 Long Street", latency, located=True)
+        self.assertEqual(selector.latency_quantile("TailGeocoder", "2 Long Street", 0.5), 0.03)
+        self.assertIsNone(selector.latency_quantile("TailGeocoder", "Groote Schuur Hospital", 0.5),
+                          "Quantile worked out without enough latencies")
+
+        hedger = hedging.GeocoderHedger(geocoders=["TailGeocoder"], budget=1, max_burst=1, workers=4)
+        try:
+            self.assertTrue(hedger.hedges("TailGeocoder"))
+            self.assertFalse(hedger.hedges("MockGeocoder"), "Geocoder hedged without being configured to be")
+
+            # Threaded, the hedge answers first
+            geocoder = TailGeocoder()
+            start = time.monotonic()
+            _, call = hedger.call("TailGeocoder", 0.05, lambda: geocoder.geocode("1 Long Street"))
+            self.assertEqual(call, 2, "Hedge's answer not used")
+            self.assertLess(time.monotonic() - start, 0.5, "Waited for the slow request")
+
+            # Failed hedges fall back on the original request
+            geocoder = TailGeocoder()
+            _, call = hedger.call("TailGeocoder", 0.05, lambda: geocoder.geocode("1 Long Street"), lambda: None)
+            self.assertEqual(call, 1, "Original request's answer not used when the hedge failed")
+
+            # Async, the slow request is cancelled
+            event_loop = aio.EventLoopThread()
+            try:
+                geocoder = TailGeocoder()
+                _, call = event_loop.submit(
+                    hedger.call_async("TailGeocoder", 0.05, lambda: geocoder.geocode_async("1 Long Street"))
+                ).result(5)
+                self.assertEqual(call, 2, "Async hedge's answer not used")
+            finally:
+                event_loop.close()
+
+            stats = hedger.stats()["TailGeocoder"]
+            self.assertEqual(stats["hedged"], 3, "Hedges not counted")
+            self.assertEqual(stats["hedge_wins"], 2, "Hedge wins not counted")
+
+            # Failures that finish alongside a successful request don't hide it
+            for _ in range(10):
+                hedge_started = threading.Event()
+
+                def _failing_geocode():
+                    hedge_started.wait(5)
+                    raise ValueError("Upstream error")
+
+                def _hedge_geocode():
+                    hedge_started.set()
+                    return "1 Long Street", "hedge"
+
+                _, answer = hedger.call("TailGeocoder", 0.01, _failing_geocode, _hedge_geocode)
+                self.assertEqual(answer, "hedge", "Failed request's outcome used over the successful hedge")
+
+            event_loop = aio.EventLoopThread()
+            try:
+                # Both async requests are cancelled if the call itself is
+                cancelled = []
+
+                async def _stuck_geocode():
+                    try:
+                        await asyncio.sleep(5)
+                    except asyncio.CancelledError:
+                        cancelled.append(1)
+                        raise
+
+                call_future = event_loop.submit(hedger.call_async("TailGeocoder", 0.01, _stuck_geocode))
+                time.sleep(0.1)
+                call_future.cancel()
+                time.sleep(0.1)
+                self.assertEqual(len(cancelled), 2, "Requests left running after their call was cancelled")
+            finally:
+                event_loop.close()
+
+            # Once the budget is spent, requests aren't hedged
+            stingy_hedger = hedging.GeocoderHedger(geocoders=["TailGeocoder"], budget=0.5, max_burst=1, workers=4)
+            try:
+                geocoder = TailGeocoder()
+                _, call = stingy_hedger.call("TailGeocoder", 0.05, lambda: geocoder.geocode("1 Long Street"))
+                self.assertEqual(call, 1, "Request hedged over budget")
+                self.assertEqual(stingy_hedger.stats()["TailGeocoder"]["budget_exhausted"], 1,
+                                 "Exhausted budget not counted")
+            finally:
+                stingy_hedger.shutdown()
+
+            # ...nor are they while the geocoder's limits have no room for them
+            limiter = limits.GeocoderLimiter({"TailGeocoder": {"max_in_flight": 1}}, max_wait=5)
+            self.assertTrue(limiter.has_capacity("TailGeocoder"), "Idle geocoder's limits have no room")
+
+            def _limited_geocode():
+                with limiter.limit("TailGeocoder"):
+                    return geocoder.geocode("1 Long Street")
+
+            geocoder = TailGeocoder()
+            start = time.monotonic()
+            _, call = hedger.call("TailGeocoder", 0.05, _limited_geocode,
+                                  can_hedge=lambda: limiter.has_capacity("TailGeocoder"))
+            self.assertEqual(call, 1, "Request hedged without room in the limits")
+            self.assertEqual(geocoder.calls, 1, "Hedge made without room in the limits")
+            self.assertLess(time.monotonic() - start, 2, "Hedge waited for the limits")
+            self.assertEqual(hedger.stats()["TailGeocoder"]["limited"], 1, "Limited hedge not counted")
+        finally:
+            hedger.shutdown()
+
+
+if __name__ == '__main__':
+    import unittest
+
+    unittest.main()
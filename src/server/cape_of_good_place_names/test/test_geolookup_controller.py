@@ -8,6 +8,8 @@ from flask import json, current_app
 from six import BytesIO
 
 from cape_of_good_place_names import util
+from cape_of_good_place_names.config import config
+from cape_of_good_place_names.geocoder_cache import FileCacheBackend
 from cape_of_good_place_names.models.error import Error  # noqa: E501
 from cape_of_good_place_names.models.geolookup_results import GeolookupResults  # noqa: E501
 from cape_of_good_place_names.test import BaseTestCase
@@ -19,6 +21,10 @@ class GeoLookupTestConfig(object):
     USER_SECRETS_SALT_KEY = ""
     GEOCODERS = []
     GEOCODERS_MIN = 0
+    GEOCODER_CACHE_DIR = tempfile.gettempdir()
+    GEOCODER_CACHE_BACKEND = (
+        FileCacheBackend, {"cache_dir": [config.ConfigNamespace.CONFIG, "GEOCODER_CACHE_DIR"]}
+    )
     SCRUBBERS = []
     SCRUBBERS_MIN = 0
 
@@ -2,11 +2,14 @@
 
 from __future__ import absolute_import
 import base64
+import tempfile
 
 from flask import json, current_app
 from six import BytesIO
 
 from cape_of_good_place_names import util
+from cape_of_good_place_names.config import config
+from cape_of_good_place_names.geocoder_cache import FileCacheBackend
 from cape_of_good_place_names.test import BaseTestCase
 
 
@@ -28,6 +31,10 @@ class ScrubTestConfig(object):
     USER_SECRETS_SALT_KEY = ""
     GEOCODERS = []
     GEOCODERS_MIN = 0
+    GEOCODER_CACHE_DIR = tempfile.gettempdir()
+    GEOCODER_CACHE_BACKEND = (
+        FileCacheBackend, {"cache_dir": [config.ConfigNamespace.CONFIG, "GEOCODER_CACHE_DIR"]}
+    )
 
 
 class TestScrubController(BaseTestCase):
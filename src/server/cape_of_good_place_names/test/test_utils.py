@@ -1,13 +1,17 @@
 # coding: utf-8
 
 from __future__ import absolute_import
+import asyncio
 import random
 import tempfile
 
 from flask import json, current_app
+from geocode_array import Nominatim
 
 from cape_of_good_place_names import util
 from cape_of_good_place_names.config import config
+from cape_of_good_place_names.geocoder_cache import FileCacheBackend
+from cape_of_good_place_names.geocoder_upstream import HttpSessionPool
 from cape_of_good_place_names.test import BaseTestCase, test_geocode_controller, test_scrub_controller
 
 
@@ -15,6 +19,10 @@ class UtilsTestConfig(object):
     TIMEZONE = "Africa/Johannesburg"
     GEOCODERS = []
     GEOCODERS_MIN = 0
+    GEOCODER_CACHE_DIR = tempfile.gettempdir()
+    GEOCODER_CACHE_BACKEND = (
+        FileCacheBackend, {"cache_dir": [config.ConfigNamespace.CONFIG, "GEOCODER_CACHE_DIR"]}
+    )
     SCRUBBERS = []
     SCRUBBERS_MIN = 0
     USER_SECRETS_FILE = ""
@@ -46,6 +54,7 @@ class TestUtils(BaseTestCase):
             (test_geocode_controller.MockGeocoder, {}),
         )
         current_app.config.from_object(tc)
+        util.flush_caches()
 
         # Testing that we get back an instance of the configured geocoder
         gc, *_ = util.get_geocoders()
@@ -126,6 +135,100 @@ class TestUtils(BaseTestCase):
 
             self.assertEqual(len(util.get_geocoders(flush_cache=True)), 2, "Wrong number of geocoders being returned")
 
+    def test_shared_config_namespace(self):
+        """Testing that shared objects are passed to the classes that accept them, and left out for the others
+
+        """
+        class SessionMockGeocoder(test_geocode_controller.MockGeocoder):
+            def __init__(self, session=None):
+                super().__init__()
+                self.session = session
+
+        class NoSessionMockGeocoder(test_geocode_controller.MockGeocoder):
+            def __init__(self):
+                super().__init__()
+
+        tc = UtilsTestConfig()
+        tc.GEOCODERS = (
+            (SessionMockGeocoder, {"session": [config.ConfigNamespace.SHARED, "GEOCODER_HTTP_SESSIONS"]}),
+            (NoSessionMockGeocoder, {"session": [config.ConfigNamespace.SHARED, "GEOCODER_HTTP_SESSIONS"]}),
+        )
+        current_app.config.from_object(tc)
+        with self.assertLogs(current_app.logger, "WARNING") as logs:
+            util.flush_caches()
+
+        gc, gc2 = util.get_geocoders()
+        self.assertIsInstance(gc.session, HttpSessionPool, "Shared object not being passed to the geocoder")
+        self.assertIs(gc.session, util.get_geocoder_http_sessions(), "Geocoder not being given the shared object")
+        self.assertIsInstance(gc2, NoSessionMockGeocoder,
+                              "Geocoder that doesn't accept the shared object not being configured")
+        self.assertTrue(any("'NoSessionMockGeocoder' doesn't accept 'session'" in line for line in logs.output),
+                        "Geocoder that doesn't accept the shared object not warned about")
+        self.assertFalse(any("'SessionMockGeocoder'" in line for line in logs.output),
+                         "Geocoder holding on to the shared object warned about")
+
+    def test_shared_config_namespace_geocode_array(self):
+        """Testing that the geocode_array geocoders are either given the shared HTTP sessions, and hold on to them, or
+        are warned about
+
+        """
+        tc = UtilsTestConfig()
+        tc.GEOCODERS = (
+            (Nominatim.Nominatim, {"session": [config.ConfigNamespace.SHARED, "GEOCODER_HTTP_SESSIONS"]}),
+        )
+        current_app.config.from_object(tc)
+        with self.assertLogs(current_app.logger, "DEBUG") as logs:
+            util.flush_caches()
+
+        gc, = util.get_geocoders()
+        self.assertIsInstance(gc, Nominatim.Nominatim, "geocode_array geocoder not being configured")
+        holds_sessions = any(value is util.get_geocoder_http_sessions() for value in vars(gc).values())
+        warned = any(line.startswith("WARNING") and "'Nominatim'" in line and "'session'" in line
+                     for line in logs.output)
+        self.assertTrue(holds_sessions or warned,
+                        "geocode_array geocoder not using the shared HTTP sessions, without a warning")
+        self.assertFalse(holds_sessions and warned, "geocode_array geocoder using the shared HTTP sessions warned about")
+
+    def test_get_geocoder_cache(self):
+        """Vanilla test case for get_geocoder_cache
+
+        Utility function for setting up and configuring the geocoder cache backend
+        """
+        # Setting up config object
+        tc = UtilsTestConfig()
+        current_app.config.from_object(tc)
+
+        util.get_geocoder_cache(flush_cache=True)
+        cache_backend = util.get_geocoder_cache()
+        self.assertIsInstance(cache_backend, FileCacheBackend,
+                              "config is not plumbing through to get_geocoder_cache correctly")
+        self.assertEqual(str(cache_backend.cache_dir), tc.GEOCODER_CACHE_DIR,
+                         "get_geocoder_cache not configuring the backend correctly")
+
+        # Checking that the cache is working
+        cache_backend2 = util.get_geocoder_cache()
+        self.assertIs(cache_backend, cache_backend2, "get_geocoder_cache cache is not working as expected")
+
+    def test_flush_caches(self):
+        """Testing that flushing the caches shuts down the objects being replaced
+
+        """
+        tc = UtilsTestConfig()
+        current_app.config.from_object(tc)
+        util.flush_caches()
+
+        geocoder_executor = util.get_geocoder_executor()
+        event_loop = util.get_geocode_event_loop()
+        self.assertEqual(event_loop.submit(asyncio.sleep(0, result=1)).result(5), 1, "Event loop not running")
+
+        util.flush_caches()
+        self.assertIsNot(util.get_geocoder_executor(), geocoder_executor, "Geocoder executor not replaced")
+        with self.assertRaises(RuntimeError):
+            geocoder_executor.submit(print)
+        self.assertTrue(event_loop.loop.is_closed(), "Replaced event loop not closed")
+        self.assertEqual(util.get_geocode_event_loop().submit(asyncio.sleep(0, result=1)).result(5), 1,
+                         "Replacement event loop not running")
+
     def test_get_scrubbers(self):
         """Vanilla test case for get_scrubbers
 
@@ -137,6 +240,7 @@ class TestUtils(BaseTestCase):
             (test_scrub_controller.MockScrubber, {}),
         )
         current_app.config.from_object(tc)
+        util.flush_caches()
 
         # Testing that we get back an instance of the configured geocoder
         sc, *_ = util.get_scrubbers()
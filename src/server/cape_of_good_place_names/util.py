@@ -1,6 +1,7 @@
 import datetime
 import functools
 import hashlib
+import inspect
 from json.decoder import JSONDecodeError
 import os
 import pprint
@@ -10,7 +11,9 @@ import pytz
 import six
 import typing
 
+from cape_of_good_place_names import metrics
 from cape_of_good_place_names.config import config
+from cape_of_good_place_names.geocoder_upstream import EventLoopThread, SingleFlight
 
 
 def _deserialize(data, klass):
@@ -175,10 +178,28 @@ def secure_mode(flush_cache=False):
     return user_secrets_file_exists and user_secrets_salt_exists
 
 
+def _accepts_param(klass, param):
+    try:
+        signature = inspect.signature(klass)
+    except (TypeError, ValueError):
+        return True
+
+    return param in signature.parameters or any(
+        klass_param.kind is inspect.Parameter.VAR_KEYWORD for klass_param in signature.parameters.values()
+    )
+
+
+def _holds_object(instance, obj):
+    """Whether the instance holds on to obj as one of its attributes, assumed so if it doesn't have any to check"""
+    instance_attributes = getattr(instance, "__dict__", None)
+    return instance_attributes is None or any(value is obj for value in instance_attributes.values())
+
+
 def _config_spec_instantiator(config_spec):
     for klass, klass_params_lookup_dict in config_spec:
         current_app.logger.debug(f"Attempting to configure '{klass.__name__}'...")
         klass_params = {}
+        shared_params = []
 
         skip_flag = False
         if len(klass_params_lookup_dict):
@@ -187,9 +208,17 @@ def _config_spec_instantiator(config_spec):
                 assert isinstance(lookup_namespace, config.ConfigNamespace), (
                     f"'{lookup_namespace}' is not a valid config namespace!"
                 )
+                # Shared objects are optional, so are only passed to classes that accept them
+                if lookup_namespace is config.ConfigNamespace.SHARED and not _accepts_param(klass, param):
+                    current_app.logger.warning(f"'{klass.__name__}' doesn't accept '{param}', so is configured "
+                                               f"without the shared {'/'.join(lookup_path)}")
+                    continue
+
                 # Setting the root of the lookup path
                 if lookup_namespace is config.ConfigNamespace.CONFIG:
                     lookup_value = current_app.config
+                elif lookup_namespace is config.ConfigNamespace.SHARED:
+                    lookup_value = _get_shared_objects()
                 else:
                     lookup_value = get_secrets() if secure_mode() else {}
 
@@ -207,9 +236,11 @@ def _config_spec_instantiator(config_spec):
                     break
 
                 current_app.logger.debug(
-                    f"Value is {lookup_value if lookup_namespace is not config.ConfigNamespace.SECRETS else '<REDACTED>'}"
+                    f"Value is {lookup_value if lookup_namespace is config.ConfigNamespace.CONFIG else '<REDACTED>'}"
                 )
                 klass_params[param] = lookup_value
+                if lookup_namespace is config.ConfigNamespace.SHARED:
+                    shared_params.append(param)
 
         if skip_flag:
             current_app.logger.warning(f"Skipping '{klass.__name__}'!")
@@ -220,11 +251,20 @@ def _config_spec_instantiator(config_spec):
 
         try:
             instantiated_obj = klass(**klass_params)
+            for param in shared_params:
+                if not _holds_object(instantiated_obj, klass_params[param]):
+                    current_app.logger.warning(f"'{klass.__name__}' accepts '{param}', but doesn't hold on to it, "
+                                               f"so might not be using it")
             yield instantiated_obj
         except Exception as e:
             current_app.logger.warning(f"Skipping '{klass.__name__}' because '{e.__class__.__name__}: {e}")
 
 
+def _get_component_config(config_key):
+    # Components left out of the config are set up with their defaults
+    return current_app.config.get(config_key, config.DEFAULT_COMPONENTS[config_key])
+
+
 @functools.lru_cache(1)
 def get_geocoders(flush_cache=False):
     current_app.logger.debug("Getting geocoders...")
@@ -237,6 +277,164 @@ def get_geocoders(flush_cache=False):
     return geocoders
 
 
+@functools.lru_cache(1)
+def get_geocoder_cache(flush_cache=False):
+    current_app.logger.debug("Getting geocoder cache...")
+
+    cache_config = current_app.config["GEOCODER_CACHE_BACKEND"]
+    cache_backends = list(_config_spec_instantiator((cache_config,)))
+
+    assert len(cache_backends) == 1, "Geocoder cache backend could not be configured"
+    cache_backend, *_ = cache_backends
+
+    return cache_backend
+
+
+@functools.lru_cache(1)
+def get_geocoder_memory_cache(flush_cache=False):
+    current_app.logger.debug("Getting geocoder memory cache...")
+
+    memory_cache_config = _get_component_config("GEOCODER_MEMORY_CACHE")
+    memory_caches = list(_config_spec_instantiator((memory_cache_config,)))
+
+    assert len(memory_caches) == 1, "Geocoder memory cache could not be configured"
+    memory_cache, *_ = memory_caches
+
+    return memory_cache
+
+
+@functools.lru_cache(1)
+def get_geocoder_cache_refresher(flush_cache=False):
+    current_app.logger.debug("Getting geocoder cache refresher...")
+
+    refresher_config = _get_component_config("GEOCODER_CACHE_REFRESHER")
+    refreshers = list(_config_spec_instantiator((refresher_config,)))
+
+    assert len(refreshers) == 1, "Geocoder cache refresher could not be configured"
+    refresher, *_ = refreshers
+
+    return refresher
+
+
+@functools.lru_cache(1)
+def get_geocoder_circuit_breaker(flush_cache=False):
+    current_app.logger.debug("Getting geocoder circuit breaker...")
+
+    breaker_config = _get_component_config("GEOCODER_CIRCUIT_BREAKER")
+    breakers = list(_config_spec_instantiator((breaker_config,)))
+
+    assert len(breakers) == 1, "Geocoder circuit breaker could not be configured"
+    breaker, *_ = breakers
+
+    return breaker
+
+
+@functools.lru_cache(1)
+def get_geocoder_executor(flush_cache=False):
+    current_app.logger.debug("Getting geocoder executor...")
+
+    executor_config = _get_component_config("GEOCODER_EXECUTOR")
+    executors = list(_config_spec_instantiator((executor_config,)))
+
+    assert len(executors) == 1, "Geocoder executor could not be configured"
+    executor, *_ = executors
+
+    return executor
+
+
+@functools.lru_cache(1)
+def get_geocoder_limiter(flush_cache=False):
+    current_app.logger.debug("Getting geocoder limiter...")
+
+    limiter_config = _get_component_config("GEOCODER_LIMITER")
+    limiters = list(_config_spec_instantiator((limiter_config,)))
+
+    assert len(limiters) == 1, "Geocoder limiter could not be configured"
+    limiter, *_ = limiters
+
+    return limiter
+
+
+@functools.lru_cache(1)
+def get_geocoder_selector(flush_cache=False):
+    current_app.logger.debug("Getting geocoder selector...")
+
+    selector_config = _get_component_config("GEOCODER_SELECTOR")
+    selectors = list(_config_spec_instantiator((selector_config,)))
+
+    assert len(selectors) == 1, "Geocoder selector could not be configured"
+    selector, *_ = selectors
+
+    return selector
+
+
+@functools.lru_cache(1)
+def get_geocoder_hedger(flush_cache=False):
+    current_app.logger.debug("Getting geocoder hedger...")
+
+    hedger_config = _get_component_config("GEOCODER_HEDGER")
+    hedgers = list(_config_spec_instantiator((hedger_config,)))
+
+    assert len(hedgers) == 1, "Geocoder hedger could not be configured"
+    hedger, *_ = hedgers
+
+    return hedger
+
+
+@functools.lru_cache(1)
+def get_geocoder_http_sessions(flush_cache=False):
+    current_app.logger.debug("Getting geocoder HTTP sessions...")
+
+    sessions_config = _get_component_config("GEOCODER_HTTP_SESSIONS")
+    session_pools = list(_config_spec_instantiator((sessions_config,)))
+
+    assert len(session_pools) == 1, "Geocoder HTTP sessions could not be configured"
+    session_pool, *_ = session_pools
+
+    return session_pool
+
+
+def _get_shared_objects():
+    # Objects that may be referred to using the shared config namespace
+    return {
+        "GEOCODER_HTTP_SESSIONS": get_geocoder_http_sessions(),
+    }
+
+
+@functools.lru_cache(1)
+def get_geocode_job_store(flush_cache=False):
+    current_app.logger.debug("Getting geocode job store...")
+
+    job_store_config = _get_component_config("GEOCODE_JOB_STORE")
+    job_stores = list(_config_spec_instantiator((job_store_config,)))
+
+    assert len(job_stores) == 1, "Geocode job store could not be configured"
+    job_store, *_ = job_stores
+
+    return job_store
+
+
+@functools.lru_cache(1)
+def get_geocoder_single_flight(flush_cache=False):
+    current_app.logger.debug("Getting geocoder single flight...")
+
+    return SingleFlight()
+
+
+@functools.lru_cache(1)
+def get_geocode_event_loop(flush_cache=False):
+    current_app.logger.debug("Getting geocode event loop...")
+
+    return EventLoopThread()
+
+
+@functools.lru_cache(1)
+def get_metrics(flush_cache=False):
+    current_app.logger.debug("Getting metrics registry...")
+
+    return metrics.MetricsRegistry()
+
+
 @functools.lru_cache(1)
 def get_scrubbers(flush_cache=False):
     current_app.logger.debug("Getting scrubbers...")
@@ -330,16 +528,60 @@ def auth_user(username, password):
     return password_check
 
 
+def _close(obj):
+    """Lets go of a replaced object's threads, connections and files, without waiting for its work in progress"""
+    if hasattr(obj, "shutdown"):
+        obj.shutdown(wait=False)
+    elif hasattr(obj, "close"):
+        obj.close()
+
+
 def flush_caches():
     current_app.logger.info("Flushing caches!")
+
+    # Shutting down the objects being replaced, rather than leaving their threads, pools and exit hooks behind
+    for getter in (get_geocoder_http_sessions, get_geocoder_cache, get_geocoder_cache_refresher,
+                   get_geocoder_executor, get_geocoder_selector, get_geocoder_hedger, get_geocode_job_store,
+                   get_geocode_event_loop):
+        if getter.cache_info().currsize:
+            _close(getter())
+
     get_secrets(flush_cache=True)
     get_user_secrets(flush_cache=True)
     secure_mode(flush_cache=True)
+    get_geocoder_http_sessions(flush_cache=True)
     get_geocoders(flush_cache=True)
+    get_geocoder_cache(flush_cache=True)
+    get_geocoder_memory_cache(flush_cache=True)
+    get_geocoder_cache_refresher(flush_cache=True)
+    get_geocoder_circuit_breaker(flush_cache=True)
+    get_geocoder_executor(flush_cache=True)
+    get_geocoder_limiter(flush_cache=True)
+    get_geocoder_selector(flush_cache=True)
+    get_geocoder_hedger(flush_cache=True)
+    # The job store is only set up once it's used, as it needs a GEOCODE_JOBS_DIR that configs without jobs leave out
+    get_geocode_job_store.cache_clear()
+    get_geocoder_single_flight(flush_cache=True)
+    get_geocode_event_loop(flush_cache=True)
+    get_metrics(flush_cache=True)
     get_scrubbers(flush_cache=True)
 
-    get_secrets(flush_cache=False)
-    get_user_secrets(flush_cache=False)
-    secure_mode(flush_cache=False)
-    get_geocoders(flush_cache=False)
-    get_scrubbers(flush_cache=False)
+    # Warming the caches with the same (lack of) arguments that callers use, so that concurrent first calls don't each
+    # end up with their own instance
+    get_secrets()
+    get_user_secrets()
+    secure_mode()
+    get_geocoder_http_sessions()
+    get_geocoders()
+    get_geocoder_cache()
+    get_geocoder_memory_cache()
+    get_geocoder_cache_refresher()
+    get_geocoder_circuit_breaker()
+    get_geocoder_executor()
+    get_geocoder_limiter()
+    get_geocoder_selector()
+    get_geocoder_hedger()
+    get_geocoder_single_flight()
+    get_geocode_event_loop()
+    get_metrics()
+    get_scrubbers()
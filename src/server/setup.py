@@ -26,7 +26,13 @@ setup(
     package_data={'': ['swagger/swagger.yaml']},
     include_package_data=True,
     entry_points={
-        'console_scripts': ['cape_of_good_place_names=cape_of_good_place_names.__main__:main']},
+        'console_scripts': [
+            'cape_of_good_place_names=cape_of_good_place_names.__main__:main',
+            'cogpn-migrate-cache=cape_of_good_place_names.geocoder_cache.migrate:main',
+            'cogpn-warm-cache=cape_of_good_place_names.geocoder_cache.warm:main',
+            'cogpn-evict-cache=cape_of_good_place_names.geocoder_cache.evict:main',
+            'cogpn-geocode-worker=cape_of_good_place_names.geocode_jobs.runner:main',
+        ]},
     long_description="""\
     This is a stateless service for performing various geotranslation operations, moving between how people describe places and codified coordinate systems.
     """